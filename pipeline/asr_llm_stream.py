@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import threading
-import queue
 from typing import List
 
 from src.recorder import Recorder, RecorderConfig
@@ -10,51 +9,9 @@ from src.asr.factory import create_asr
 from src.asr.base import ASRResult
 
 from src.llm.factory import create_llm  # 用新版 factory
-from src.llm.base import (
-    LLMMessage,
-    MessagePart,
-    CancelToken,
-    CancelledError,
-)
-
-class LatestQueue:
-    def __init__(self, maxsize: int = 1) -> None:
-        self._q: "queue.Queue[str]" = queue.Queue(maxsize=maxsize)
-
-    def push(self, item: str) -> None:
-        while True:
-            try:
-                self._q.put_nowait(item)
-                return
-            except queue.Full:
-                try:
-                    self._q.get_nowait()
-                except queue.Empty:
-                    return
-
-    def pop(self, timeout: float = 0.2) -> str | None:
-        try:
-            return self._q.get(timeout=timeout)
-        except queue.Empty:
-            return None
-
-
-class InterruptController:
-    def __init__(self) -> None:
-        self._lock = threading.Lock()
-        self._token: CancelToken | None = None
-
-    def new_token(self) -> CancelToken:
-        with self._lock:
-            if self._token is not None:
-                self._token.cancel()
-            self._token = CancelToken()
-            return self._token
-
-    def cancel(self) -> None:
-        with self._lock:
-            if self._token is not None:
-                self._token.cancel()
+from src.llm.context import ConversationStore
+from src.llm.base import CancelledError
+from src.pipeline.control import InterruptController, LatestQueue
 
 
 def main():
@@ -72,10 +29,8 @@ def main():
 
     system_prompt = "你扮演人工智能助手，说话符合角色风格，不要输出 markdown，不要输出多余格式。"
 
-    history: List[LLMMessage] = [
-        LLMMessage(role="system", parts=[MessagePart(type="text", text=system_prompt)])
-    ]
-    MAX_TURNS = 10  # 保留最近 10 轮对话（user+assistant 算一轮）
+    # 按 token 预算管理历史（AI_CORE_LLM_CONTEXT_TOKENS），system prompt 固定在最前面
+    conversation = ConversationStore.for_llm(llm, system_prompt)
 
     # =========================
     # 3) Recorder segmenting
@@ -91,17 +46,11 @@ def main():
     # =========================
     # 4) 并发：ASR 线程持续产出 user_text
     # =========================
-    user_q = LatestQueue[str]()  # 只保留最新一句（打断语义更自然）
+    user_q: LatestQueue[str] = LatestQueue()  # 只保留最新一句（打断语义更自然）
     stop_event = threading.Event()
 
-    def trim_history(hist: List[LLMMessage]) -> List[LLMMessage]:
-        keep = 1 + 2 * MAX_TURNS
-        if len(hist) > keep:
-            return [hist[0]] + hist[-(keep - 1) :]
-        return hist
-
     # 共享状态：用于打断当前 LLM stream
-    interrupt = InterruptController(CancelToken)
+    interrupt = InterruptController()
 
     def asr_listener_loop():
         print("🎧 Always listening...（Ctrl+C 退出）")
@@ -128,15 +77,13 @@ def main():
             user_q.push(user_text)
 
     def llm_loop():
-        nonlocal history
         while not stop_event.is_set():
             user_text = user_q.pop(timeout=0.2)
             if user_text is None:
                 continue
 
             # 更新 history
-            history.append(LLMMessage(role="user", parts=[MessagePart(type="text", text=user_text)]))
-            history = trim_history(history)
+            history = conversation.add_user(user_text)
 
             # 新一轮生成：创建新 token（并 cancel 旧 token）
             token = interrupt.new_token()
@@ -156,10 +103,7 @@ def main():
                 assistant_text = "".join(assistant_parts).strip()
                 if assistant_text:
                     print("")  # 换行
-                    history.append(
-                        LLMMessage(role="assistant", parts=[MessagePart(type="text", text=assistant_text)])
-                    )
-                    history = trim_history(history)
+                    conversation.add_assistant(assistant_text)
                 else:
                     print("")  # 换行（空输出也结束）
 
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import multiprocessing as mp
+import resource
+import time
+from dataclasses import replace
+from typing import Dict, List
+
+from src.llm.base import LLMMessage, MessagePart
+from src.llm.Qwen_official import QwenOfficialConfig, QwenOfficialLLM
+
+DEFAULT_PROMPTS = [
+    "用一句话介绍一下你自己。",
+    "今天有点累，给我讲个简短的笑话吧。",
+    "解释一下什么是投机解码，控制在三句话以内。",
+]
+
+
+def _peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _current_rss_mb() -> float:
+    # 当前常驻内存（/proc，只有 Linux 有）；拿不到时返回 nan
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return float("nan")
+
+
+def _run_mode(cfg: QwenOfficialConfig, prompts: List[str]) -> Dict[str, float]:
+    """
+    在独立子进程里跑：峰值 RSS 只反映当前量化模式。
+    int8_dynamic 先按 fp32 加载再量化，峰值 RSS 等于未量化的加载，量化后的占用看 gc 之后的 steady RSS。
+    """
+    load_start = time.perf_counter()
+    llm = QwenOfficialLLM(cfg)
+    load_ms = (time.perf_counter() - load_start) * 1000.0
+    gc.collect()
+    steady_rss_mb = _current_rss_mb()
+
+    ttft_ms: List[float] = []
+    # 解码速度只算首 token 之后：(tokens - 1) / (end - first)，不把 prefill 算进去
+    decode_tokens = 0
+    decode_s = 0.0
+    for prompt in prompts:
+        messages = [LLMMessage(role="user", parts=[MessagePart(type="text", text=prompt)])]
+        start = time.perf_counter()
+        first = None
+        parts: List[str] = []
+        for ch in llm.stream(messages):
+            if ch.text_delta:
+                if first is None:
+                    first = time.perf_counter()
+                parts.append(ch.text_delta)
+        end = time.perf_counter()
+        if first is None:
+            continue
+        ttft_ms.append((first - start) * 1000.0)
+        tokens = len(llm.tokenizer.encode("".join(parts), add_special_tokens=False))
+        if tokens > 1:
+            decode_tokens += tokens - 1
+            decode_s += end - first
+
+    return {
+        "load_ms": load_ms,
+        "peak_rss_mb": _peak_rss_mb(),
+        "steady_rss_mb": steady_rss_mb,
+        "ttft_ms": sum(ttft_ms) / len(ttft_ms) if ttft_ms else float("nan"),
+        "tok_s": decode_tokens / decode_s if decode_s > 0 else float("nan"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare QwenOfficialLLM quantization modes (memory / TTFT / tokens/sec).")
+    parser.add_argument(
+        "--modes",
+        default="none,int8_dynamic,int8",
+        help="Comma-separated quantization modes (none / int8_dynamic / int8 / int4).",
+    )
+    parser.add_argument(
+        "--prompt",
+        action="append",
+        help="Prompt to run (repeatable). Defaults to a few short Chinese prompts.",
+    )
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    prompts = args.prompt or DEFAULT_PROMPTS
+    # 贪心解码：各模式的输出长度可比
+    base_cfg = replace(QwenOfficialConfig(), do_sample=False, max_new_tokens=args.max_new_tokens)
+
+    # spawn：每个模式一个干净进程，互不影响内存统计
+    ctx = mp.get_context("spawn")
+    rows = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        cfg = replace(base_cfg, quantization=mode)
+        print(f"[{mode}] loading {cfg.model} ...")
+        with ctx.Pool(1) as pool:
+            try:
+                stats = pool.apply(_run_mode, (cfg, prompts))
+            except Exception as exc:
+                print(f"[{mode}] failed: {exc}")
+                continue
+        rows.append((mode, stats))
+
+    print()
+    print(f"{'mode':<14}{'load ms':>10}{'peak RSS MB':>14}{'steady RSS MB':>16}{'TTFT ms':>10}{'decode tok/s':>14}")
+    for mode, st in rows:
+        print(
+            f"{mode:<14}{st['load_ms']:>10.0f}{st['peak_rss_mb']:>14.0f}{st['steady_rss_mb']:>16.0f}"
+            f"{st['ttft_ms']:>10.1f}{st['tok_s']:>14.2f}"
+        )
+    if any(mode == "int8_dynamic" for mode, _ in rows):
+        print(
+            "\nnote: int8_dynamic loads fp32 weights before quantizing, so its peak RSS equals the unquantized load;"
+            "\n      steady RSS (after load + gc.collect()) shows the quantized footprint, though the allocator may"
+            "\n      keep some freed fp32 pages."
+        )
+
+
+if __name__ == "__main__":
+    main()
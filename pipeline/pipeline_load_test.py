@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from typing import AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+
+from src.llm.base import CancelToken, CancelledError, LLMChunk, LLMMessage, StopCondition
+from src.pipeline import (
+    AsyncVoicePipeline,
+    NullSink,
+    PipelineExecutors,
+    ScriptedSource,
+    TurnStats,
+    VoicePipeline,
+    VoicePipelineConfig,
+)
+from src.tts.base import CancelToken as TTSCancelToken, TTSResult
+
+DEFAULT_PROMPTS = [
+    "用一句话介绍一下你自己。",
+    "今天有点累，给我讲个简短的笑话吧。",
+    "解释一下什么是投机解码，控制在三句话以内。",
+]
+
+FAKE_REPLY = "好的，我来简单说一下。投机解码先用小模型草拟几个词，再让大模型一次性校验，速度通常能提升一到两倍。"
+
+
+class EchoLLM:
+    """
+    不加载模型的 LLM：按固定间隔逐字吐出同一段回复，只测编排本身的开销和并发。
+    """
+
+    def __init__(self, token_ms: float, first_token_ms: float, reply: str = FAKE_REPLY) -> None:
+        self.token_ms = token_ms
+        self.first_token_ms = first_token_ms
+        self.reply = reply
+
+    def stream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> Iterator[LLMChunk]:
+        time.sleep(self.first_token_ms / 1000.0)
+        for ch in self.reply:
+            if cancel_token is not None and cancel_token.is_cancelled():
+                raise CancelledError()
+            yield LLMChunk(text_delta=ch)
+            time.sleep(self.token_ms / 1000.0)
+        yield LLMChunk(is_final=True)
+
+    async def astream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[LLMChunk]:
+        # 原生异步接口：异步引擎里不占线程（远程 API 类的后端同理）
+        await asyncio.sleep(self.first_token_ms / 1000.0)
+        for ch in self.reply:
+            if cancel_token is not None and cancel_token.is_cancelled():
+                raise CancelledError()
+            yield LLMChunk(text_delta=ch)
+            await asyncio.sleep(self.token_ms / 1000.0)
+        yield LLMChunk(is_final=True)
+
+
+class ToneTTS:
+    """
+    不加载模型的 TTS：按字数 sleep 模拟合成耗时，返回对应时长的正弦波。
+    """
+
+    def __init__(self, ms_per_char: float, audio_s_per_char: float, sample_rate: int = 32000) -> None:
+        self.ms_per_char = ms_per_char
+        self.audio_s_per_char = audio_s_per_char
+        self.sample_rate = sample_rate
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        voice: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        cancel_token: Optional[TTSCancelToken] = None,
+    ) -> TTSResult:
+        deadline = time.perf_counter() + len(text) * self.ms_per_char / 1000.0
+        while time.perf_counter() < deadline:
+            if cancel_token is not None:
+                cancel_token.throw_if_cancelled()
+            time.sleep(0.005)
+        frames = int(len(text) * self.audio_s_per_char * self.sample_rate)
+        t = np.arange(frames, dtype=np.float32) / self.sample_rate
+        return TTSResult.from_pcm(0.2 * np.sin(2 * np.pi * 440.0 * t), self.sample_rate, backend="tone")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def report(turns: List[TurnStats], wall_s: float, sessions: int) -> None:
+    first_audio = [t.first_audio_ms for t in turns if t.first_audio_ms is not None]
+    first_token = [t.llm_first_token_ms for t in turns if t.llm_first_token_ms is not None]
+    print(f"sessions={sessions} turns={len(turns)} wall={wall_s:.1f}s interrupted={sum(t.interrupted for t in turns)}")
+    for name, values in (("first token ms", first_token), ("first audio ms", first_audio)):
+        if not values:
+            continue
+        print(
+            f"  {name:<16} p50={_percentile(values, 50):8.1f} p95={_percentile(values, 95):8.1f} "
+            f"mean={statistics.fmean(values):8.1f} max={max(values):8.1f}"
+        )
+
+
+def run_threaded(args: argparse.Namespace, llm, tts) -> List[TurnStats]:
+    pipelines: List[VoicePipeline] = []
+    for idx in range(args.sessions):
+        source = ScriptedSource(DEFAULT_PROMPTS * args.turns, interval_s=args.think_s)
+        cfg = VoicePipelineConfig(tts_workers=args.tts_workers)
+        pipeline = VoicePipeline(None, llm, tts, source, NullSink(realtime=not args.fast), cfg, name=f"s{idx}")
+        # 上一轮播完再说下一句；--barge-in 时不等，直接打断
+        if not args.barge_in:
+            source.wait_idle = pipeline.idle
+        pipelines.append(pipeline)
+
+    for pipeline in pipelines:
+        pipeline.start()
+    print(f"threads: {threading.active_count()}")
+    for pipeline in pipelines:
+        pipeline.wait(timeout=args.timeout)
+    turns = [t for p in pipelines for t in p.turn_stats()]
+    for pipeline in pipelines:
+        pipeline.stop()
+    return turns
+
+
+async def run_async(args: argparse.Namespace, llm, tts) -> List[TurnStats]:
+    # 假 TTS 只是 sleep，线程数给够，和线程版每个会话 tts_workers 个 worker 对齐
+    executors = PipelineExecutors(tts_threads=args.tts_threads or args.sessions * args.tts_workers)
+    sessions: List[AsyncVoicePipeline] = []
+    for idx in range(args.sessions):
+        source = ScriptedSource(DEFAULT_PROMPTS * args.turns, interval_s=args.think_s)
+        cfg = VoicePipelineConfig(tts_workers=args.tts_workers)
+        session = AsyncVoicePipeline(
+            None, llm, tts, source, NullSink(realtime=not args.fast), cfg, executors=executors, name=f"s{idx}"
+        )
+        if not args.barge_in:
+            source.wait_idle = session.wait_idle
+        sessions.append(session)
+
+    for session in sessions:
+        await session.start()
+    print(f"threads: {threading.active_count()} (pool threads start lazily)")
+    await asyncio.gather(*(session.wait(timeout=args.timeout) for session in sessions))
+    print(f"threads: {threading.active_count()}")
+    turns = [t for s in sessions for t in s.turn_stats()]
+    for session in sessions:
+        await session.stop()
+    executors.shutdown()
+    return turns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run many headless voice-pipeline sessions in one process.")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=1, help="Each turn replays the prompt list once.")
+    parser.add_argument("--think-s", type=float, default=0.5, help="Pause before each user utterance.")
+    parser.add_argument("--barge-in", action="store_true", help="Do not wait for playback before the next utterance.")
+    parser.add_argument("--fast", action="store_true", help="Sink does not play in real time.")
+    parser.add_argument("--engine", choices=("thread", "async"), default="thread")
+    parser.add_argument("--tts-workers", type=int, default=2)
+    parser.add_argument("--tts-threads", type=int, default=0, help="Shared TTS threads for --engine async.")
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--tts-ms-per-char", type=float, default=8.0)
+    parser.add_argument("--audio-s-per-char", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    llm = EchoLLM(args.token_ms, args.first_token_ms)
+    tts = ToneTTS(args.tts_ms_per_char, args.audio_s_per_char)
+
+    start = time.perf_counter()
+    if args.engine == "async":
+        turns = asyncio.run(run_async(args, llm, tts))
+    else:
+        turns = run_threaded(args, llm, tts)
+    report(turns, time.perf_counter() - start, args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Callable, Iterable, List
+
+from src.tts.segmenter import TextSegmenter, TextSegmenterConfig
+
+SAMPLE_ZH = (
+    "好的，我来简单介绍一下。投机解码先用一个小模型草拟几个词，再让大模型一次性校验，"
+    "接受的部分直接输出，不接受的部分重新生成。这样在输出质量不变的前提下，速度通常能提升一到两倍！"
+    "当然，效果取决于两个模型的一致程度；如果草稿经常被拒绝，反而会更慢。"
+)
+SAMPLE_EN = (
+    "Sure, here is a short overview. Speculative decoding lets a small model draft a few tokens, "
+    "and the large model verifies them in a single pass. Accepted tokens are emitted directly, "
+    "rejected ones are regenerated. Output quality stays the same, and speed often improves by 1.5-2x! "
+    "Of course, it depends on how often the two models agree; frequent rejections make it slower."
+)
+
+
+def legacy_segments(deltas: Iterable[str], min_chars: int = 10, max_chars: int = 1000) -> List[str]:
+    """
+    原来 asr_llm_tts_stream 里的切分方式：每个 delta 之后从缓冲区开头重新扫描。
+    """
+    split_chars = set("，,。！？；.!?;")
+    out: List[str] = []
+    buffer = ""
+    for delta in deltas:
+        buffer += delta
+        while True:
+            split_at = None
+            for idx, ch_ in enumerate(buffer):
+                if ch_ not in split_chars:
+                    continue
+                if idx + 1 < min_chars:
+                    continue
+                split_at = idx
+                break
+            if split_at is None:
+                break
+            out.append(buffer[: split_at + 1])
+            buffer = buffer[split_at + 1 :]
+        if len(buffer) >= max_chars:
+            out.append(buffer[:max_chars])
+            buffer = buffer[max_chars:]
+    if buffer:
+        out.append(buffer)
+    return out
+
+
+def segmenter_segments(deltas: Iterable[str], cfg: TextSegmenterConfig) -> List[str]:
+    seg = TextSegmenter(cfg)
+    out: List[str] = []
+    for delta in deltas:
+        out.extend(seg.push(delta))
+    out.extend(seg.flush())
+    return out
+
+
+def _deltas(text: str, seed: int = 0) -> List[str]:
+    # 模拟 LLM 流式输出：每个 delta 1~4 个字符
+    rng = random.Random(seed)
+    out, i = [], 0
+    while i < len(text):
+        k = rng.randint(1, 4)
+        out.append(text[i : i + k])
+        i += k
+    return out
+
+
+def _bench(fn: Callable[[List[str]], List[str]], deltas: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(deltas)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the legacy LLM->TTS splitter with TextSegmenter.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--long-chars",
+        type=int,
+        default=20000,
+        help="Length of the no-punctuation worst case (legacy rescans the whole buffer per delta).",
+    )
+    args = parser.parse_args()
+
+    cfg = TextSegmenterConfig()
+    cases = [
+        ("zh reply", SAMPLE_ZH * 4),
+        ("en reply", " ".join([SAMPLE_EN] * 4)),
+        ("no punctuation", "很长的一段没有标点的文字" * (args.long_chars // 12)),
+    ]
+
+    print(f"{'case':<16}{'chars':>8}{'legacy ms':>12}{'segmenter ms':>14}{'legacy 1st':>12}{'seg 1st':>9}{'segments':>10}")
+    for name, text in cases:
+        deltas = _deltas(text)
+        legacy_ms = _bench(legacy_segments, deltas, args.repeat)
+        seg_ms = _bench(lambda d: segmenter_segments(d, cfg), deltas, args.repeat)
+        legacy = legacy_segments(deltas)
+        segs = segmenter_segments(deltas, cfg)
+        # 首段字数决定首音频要等多少文本
+        print(
+            f"{name:<16}{len(text):>8}{legacy_ms:>12.2f}{seg_ms:>14.2f}"
+            f"{len(legacy[0]) if legacy else 0:>12}{len(segs[0]) if segs else 0:>9}{len(segs):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,7 @@ def main() -> None:
     res = tts.synthesize(text)
 
     with open(output_path, "wb") as f:
-        f.write(res.audio_bytes)
+        f.write(res.as_wav())
 
     print(f"Saved: {output_path} ({res.sample_rate} Hz)")
 
@@ -33,7 +33,7 @@ def main() -> None:
 
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_bytes(res.audio_bytes)
+    out_path.write_bytes(res.as_wav())
 
     print(f"Load time: {load_ms:.1f} ms")
     print(f"Infer time: {infer_ms:.1f} ms")
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Tuple
+import uuid
+
+import numpy as np
+
+from src.asr.base import ASRBackend, ASRResult, transcribe_batch
+from src.audio import decode_audio, resample
+
+JobStatus = Literal["queued", "running", "done", "cancelled"]
+
+_DEFAULT_WORKERS = 2
+_DEFAULT_BATCH_SIZE = 8
+_DEFAULT_JOB_TTL_S = 3600.0
+
+
+@dataclass
+class BatchItem:
+    index: int
+    name: str
+    audio: Optional[np.ndarray] = None  # 上传文件：提交时已解码并重采样
+    path: Optional[str] = None          # 服务器本地文件：在 worker 里读取
+
+
+@dataclass
+class ASRJob:
+    job_id: str
+    backend: str
+    items: List[BatchItem]
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancelled: bool = False
+    started: bool = False
+
+    def __post_init__(self) -> None:
+        self._cond = threading.Condition()
+        self._results: List[Optional[dict]] = [None] * len(self.items)
+        self._order: List[int] = []  # 按完成顺序记录下标，供流式输出
+
+    @property
+    def total(self) -> int:
+        return len(self.items)
+
+    @property
+    def done(self) -> int:
+        return len(self._order)
+
+    @property
+    def status(self) -> JobStatus:
+        if self.cancelled:
+            return "cancelled"
+        if self.done >= self.total:
+            return "done"
+        return "running" if self.started else "queued"
+
+    def record(self, index: int, result: dict) -> None:
+        with self._cond:
+            if self._results[index] is not None:
+                return
+            self._results[index] = result
+            self._order.append(index)
+            if self.done >= self.total:
+                self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def mark_started(self) -> bool:
+        # 执行线程里调用，和 cancel() 用同一把锁；已经取消时返回 False
+        with self._cond:
+            if self.cancelled:
+                return False
+            self.started = True
+            return True
+
+    def cancel(self) -> None:
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            results = [r for r in self._results if r is not None]
+        return {
+            "job_id": self.job_id,
+            "backend": self.backend,
+            "status": self.status,
+            "total": self.total,
+            "done": len(results),
+            "results": results,
+        }
+
+    def iter_completed(self) -> Iterator[dict]:
+        """
+        按完成顺序产出结果；没有新结果时阻塞等待，任务结束或取消后返回。
+        """
+        pos = 0
+        while True:
+            with self._cond:
+                while pos >= len(self._order) and self.done < self.total and not self.cancelled:
+                    self._cond.wait()
+                ready = [self._results[i] for i in self._order[pos:]]
+                pos += len(ready)
+                finished = self.done >= self.total or self.cancelled
+            for result in ready:
+                if result is not None:
+                    yield result
+            if finished and pos >= len(self._order):
+                return
+
+
+class ASRJobQueue:
+    """
+    批量转写任务队列：任务按 batch_size 切批，交给线程池；同一 (backend, config) 共享一个模型实例。
+    """
+
+    def __init__(
+        self,
+        workers: int = _DEFAULT_WORKERS,
+        batch_size: int = _DEFAULT_BATCH_SIZE,
+        job_ttl_s: float = _DEFAULT_JOB_TTL_S,
+    ) -> None:
+        self.batch_size = max(1, int(batch_size))
+        self.job_ttl_s = float(job_ttl_s)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="asr-batch")
+        self._jobs: Dict[str, ASRJob] = {}
+        self._models: Dict[str, Tuple[ASRBackend, threading.Lock]] = {}
+        # 正在加载的模型：同一配置的其他请求等这个 future，不同配置互不阻塞
+        self._loading: Dict[str, "Future[Tuple[ASRBackend, threading.Lock]]"] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ASRJobQueue":
+        return cls(
+            workers=int(os.environ.get("AI_CORE_ASR_BATCH_WORKERS", str(_DEFAULT_WORKERS))),
+            batch_size=int(os.environ.get("AI_CORE_ASR_BATCH_SIZE", str(_DEFAULT_BATCH_SIZE))),
+            job_ttl_s=float(os.environ.get("AI_CORE_ASR_JOB_TTL_S", str(_DEFAULT_JOB_TTL_S))),
+        )
+
+    def submit(
+        self,
+        backend: str,
+        model_key: str,
+        model_factory: Callable[[], ASRBackend],
+        sample_rate: int,
+        items: List[BatchItem],
+    ) -> ASRJob:
+        self._prune()
+        job = ASRJob(job_id=uuid.uuid4().hex, backend=backend, items=items)
+        with self._lock:
+            self._jobs[job.job_id] = job
+
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start : start + self.batch_size]
+            self._executor.submit(self._run_batch, job, model_key, model_factory, sample_rate, batch)
+        return job
+
+    def get(self, job_id: str) -> Optional[ASRJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ASRJob]:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if (job.finished_at is not None and now - job.finished_at > self.job_ttl_s)
+                or (job.cancelled and now - job.created_at > self.job_ttl_s)
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _get_model(self, model_key: str, factory: Callable[[], ASRBackend]) -> Tuple[ASRBackend, threading.Lock]:
+        with self._lock:
+            entry = self._models.get(model_key)
+            if entry is not None:
+                return entry
+            loading = self._loading.get(model_key)
+            owner = loading is None
+            if loading is None:
+                loading = Future()
+                self._loading[model_key] = loading
+        if not owner:
+            # 同一配置只加载一次：等第一个请求加载完（失败时一起收到异常，下一个请求重试）
+            return loading.result()
+
+        # 加载放在全局锁外面：提交任务、查询 / 取消任务和其他配置的加载都不用等它
+        try:
+            entry = (factory(), threading.Lock())
+        except BaseException as exc:
+            with self._lock:
+                del self._loading[model_key]
+            loading.set_exception(exc)
+            raise
+        with self._lock:
+            self._models[model_key] = entry
+            del self._loading[model_key]
+        loading.set_result(entry)
+        return entry
+
+    @staticmethod
+    def _load_path(path: str, sample_rate: int) -> np.ndarray:
+        # 容器格式（wav/flac/ogg）由 soundfile 自动识别
+        with open(path, "rb") as fp:
+            audio, sr = decode_audio(fp, "wav")
+        return resample(audio, sr, sample_rate)
+
+    @staticmethod
+    def _result(item: BatchItem, res: ASRResult) -> dict:
+        return {
+            "index": item.index,
+            "name": item.name,
+            "text": (res.text or "").strip(),
+            "lang": res.lang,
+            "backend": res.backend,
+        }
+
+    @staticmethod
+    def _error(item: BatchItem, exc: BaseException) -> dict:
+        return {"index": item.index, "name": item.name, "error": str(exc)}
+
+    def _run_batch(
+        self,
+        job: ASRJob,
+        model_key: str,
+        model_factory: Callable[[], ASRBackend],
+        sample_rate: int,
+        batch: List[BatchItem],
+    ) -> None:
+        if not job.mark_started():
+            return
+
+        ready: List[Tuple[BatchItem, np.ndarray]] = []
+        for item in batch:
+            try:
+                audio = item.audio if item.audio is not None else self._load_path(item.path or "", sample_rate)
+            except Exception as exc:
+                job.record(item.index, self._error(item, exc))
+                continue
+            ready.append((item, audio))
+            item.audio = None  # job 里不再持有整段音频，批次结束即可释放
+
+        if not ready:
+            return
+
+        try:
+            asr, lock = self._get_model(model_key, model_factory)
+            with lock:
+                results = transcribe_batch(asr, [a for _, a in ready], sample_rate=sample_rate)
+        except Exception as exc:
+            for item, _ in ready:
+                job.record(item.index, self._error(item, exc))
+            return
+
+        for (item, _), res in zip(ready, results):
+            job.record(item.index, self._result(item, res))
+        for item, _ in ready[len(results):]:
+            job.record(item.index, self._error(item, RuntimeError("backend returned fewer results than inputs")))
@@ -1,16 +1,53 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 import json
+import os
+from pathlib import Path
+from typing import AsyncIterator, Iterator
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from src.asr.base import ASRResult
-from src.asr.factory import ASR_REGISTRY, create_asr
+from src.asr.base import ASRBackend, ASRResult, transcribe_stream
+from src.asr.factory import ASR_REGISTRY, ASRBackendEntry, create_asr
 
-from services.common import build_config, load_wav_upload
+from services.asr_jobs import ASRJob, ASRJobQueue, BatchItem
+from services.common import build_config, decode_audio_payload, load_audio_upload
 from services.runtime import ensure_remote_backend_ready
+from services.runtime.asr_pool import ASRPoolUnavailable, ASRWorkerPool
 
-app = FastAPI(title="ai_core ASR Service", version="1.0.0")
+_JOB_QUEUE = ASRJobQueue.from_env()
+# 批量接口允许读取的服务器目录；未设置时只接受上传文件
+_BATCH_ROOT = os.environ.get("AI_CORE_ASR_BATCH_ROOT")
+# AI_CORE_ASR_POOL_WORKERS>0 时启动多进程推理池，匹配 (backend, config) 的请求走池子
+_ASR_POOL: ASRWorkerPool | None = None
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    global _ASR_POOL
+    _ASR_POOL = ASRWorkerPool.from_env()
+    if _ASR_POOL is not None:
+        _ASR_POOL.start()
+    try:
+        yield
+    finally:
+        if _ASR_POOL is not None:
+            _ASR_POOL.close()
+            _ASR_POOL = None
+        _JOB_QUEUE.shutdown()
+
+
+app = FastAPI(title="ai_core ASR Service", version="1.0.0", lifespan=_lifespan)
+
+
+@app.exception_handler(ASRPoolUnavailable)
+async def _pool_unavailable(_request: Request, exc: ASRPoolUnavailable) -> JSONResponse:
+    # 池子忙不过来或 worker 卡住：让客户端稍后重试
+    return JSONResponse(status_code=503, content={"detail": f"ASR worker pool unavailable: {exc}"})
 
 
 @app.get("/health")
@@ -18,13 +55,7 @@ def health() -> dict:
     return {"ok": True, "service": "asr"}
 
 
-@app.post("/v1/asr/transcribe")
-async def transcribe(
-    audio: UploadFile = File(..., description="WAV file"),
-    backend: str = Form("paraformer"),
-    sample_rate: int = Form(16000),
-    config_json: str | None = Form(None),
-) -> dict:
+def _resolve_backend(backend: str, config_json: str | None) -> tuple[str, ASRBackendEntry, object]:
     name = backend.strip().lower()
     entry = ASR_REGISTRY.get(name)
     if entry is None:
@@ -52,15 +83,192 @@ async def transcribe(
         except Exception as exc:
             raise HTTPException(status_code=503, detail=f"Remote backend startup failed: {exc}") from exc
 
-    asr = create_asr(name, cfg)
+    return name, entry, cfg
+
+
+def _config_key(config_json: str | None) -> str:
+    return json.dumps(json.loads(config_json) if config_json else {}, sort_keys=True)
+
+
+def _pooled(name: str, config_json: str | None) -> ASRWorkerPool | None:
+    if _ASR_POOL is not None and _ASR_POOL.matches(name, _config_key(config_json)):
+        return _ASR_POOL
+    return None
+
 
-    wav, sr = await load_wav_upload(audio)
-    use_sr = int(sample_rate or sr)
+def _prepare_asr(backend: str, config_json: str | None) -> tuple[ASRBackendEntry, ASRBackend]:
+    name, entry, cfg = _resolve_backend(backend, config_json)
+    pool = _pooled(name, config_json)
+    if pool is not None:
+        return entry, pool
+    return entry, create_asr(name, cfg)
 
-    res: ASRResult = asr.transcribe(wav, sample_rate=use_sr)
+
+def _resolve_batch_path(raw: str) -> str:
+    if not _BATCH_ROOT:
+        raise HTTPException(status_code=400, detail="Server-side paths are disabled (AI_CORE_ASR_BATCH_ROOT not set)")
+    root = Path(_BATCH_ROOT).expanduser().resolve()
+    path = (root / raw).resolve()
+    if not path.is_relative_to(root):
+        raise HTTPException(status_code=400, detail=f"Path escapes batch root: {raw}")
+    if not path.is_file():
+        raise HTTPException(status_code=400, detail=f"File not found: {raw}")
+    return str(path)
+
+
+def _get_job(job_id: str) -> ASRJob:
+    job = _JOB_QUEUE.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.post("/v1/asr/transcribe")
+async def transcribe(
+    audio: UploadFile = File(..., description="WAV / raw PCM / Ogg-Opus file"),
+    backend: str = Form("paraformer"),
+    sample_rate: int | None = Form(None, description="Only used for raw PCM without rate= / X-Sample-Rate"),
+    config_json: str | None = Form(None),
+) -> dict:
+    entry, asr = _prepare_asr(backend, config_json)
+
+    wav, sr = await load_audio_upload(audio, sample_rate=sample_rate, target_sample_rate=entry.sample_rate)
+
+    res: ASRResult = await run_in_threadpool(asr.transcribe, wav, sample_rate=sr)
     return {
         "text": (res.text or "").strip(),
         "lang": res.lang,
         "backend": res.backend,
-        "sample_rate": use_sr,
+        "sample_rate": sr,
     }
+
+
+@app.post("/v1/asr/transcribe_raw")
+async def transcribe_raw(
+    request: Request,
+    backend: str = "paraformer",
+    config_json: str | None = None,
+) -> dict:
+    """
+    请求体直接是音频（不走 multipart）：Content-Type 指定格式，
+    raw PCM 的采样率放在 content-type 的 rate= 参数或 X-Sample-Rate header。
+    """
+    entry, asr = _prepare_asr(backend, config_json)
+
+    payload = await request.body()
+    wav, sr = await run_in_threadpool(
+        decode_audio_payload,
+        payload,
+        request.headers.get("content-type"),
+        headers=request.headers,
+        target_sample_rate=entry.sample_rate,
+    )
+
+    res: ASRResult = await run_in_threadpool(asr.transcribe, wav, sample_rate=sr)
+    return {
+        "text": (res.text or "").strip(),
+        "lang": res.lang,
+        "backend": res.backend,
+        "sample_rate": sr,
+    }
+
+
+@app.post("/v1/asr/transcribe_stream")
+async def transcribe_stream_endpoint(
+    audio: UploadFile = File(..., description="WAV / raw PCM / Ogg-Opus file"),
+    backend: str = Form("paraformer"),
+    sample_rate: int | None = Form(None, description="Only used for raw PCM without rate= / X-Sample-Rate"),
+    word_timestamps: bool | None = Form(None, description="Word-level timestamps (whisper); default from config"),
+    config_json: str | None = Form(None),
+) -> StreamingResponse:
+    """
+    NDJSON：每解码出一段输出一行 {"type": "segment", ...}，最后一行 {"type": "done", "text": 全文}。
+    不支持流式的后端整段识别后作为一个 segment 返回。
+    """
+    entry, asr = _prepare_asr(backend, config_json)
+
+    wav, sr = await load_audio_upload(audio, sample_rate=sample_rate, target_sample_rate=entry.sample_rate)
+
+    def iter_lines() -> Iterator[bytes]:
+        texts: list[str] = []
+        lang = None
+        try:
+            for seg in transcribe_stream(asr, wav, sample_rate=sr, word_timestamps=word_timestamps):
+                texts.append(seg.text)
+                lang = seg.lang or lang
+                line = {"type": "segment", **{k: v for k, v in asdict(seg).items() if v is not None}}
+                yield (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+        except Exception as exc:
+            # 响应头已发出，错误只能作为最后一行返回
+            yield (json.dumps({"type": "error", "error": str(exc)}, ensure_ascii=False) + "\n").encode("utf-8")
+            return
+        # 分段文本已去掉首尾空格：中日文直接拼接，其它语言用空格分隔
+        sep = "" if lang in (None, "zh", "ja", "yue") else " "
+        done = {"type": "done", "text": sep.join(texts), "lang": lang, "sample_rate": sr}
+        yield (json.dumps(done, ensure_ascii=False) + "\n").encode("utf-8")
+
+    return StreamingResponse(iter_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/v1/asr/batch")
+async def submit_batch(
+    audio: list[UploadFile] | None = File(None, description="Audio files (same formats as /v1/asr/transcribe)"),
+    paths_json: str | None = Form(None, description="JSON list of paths relative to AI_CORE_ASR_BATCH_ROOT"),
+    backend: str = Form("paraformer"),
+    sample_rate: int | None = Form(None),
+    config_json: str | None = Form(None),
+) -> dict:
+    name, entry, cfg = _resolve_backend(backend, config_json)
+
+    try:
+        paths = json.loads(paths_json) if paths_json else []
+    except json.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"paths_json must be valid JSON: {exc}") from exc
+    if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+        raise HTTPException(status_code=400, detail="paths_json must be a JSON list of strings")
+
+    items: list[BatchItem] = []
+    for upload in audio or []:
+        wav, _ = await load_audio_upload(upload, sample_rate=sample_rate, target_sample_rate=entry.sample_rate)
+        items.append(BatchItem(index=len(items), name=upload.filename or f"upload_{len(items)}", audio=wav))
+    for raw in paths:
+        items.append(BatchItem(index=len(items), name=raw, path=_resolve_batch_path(raw)))
+
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty: upload files or pass paths_json")
+
+    pool = _pooled(name, config_json)
+    job = _JOB_QUEUE.submit(
+        backend=name,
+        model_key=f"{name}:{_config_key(config_json)}",
+        model_factory=(lambda: pool) if pool is not None else (lambda: create_asr(name, cfg)),
+        sample_rate=entry.sample_rate,
+        items=items,
+    )
+    return {"job_id": job.job_id, "status": job.status, "total": job.total}
+
+
+@app.get("/v1/asr/batch/{job_id}")
+def get_batch(job_id: str) -> dict:
+    return _get_job(job_id).snapshot()
+
+
+@app.get("/v1/asr/batch/{job_id}/stream")
+def stream_batch(job_id: str) -> StreamingResponse:
+    """
+    NDJSON：每完成一条输出一行（按完成顺序，用 index 对应提交顺序）。
+    """
+    job = _get_job(job_id)
+
+    def iter_lines() -> Iterator[bytes]:
+        for result in job.iter_completed():
+            yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+
+    return StreamingResponse(iter_lines(), media_type="application/x-ndjson")
+
+
+@app.delete("/v1/asr/batch/{job_id}")
+def cancel_batch(job_id: str) -> dict:
+    job = _get_job(job_id)
+    job.cancel()
+    return {"job_id": job.job_id, "status": job.status, "done": job.done, "total": job.total}
@@ -2,11 +2,24 @@ from __future__ import annotations
 
 from dataclasses import fields, is_dataclass
 import io
-from typing import Any, Dict, Type
+from typing import Any, BinaryIO, Dict, Iterator, Mapping, Type
 
 import numpy as np
-import soundfile as sf
 from fastapi import HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from src.audio import (
+    AUDIO_FORMATS,
+    decode_audio,
+    is_raw_pcm,
+    iter_encode_audio,
+    media_type_for,
+    parse_media_type,
+    resample,
+    resolve_format,
+)
+from src.audio.codec import OPUS_SAMPLE_RATES
 
 WAV_MEDIA_TYPES = {"audio/wav", "audio/x-wav", "application/octet-stream"}
 
@@ -33,32 +46,167 @@ def build_config(cfg_cls: Type[object], cfg: Dict[str, Any] | None) -> object:
         raise HTTPException(status_code=400, detail=f"Invalid config for {cfg_cls.__name__}: {exc}") from exc
 
 
-def validate_upload_content_type(upload: UploadFile) -> None:
-    if upload.content_type and upload.content_type.lower() not in WAV_MEDIA_TYPES:
+def resolve_upload_format(content_type: str | None) -> str:
+    media_type, _ = parse_media_type(content_type)
+    # 未声明类型时保持旧行为：按 WAV 处理
+    if not media_type or media_type == "application/octet-stream":
+        return "wav"
+    try:
+        return resolve_format(media_type)
+    except ValueError as exc:
         raise HTTPException(
             status_code=415,
             detail=(
-                f"Unsupported content type '{upload.content_type}'. "
-                "Please upload WAV audio (audio/wav)."
+                f"Unsupported content type '{content_type}'. "
+                f"Supported formats: {', '.join(AUDIO_FORMATS)}."
             ),
-        )
+        ) from exc
 
 
-async def load_wav_upload(upload: UploadFile) -> tuple[np.ndarray, int]:
-    validate_upload_content_type(upload)
-    payload = await upload.read()
-    if not payload:
-        raise HTTPException(status_code=400, detail="Uploaded WAV is empty")
+def validate_upload_content_type(upload: UploadFile) -> None:
+    resolve_upload_format(upload.content_type)
+
+
+def _header_int(value: str | None, name: str) -> int | None:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"{name} must be an integer, got '{value}'") from exc
+
+
+def _remaining_size(fp: BinaryIO) -> int:
+    start = fp.tell()
+    end = fp.seek(0, io.SEEK_END)
+    fp.seek(start)
+    return end - start
+
+
+def decode_audio_payload(
+    payload: bytes | BinaryIO,
+    content_type: str | None,
+    *,
+    sample_rate: int | None = None,
+    headers: Mapping[str, str] | None = None,
+    target_sample_rate: int | None = None,
+) -> tuple[np.ndarray, int]:
+    """
+    payload 可以是 bytes 或可 seek 的文件对象（上传的 spooled 文件直接解码）。
+    raw PCM 的采样率优先取 content-type 参数（rate=），其次 X-Sample-Rate header，最后是调用方给的值；
+    WAV / Ogg 以文件自带的采样率为准。给了 target_sample_rate 时重采样到该采样率。
+    """
+    fmt = resolve_upload_format(content_type)
+    if hasattr(payload, "seek"):
+        empty = _remaining_size(payload) == 0
+    else:
+        empty = not payload
+    if empty:
+        raise HTTPException(status_code=400, detail="Uploaded audio is empty")
+
+    _, params = parse_media_type(content_type)
+    headers = headers or {}
+    pcm_rate = None
+    channels = 1
+    if is_raw_pcm(fmt):
+        pcm_rate = (
+            _header_int(params.get("rate"), "rate")
+            or _header_int(headers.get("x-sample-rate"), "X-Sample-Rate")
+            or sample_rate
+        )
+        if not pcm_rate:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Raw {fmt} audio requires a sample rate (content-type rate= or X-Sample-Rate)",
+            )
+        channels = _header_int(params.get("channels"), "channels") or 1
 
     try:
-        data, sample_rate = sf.read(io.BytesIO(payload), dtype="float32", always_2d=False)
+        audio, sr = decode_audio(payload, fmt, sample_rate=pcm_rate, channels=channels)
     except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"Failed to decode WAV: {exc}") from exc
+        raise HTTPException(status_code=400, detail=f"Failed to decode {fmt} audio: {exc}") from exc
 
-    if isinstance(data, np.ndarray) and data.ndim == 2:
-        data = data.mean(axis=1)
-    audio = np.asarray(data, dtype=np.float32)
     if audio.ndim != 1:
-        raise HTTPException(status_code=400, detail="Audio must be mono or stereo WAV")
+        raise HTTPException(status_code=400, detail="Audio must be mono or stereo")
+
+    if target_sample_rate and int(target_sample_rate) != sr:
+        audio = resample(audio, sr, int(target_sample_rate))
+        sr = int(target_sample_rate)
+
+    return audio, sr
+
+
+async def load_audio_upload(
+    upload: UploadFile,
+    sample_rate: int | None = None,
+    target_sample_rate: int | None = None,
+) -> tuple[np.ndarray, int]:
+    """
+    直接从 UploadFile 底层的 spooled 文件解码（大文件已落盘时不会再整体读进内存），
+    解码和重采样放到线程池，避免阻塞事件循环。
+    """
+    upload.file.seek(0)
+    return await run_in_threadpool(
+        decode_audio_payload,
+        upload.file,
+        upload.content_type,
+        sample_rate=sample_rate,
+        headers=upload.headers,
+        target_sample_rate=target_sample_rate,
+    )
+
+
+async def load_wav_upload(upload: UploadFile) -> tuple[np.ndarray, int]:
+    return await load_audio_upload(upload)
+
+
+def negotiate_audio_format(requested: str | None, accept: str | None, default: str = "wav") -> str:
+    """
+    显式参数优先；否则按 Accept header 中第一个可识别的音频类型；都没有时用 default。
+    """
+    if requested:
+        try:
+            return resolve_format(requested)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    for media_range in (accept or "").split(","):
+        media_type, _ = parse_media_type(media_range)
+        if not media_type or media_type in {"*/*", "audio/*"}:
+            continue
+        try:
+            return resolve_format(media_type)
+        except ValueError:
+            continue
+    return default
+
+
+def audio_response(
+    audio: np.ndarray,
+    sample_rate: int,
+    fmt: str,
+    headers: Mapping[str, str] | None = None,
+) -> StreamingResponse:
+    if fmt == "ogg_opus" and int(sample_rate) not in OPUS_SAMPLE_RATES:
+        audio = resample(audio, sample_rate, 48000)
+        sample_rate = 48000
+
+    try:
+        chunks: Iterator[bytes] = iter_encode_audio(audio, sample_rate, fmt)
+        # 提前拿到第一个块：编码参数错误（如 Opus 采样率）在发送响应头之前暴露
+        first = next(chunks, b"")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    def _iter() -> Iterator[bytes]:
+        if first:
+            yield first
+        yield from chunks
 
-    return audio, int(sample_rate)
+    out_headers = {
+        "X-Sample-Rate": str(int(sample_rate)),
+        "X-Audio-Format": fmt,
+        "X-Channels": "1",
+    }
+    out_headers.update(headers or {})
+    return StreamingResponse(_iter(), media_type=media_type_for(fmt, sample_rate), headers=out_headers)
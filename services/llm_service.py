@@ -1,29 +1,87 @@
 from __future__ import annotations
 
-from typing import Any, Iterator
+import asyncio
+from collections import OrderedDict
+from dataclasses import asdict
+import json
+import os
+import threading
+from typing import Any, AsyncIterator, Literal
 
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
-from src.llm.base import LLMMessage, MessagePart
+from src.llm.aio import afan_out, agenerate, astream
+from src.llm.base import BaseLLM, LLMMessage, MessagePart, StopCondition
+from src.llm.cache import CachedLLM, LLMResponseCache
+from src.llm.context import ContextConfig, fit_to_budget, token_counter_for
 from src.llm.factory import LLM_REGISTRY, create_llm
+from src.llm.router import LatencyTracker, LLMRouter
+from src.llm.session import LLMSession, SessionStore
 
 from services.common import build_config
 from services.runtime import ensure_remote_backend_ready
 
 app = FastAPI(title="ai_core LLM Service", version="1.0.0")
 
+# 确定性配置（do_sample=False / temperature=0）的响应缓存；AI_CORE_LLM_CACHE_SIZE=0 关闭
+_RESPONSE_CACHE = LLMResponseCache.from_env()
+
+# (backend, config) -> 模型实例：本地模型不必每个请求重新加载，Gemini 复用同一个 client
+_LLM_INSTANCES: "OrderedDict[str, BaseLLM]" = OrderedDict()
+_LLM_INSTANCES_MAX = int(os.environ.get("AI_CORE_LLM_INSTANCES", "4"))
+_LLM_INSTANCES_LOCK = threading.Lock()
+
+# 请求未指定 max_context_tokens 时的 prompt token 预算，0=不裁剪
+_CONTEXT_TOKENS = int(os.environ.get("AI_CORE_LLM_SERVICE_CONTEXT_TOKENS", "0"))
+
+# 各后端的首 token 延迟 / 失败统计，所有请求的路由共用
+_LATENCY_TRACKER = LatencyTracker()
+
+# 服务端会话历史：AI_CORE_LLM_SESSION_TTL_S / AI_CORE_LLM_SESSIONS_MAX / AI_CORE_LLM_SESSION_DIR（持久化目录）
+_SESSIONS = SessionStore.from_env()
+
 
 class ChatMessage(BaseModel):
     role: str = Field(..., pattern="^(system|user|assistant|tool)$")
     content: str = Field(..., min_length=1)
 
 
+class LLMTarget(BaseModel):
+    backend: str
+    config: dict[str, Any] | None = None
+
+
 class LLMRequest(BaseModel):
     backend: str = "qwen_official"
-    messages: list[ChatMessage]
+    # 带 session_id 时只需要发新的一轮（通常是一条 user 消息），backend / config 取自会话
+    messages: list[ChatMessage] = Field(default_factory=list)
+    config: dict[str, Any] | None = None
+    session_id: str | None = None
+    # 主后端失败（或 hedge_ms 内没有首 token）时依次尝试的后端
+    fallbacks: list[LLMTarget] | None = None
+    hedge_ms: float | None = Field(default=None, ge=0)
+    route_by_latency: bool = False
+    # 提前结束：出现任一停止串 / 满 max_sentences 句后停止生成（后端解码循环里判断）
+    stop: list[str] | None = None
+    max_sentences: int | None = Field(default=None, ge=1)
+    # prompt token 预算：超出时保留开头的 system 消息，从最旧的轮次开始丢弃
+    max_context_tokens: int | None = Field(default=None, ge=0)
+    # 同一请求并行发给多个模型（覆盖 config.model），generate 用
+    fan_out_models: list[str] | None = None
+    fan_out_mode: Literal["first", "best"] = "first"
+    fan_out_timeout_s: float | None = None
+
+
+class SessionCreateRequest(BaseModel):
+    backend: str = "qwen_official"
     config: dict[str, Any] | None = None
+    system_prompt: str | None = None
+    # 会话历史的 prompt token 预算，默认 AI_CORE_LLM_CONTEXT_TOKENS
+    max_context_tokens: int | None = Field(default=None, ge=0)
 
 
 @app.get("/health")
@@ -31,11 +89,109 @@ def health() -> dict:
     return {"ok": True, "service": "llm"}
 
 
-def _prepare_llm(name: str, config: dict[str, Any] | None):
+@app.get("/v1/llm/cache")
+def cache_stats() -> dict:
+    if _RESPONSE_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **asdict(_RESPONSE_CACHE.stats())}
+
+
+@app.get("/v1/llm/routes")
+def route_stats() -> dict:
+    return {name: asdict(st) for name, st in _LATENCY_TRACKER.snapshot().items()}
+
+
+@app.post("/v1/llm/sessions")
+def create_session(req: SessionCreateRequest) -> dict:
+    name = req.backend.strip().lower()
+    if name not in LLM_REGISTRY:
+        raise HTTPException(status_code=400, detail=f"Unknown LLM backend: {name}")
+    context = ContextConfig()
+    if req.max_context_tokens is not None:
+        context.max_tokens = req.max_context_tokens
+    session = _SESSIONS.create(name, req.config, req.system_prompt, context)
+    return {"session_id": session.session_id, "backend": name, "ttl_s": _SESSIONS.ttl_s}
+
+
+@app.get("/v1/llm/sessions/{session_id}")
+def get_session(session_id: str) -> dict:
+    session = _require_session(session_id)
+    conversation = session.conversation
+    return {
+        "session_id": session.session_id,
+        "backend": session.backend,
+        "summary": conversation.summary,
+        "compactions": conversation.compactions,
+        "messages": [
+            {"role": m.role, "content": "".join(p.text or "" for p in m.parts if p.type == "text")}
+            for m in conversation.messages()
+        ],
+    }
+
+
+@app.delete("/v1/llm/sessions/{session_id}")
+def delete_session(session_id: str) -> dict:
+    if not _SESSIONS.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    return {"deleted": True}
+
+
+def _require_session(session_id: str) -> LLMSession:
+    session = _SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+    return session
+
+
+class _SessionTurn:
+    """
+    一个请求在会话里的一轮：开始时占住会话锁并追加新消息，结束时写入回复（失败则撤回本轮）再释放。
+    """
+
+    def __init__(self, session: LLMSession) -> None:
+        if not session.lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="Session is busy with another request")
+        self.session = session
+        self._added_user = False
+        self._done = False
+
+    def messages(self, llm, req: LLMRequest) -> list[LLMMessage]:
+        conversation = self.session.conversation
+        conversation.token_counter = token_counter_for(_primary_llm(llm))
+        messages = conversation.messages()
+        for msg in _to_messages(req):
+            messages = conversation.append(msg)
+            self._added_user = self._added_user or msg.role == "user"
+        return messages
+
+    def finish(self, reply: str | None) -> None:
+        if self._done:
+            return
+        self._done = True
+        try:
+            if reply is None:
+                # 出错 / 客户端断开：撤回本轮，客户端可以原样重发
+                if self._added_user:
+                    self.session.conversation.discard_last_turn()
+            elif reply:
+                self.session.conversation.add_assistant(reply)
+            _SESSIONS.save(self.session)
+        finally:
+            self.session.lock.release()
+
+
+def _get_or_create_llm(name: str, config: dict[str, Any] | None) -> BaseLLM:
     entry = LLM_REGISTRY.get(name)
     if entry is None:
         raise HTTPException(status_code=400, detail=f"Unknown LLM backend: {name}")
 
+    key = f"{name}:{json.dumps(config or {}, sort_keys=True, default=str)}"
+    with _LLM_INSTANCES_LOCK:
+        llm = _LLM_INSTANCES.get(key)
+        if llm is not None:
+            _LLM_INSTANCES.move_to_end(key)
+            return llm
+
     cfg = build_config(entry.cfg_cls, config)
 
     if entry.runtime_type == "remote_managed":
@@ -53,39 +209,209 @@ def _prepare_llm(name: str, config: dict[str, Any] | None):
         except Exception as exc:
             raise HTTPException(status_code=503, detail=f"Remote backend startup failed: {exc}") from exc
 
-    return create_llm(name, cfg)
+    llm = create_llm(name, cfg)
+    with _LLM_INSTANCES_LOCK:
+        # 并发首请求可能各建了一个实例，保留先放进去的那个
+        llm = _LLM_INSTANCES.setdefault(key, llm)
+        _LLM_INSTANCES.move_to_end(key)
+        while len(_LLM_INSTANCES) > max(1, _LLM_INSTANCES_MAX):
+            _LLM_INSTANCES.popitem(last=False)
+    return llm
 
 
-@app.post("/v1/llm/generate")
-def generate(req: LLMRequest) -> dict:
+def _prepare_llm(name: str, config: dict[str, Any] | None):
+    llm = _get_or_create_llm(name, config)
+    if _RESPONSE_CACHE is not None:
+        # 包装器记录本次请求是否命中，每个请求一个
+        return CachedLLM(llm, _RESPONSE_CACHE)
+    return llm
+
+
+def _route_name(name: str, config: dict[str, Any] | None) -> str:
+    model = (config or {}).get("model")
+    return f"{name}:{model}" if model else name
+
+
+def _prepare_routed_llm(req: LLMRequest):
     name = req.backend.strip().lower()
-    llm = _prepare_llm(name, req.config)
+    if not req.fallbacks:
+        return _prepare_llm(name, req.config)
+
+    targets = [(name, req.config)] + [(t.backend.strip().lower(), t.config) for t in req.fallbacks]
+    backends = []
+    for backend, config in targets:
+        route = _route_name(backend, config)
+        if any(route == existing for existing, _ in backends):
+            raise HTTPException(status_code=400, detail=f"Duplicate LLM route: {route}")
+        backends.append((route, _prepare_llm(backend, config)))
+    return LLMRouter(
+        backends,
+        tracker=_LATENCY_TRACKER,
+        hedge_ms=req.hedge_ms,
+        route_by_latency=req.route_by_latency,
+    )
+
+
+def _cache_status(llm) -> str | None:
+    if isinstance(llm, LLMRouter):
+        llm = llm.backends.get(llm.last_backend or "")
+    if not isinstance(llm, CachedLLM) or not llm.enabled:
+        return None
+    return "hit" if llm.last_hit is not None else "miss"
 
-    messages = [
+
+def _to_messages(req: LLMRequest) -> list[LLMMessage]:
+    return [
         LLMMessage(role=m.role, parts=[MessagePart(type="text", text=m.content)])
         for m in req.messages
     ]
-    res = llm.generate(messages)
+
+
+def _stop_condition(req: LLMRequest) -> StopCondition | None:
+    stop = StopCondition(stop_sequences=tuple(req.stop or ()), max_sentences=req.max_sentences)
+    return stop or None
+
+
+def _primary_llm(llm):
+    # 包装器 / router 取里面的主后端模型（token 计数用它的 tokenizer）
+    if isinstance(llm, LLMRouter):
+        llm = llm.backends[llm.order[0]]
+    if isinstance(llm, CachedLLM):
+        llm = llm.llm
+    return llm
+
+
+def _fit_context(llm, messages: list[LLMMessage], req: LLMRequest) -> list[LLMMessage]:
+    budget = _CONTEXT_TOKENS if req.max_context_tokens is None else req.max_context_tokens
+    if budget <= 0:
+        return messages
+    return fit_to_budget(messages, budget, token_counter_for(_primary_llm(llm)))
+
+
+def _begin(req: LLMRequest) -> tuple[LLMRequest, _SessionTurn | None]:
+    if req.session_id is None:
+        if not req.messages:
+            raise HTTPException(status_code=422, detail="messages is required without session_id")
+        return req, None
+    if req.fan_out_models:
+        raise HTTPException(status_code=400, detail="fan_out_models is not supported with session_id")
+    session = _require_session(req.session_id)
+    turn = _SessionTurn(session)
+    return req.model_copy(update={"backend": session.backend, "config": session.config}), turn
+
+
+def _prepare_messages(llm, req: LLMRequest, turn: _SessionTurn | None) -> list[LLMMessage]:
+    if turn is not None:
+        # 会话历史由 ConversationStore 按预算管理，不再按请求裁剪
+        return turn.messages(llm, req)
+    return _fit_context(llm, _to_messages(req), req)
+
+
+@app.post("/v1/llm/generate")
+async def generate(req: LLMRequest) -> dict:
+    req, turn = _begin(req)
+    name = req.backend.strip().lower()
+
+    if req.fan_out_models:
+        llms = [
+            await run_in_threadpool(_prepare_llm, name, {**(req.config or {}), "model": model})
+            for model in req.fan_out_models
+        ]
+        messages = await run_in_threadpool(_fit_context, llms[0], _to_messages(req), req)
+        try:
+            res = await afan_out(
+                llms,
+                messages,
+                mode=req.fan_out_mode,
+                timeout_s=req.fan_out_timeout_s,
+                stop=_stop_condition(req),
+            )
+        except asyncio.TimeoutError as exc:
+            raise HTTPException(status_code=504, detail=str(exc)) from exc
+        return {
+            "text": res.text,
+            "backend": res.backend,
+            "model": res.model,
+            "usage": res.usage,
+            "cache": None,
+        }
+
+    reply = None
+    try:
+        llm = await run_in_threadpool(_prepare_routed_llm, req)
+        messages = await run_in_threadpool(_prepare_messages, llm, req, turn)
+        try:
+            res = await agenerate(llm, messages, stop=_stop_condition(req))
+        except RuntimeError as exc:
+            if not isinstance(llm, LLMRouter):
+                raise
+            raise HTTPException(status_code=502, detail=f"{exc}: {exc.__cause__}") from exc
+        reply = res.text
+    finally:
+        if turn is not None:
+            await run_in_threadpool(turn.finish, reply)
     return {
         "text": res.text,
         "backend": res.backend,
         "model": res.model,
         "usage": res.usage,
+        "cache": _cache_status(llm),
+        "session_id": req.session_id,
     }
 
 
 @app.post("/v1/llm/stream")
-def stream(req: LLMRequest) -> StreamingResponse:
-    name = req.backend.strip().lower()
-    llm = _prepare_llm(name, req.config)
-    messages = [
-        LLMMessage(role=m.role, parts=[MessagePart(type="text", text=m.content)])
-        for m in req.messages
-    ]
+async def stream(req: LLMRequest) -> StreamingResponse:
+    req, turn = _begin(req)
+    try:
+        llm = await run_in_threadpool(_prepare_routed_llm, req)
+        messages = await run_in_threadpool(_prepare_messages, llm, req, turn)
+
+        # 有 astream 的后端（Gemini）直接在事件循环里流式读取，不占线程
+        chunks = astream(llm, messages, stop=_stop_condition(req))
+        # 先取第一个 chunk：缓存是否命中、路由到哪个后端在此之后才确定，且能放进响应头
+        try:
+            first = await anext(chunks, None)
+        except RuntimeError as exc:
+            if not isinstance(llm, LLMRouter):
+                raise
+            raise HTTPException(status_code=502, detail=f"{exc}: {exc.__cause__}") from exc
+    except BaseException:
+        if turn is not None:
+            await run_in_threadpool(turn.finish, None)
+        raise
 
-    def iter_text() -> Iterator[bytes]:
-        for chunk in llm.stream(messages):
-            if chunk.text_delta:
-                yield chunk.text_delta.encode("utf-8")
+    async def iter_text() -> AsyncIterator[bytes]:
+        parts: list[str] = []
+        reply = None
+        try:
+            if first is not None:
+                if first.text_delta:
+                    parts.append(first.text_delta)
+                    yield first.text_delta.encode("utf-8")
+                async for chunk in chunks:
+                    if chunk.text_delta:
+                        parts.append(chunk.text_delta)
+                        yield chunk.text_delta.encode("utf-8")
+            reply = "".join(parts)
+        finally:
+            if turn is not None:
+                await run_in_threadpool(turn.finish, reply)
 
-    return StreamingResponse(iter_text(), media_type="text/plain; charset=utf-8")
+    headers = {}
+    status = _cache_status(llm)
+    if status is not None:
+        headers["X-Cache"] = status
+    if isinstance(llm, LLMRouter) and llm.last_backend:
+        headers["X-LLM-Backend"] = llm.last_backend
+    background = None
+    if turn is not None:
+        headers["X-Session-Id"] = turn.session.session_id
+        # 响应体没开始迭代就断开时 iter_text 的 finally 不会执行，这里兜底释放会话
+        background = BackgroundTask(turn.finish, None)
+    return StreamingResponse(
+        iter_text(),
+        media_type="text/plain; charset=utf-8",
+        headers=headers,
+        background=background,
+    )
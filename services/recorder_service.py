@@ -1,15 +1,14 @@
 from __future__ import annotations
 
-import io
-
 import numpy as np
-import soundfile as sf
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.responses import Response
 from pydantic import BaseModel
 
 from src.recorder import Recorder, RecorderConfig, SegmenterConfig
 
+from services.common import audio_response, negotiate_audio_format
+
 app = FastAPI(title="ai_core Recorder Service", version="1.0.0")
 
 
@@ -20,6 +19,8 @@ class RecorderRequest(BaseModel):
     latency: str = "low"
     enable_segmenter: bool = True
     chunk_sec: float = 4.0
+    # "wav" / "pcm_s16le" / "pcm_f32le" / "ogg_opus"；为空时按 Accept header 协商，默认 wav
+    audio_format: str | None = None
 
     # Segmenter options when enable_segmenter=True
     aggressiveness: int = 2
@@ -35,7 +36,9 @@ def health() -> dict:
 
 
 @app.post("/v1/recorder/capture")
-def capture(req: RecorderRequest) -> Response:
+def capture(req: RecorderRequest, request: Request) -> Response:
+    out_format = negotiate_audio_format(req.audio_format, request.headers.get("accept"))
+
     seg_cfg = SegmenterConfig(
         aggressiveness=req.aggressiveness,
         padding_ms=req.padding_ms,
@@ -62,15 +65,9 @@ def capture(req: RecorderRequest) -> Response:
     wav = np.asarray(wav, dtype=np.float32)
     duration_s = float(len(wav)) / float(req.sample_rate)
 
-    buf = io.BytesIO()
-    sf.write(buf, wav, req.sample_rate, format="WAV", subtype="PCM_16")
-    payload = buf.getvalue()
-
-    return Response(
-        content=payload,
-        media_type="audio/wav",
-        headers={
-            "X-Sample-Rate": str(req.sample_rate),
-            "X-Duration-S": f"{duration_s:.3f}",
-        },
+    return audio_response(
+        wav,
+        req.sample_rate,
+        out_format,
+        headers={"X-Duration-S": f"{duration_s:.3f}"},
     )
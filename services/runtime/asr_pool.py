@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields, is_dataclass, replace
+import json
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.asr.base import ASRBackend, ASRResult
+from src.asr.factory import ASR_REGISTRY, create_asr
+
+# fork 模式下由父进程加载，子进程通过 copy-on-write 共享同一份只读权重
+_PRELOADED_ASR: Optional[ASRBackend] = None
+
+_INITIAL_SHM_BYTES = 16000 * 4 * 30  # 30 s @ 16 kHz float32
+# 新 worker 加载模型的等待上限，单独计时，不占单次识别的超时
+_STARTUP_TIMEOUT_S = 600.0
+
+
+class ASRPoolUnavailable(RuntimeError):
+    """池子暂时没法处理请求（没有空闲 worker、worker 超时或已关闭），服务层映射成 503。"""
+
+
+def _limit_threads(num_threads: int) -> None:
+    if num_threads <= 0:
+        return
+    try:
+        import torch
+
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
+def _worker_main(
+    conn: Connection,
+    backend: str,
+    cfg: Optional[object],
+    num_threads: int,
+) -> None:
+    _limit_threads(num_threads)
+    try:
+        asr = _PRELOADED_ASR if _PRELOADED_ASR is not None else create_asr(backend, cfg)  # type: ignore[arg-type]
+    except Exception as exc:
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        return
+    conn.send(("ready", None))
+    shm: Optional[shared_memory.SharedMemory] = None
+
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                return
+            shm_name, num_samples, sample_rate = msg
+            if shm is None or shm.name != shm_name:
+                if shm is not None:
+                    shm.close()
+                # 共享内存由父进程创建和 unlink；子进程与父进程共用 resource_tracker，attach 即可
+                shm = shared_memory.SharedMemory(name=shm_name)
+
+            audio = np.ndarray((num_samples,), dtype=np.float32, buffer=shm.buf)
+            try:
+                res = asr.transcribe(audio, sample_rate=sample_rate)
+                conn.send(("ok", res))
+            except Exception as exc:
+                conn.send(("error", f"{type(exc).__name__}: {exc}"))
+            finally:
+                # 释放对 shm.buf 的引用，否则 close() 会抛 BufferError
+                del audio
+    except (EOFError, KeyboardInterrupt):
+        return
+    finally:
+        if shm is not None:
+            shm.close()
+
+
+@dataclass
+class _Worker:
+    process: Any
+    conn: Connection
+    shm: shared_memory.SharedMemory
+    ready: bool = False
+
+    def ensure_capacity(self, nbytes: int) -> None:
+        if nbytes <= self.shm.size:
+            return
+        old = self.shm
+        self.shm = shared_memory.SharedMemory(create=True, size=max(nbytes, old.size * 2))
+        old.close()
+        old.unlink()
+
+
+class ASRWorkerPool:
+    """
+    多进程 ASR：N 个 worker 进程各跑一份推理，权重只在父进程加载一次（fork 后 copy-on-write 共享）。
+    音频通过每个 worker 独占的一块共享内存传递，Pipe 里只走 (shm 名, 样本数, 采样率) 和结果。
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        cfg: Optional[object] = None,
+        *,
+        workers: int = 2,
+        start_method: str = "fork",
+        threads_per_worker: int = 0,
+        config_key: str = "{}",
+        timeout_s: float = 120.0,
+    ) -> None:
+        self.backend = backend.strip().lower()
+        if self.backend not in ASR_REGISTRY:
+            raise ValueError(f"Unknown ASR backend: {backend}")
+        self.num_workers = max(1, int(workers))
+        self.start_method = start_method
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.cfg = self._with_cpu_threads(cfg or ASR_REGISTRY[self.backend].cfg_cls(), self.threads_per_worker)
+        self.config_key = config_key
+        self.timeout_s = float(timeout_s)
+        self._workers: List[_Worker] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._fanout: Optional[ThreadPoolExecutor] = None
+        self._ctx: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ASRWorkerPool"]:
+        workers = int(os.environ.get("AI_CORE_ASR_POOL_WORKERS", "0"))
+        if workers <= 0:
+            return None
+        backend = os.environ.get("AI_CORE_ASR_POOL_BACKEND", "paraformer").strip().lower()
+        entry = ASR_REGISTRY.get(backend)
+        if entry is None:
+            raise ValueError(f"Unknown ASR backend in AI_CORE_ASR_POOL_BACKEND: {backend}")
+        cfg_dict: Dict[str, Any] = json.loads(os.environ.get("AI_CORE_ASR_POOL_CONFIG", "") or "{}")
+        return cls(
+            backend,
+            entry.cfg_cls(**cfg_dict),
+            workers=workers,
+            start_method=os.environ.get("AI_CORE_ASR_POOL_START_METHOD", "fork"),
+            threads_per_worker=int(os.environ.get("AI_CORE_ASR_POOL_THREADS", "0")),
+            config_key=json.dumps(cfg_dict, sort_keys=True),
+            timeout_s=float(os.environ.get("AI_CORE_ASR_POOL_TIMEOUT_S", "120")),
+        )
+
+    @staticmethod
+    def _with_cpu_threads(cfg: object, num_threads: int) -> object:
+        # 各 worker 平分 CPU 核数，避免 N 个进程各开满线程互相抢占
+        if is_dataclass(cfg) and "cpu_threads" in {f.name for f in fields(cfg)}:
+            if not getattr(cfg, "cpu_threads"):
+                return replace(cfg, cpu_threads=num_threads)
+        return cfg
+
+    def matches(self, backend: str, config_key: str) -> bool:
+        return backend.strip().lower() == self.backend and config_key == self.config_key
+
+    def start(self) -> None:
+        global _PRELOADED_ASR
+
+        with self._lock:
+            if self._workers:
+                return
+            ctx = mp.get_context(self.start_method)
+            if self.start_method == "fork":
+                # 先在父进程设好线程数再加载，fork 出来的子进程沿用同一个模型对象
+                _limit_threads(self.threads_per_worker)
+                _PRELOADED_ASR = create_asr(self.backend, self.cfg)  # type: ignore[arg-type]
+
+            self._ctx = ctx
+            for _ in range(self.num_workers):
+                self._idle.put(self._spawn_worker())
+
+            if self.start_method == "fork":
+                # 父进程不做推理，释放自己的引用；子进程里的副本不受影响。
+                # 之后补 worker 时服务进程已经起了很多线程，不能再 fork，改用 forkserver / spawn
+                _PRELOADED_ASR = None
+                self._ctx = mp.get_context(
+                    "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+                )
+            self._fanout = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="asr-pool")
+
+    def _spawn_worker(self) -> _Worker:
+        # 调用方持有 self._lock
+        assert self._ctx is not None
+        # 先建共享内存再启动子进程：resource_tracker 在 fork 前已存在，父子共用同一个，
+        # 子进程退出时不会把父进程还在用的共享内存当成泄漏回收
+        shm = shared_memory.SharedMemory(create=True, size=_INITIAL_SHM_BYTES)
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.backend, self.cfg, self.threads_per_worker),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process=process, conn=parent_conn, shm=shm)
+        self._workers.append(worker)
+        return worker
+
+    @staticmethod
+    def _dispose_worker(worker: _Worker) -> None:
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=5.0)
+        worker.conn.close()
+        worker.shm.close()
+        try:
+            worker.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _replace_worker(self, worker: _Worker) -> None:
+        """
+        worker 进程死了、卡住或者管道断了：回收它，再起一个新的放回空闲队列，池子的大小不变。
+        fork 模式下新进程用 forkserver / spawn 启动，自己加载一份模型（不再和其他 worker 共享权重）。
+        """
+        with self._lock:
+            if worker not in self._workers:
+                return
+            self._workers.remove(worker)
+            self._dispose_worker(worker)
+            if self._fanout is None:
+                # 池子已经关闭，不再补
+                return
+            self._idle.put(self._spawn_worker())
+
+    def close(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for worker in self._workers:
+                worker.process.join(timeout=5.0)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                worker.conn.close()
+                worker.shm.close()
+                worker.shm.unlink()
+            self._workers.clear()
+            if self._fanout is not None:
+                self._fanout.shutdown(wait=False)
+                self._fanout = None
+
+    @staticmethod
+    def _await_ready(worker: _Worker) -> None:
+        # 新起的 worker 第一次被用到：等它加载完模型
+        if not worker.conn.poll(_STARTUP_TIMEOUT_S):
+            raise ASRPoolUnavailable(f"ASR worker pid={worker.process.pid} did not start within {_STARTUP_TIMEOUT_S:.0f}s")
+        status, payload = worker.conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"ASR worker failed to start: {payload}")
+        worker.ready = True
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int = 16000) -> ASRResult:
+        x = np.ascontiguousarray(audio, dtype=np.float32).reshape(-1)
+        if self._fanout is None:
+            raise ASRPoolUnavailable("ASRWorkerPool is not started or already closed")
+        try:
+            worker = self._idle.get(timeout=self.timeout_s)
+        except queue.Empty:
+            raise ASRPoolUnavailable(f"No idle ASR worker within {self.timeout_s:.0f}s") from None
+        # 只有正常拿到结果才放回空闲队列，其他出错路径都换掉这个 worker
+        dead = True
+        try:
+            if not worker.ready:
+                self._await_ready(worker)
+            worker.ensure_capacity(x.nbytes)
+            np.ndarray(x.shape, dtype=np.float32, buffer=worker.shm.buf)[:] = x
+            worker.conn.send((worker.shm.name, len(x), int(sample_rate)))
+            if not worker.conn.poll(self.timeout_s):
+                raise ASRPoolUnavailable(f"ASR worker pid={worker.process.pid} timed out after {self.timeout_s:.0f}s")
+            status, payload = worker.conn.recv()
+            dead = False
+        except (EOFError, OSError) as exc:
+            raise RuntimeError(f"ASR worker pid={worker.process.pid} died") from exc
+        finally:
+            if dead:
+                # 死掉或卡住的 worker 不能放回空闲队列，否则之后的请求都会落到它上面
+                self._replace_worker(worker)
+            else:
+                self._idle.put(worker)
+
+        if status != "ok":
+            raise RuntimeError(f"ASR worker failed: {payload}")
+        return payload
+
+    def transcribe_batch(self, audios: Sequence[np.ndarray], sample_rate: int = 16000) -> List[ASRResult]:
+        if self._fanout is None:
+            raise RuntimeError("ASRWorkerPool is not started")
+        return list(self._fanout.map(lambda a: self.transcribe(a, sample_rate=sample_rate), audios))
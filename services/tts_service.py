@@ -1,23 +1,56 @@
 from __future__ import annotations
 
-from typing import Any
-
-from fastapi import FastAPI, HTTPException
+import base64
+from collections import OrderedDict
+import json
+import os
+import threading
+from typing import Annotated, Any
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
+from src.audio import decode_audio, encode_audio, resample, resolve_format
+from src.audio.codec import OPUS_SAMPLE_RATES
+from src.tts.base import BaseTTS, TTSResult, batch_synthesize
 from src.tts.factory import TTS_REGISTRY, create_tts
-from services.common import build_config
+from src.tts.frontend import FrontendTTS, TTSFrontend
+from services.common import audio_response, build_config, negotiate_audio_format
 from services.runtime import ensure_remote_backend_ready
 
 app = FastAPI(title="ai_core TTS Service", version="1.0.0")
 
+# (backend, config) -> TTS 实例：Genie 的模型和参考音频不必每个请求重新加载
+_TTS_INSTANCES: "OrderedDict[str, BaseTTS]" = OrderedDict()
+_TTS_INSTANCES_MAX = int(os.environ.get("AI_CORE_TTS_INSTANCES", "2"))
+_TTS_INSTANCES_LOCK = threading.Lock()
+
+# 一次批量请求最多几段文本
+_BATCH_MAX_TEXTS = int(os.environ.get("AI_CORE_TTS_BATCH_MAX_TEXTS", "64"))
+
+# 文本规整，所有后端共用（AI_CORE_TTS_FRONTEND=1 打开）
+_FRONTEND = TTSFrontend()
+
 
 class TTSRequest(BaseModel):
     text: str = Field(..., min_length=1)
     backend: str = "genie_tts"
     voice: str | None = None
     sample_rate: int | None = None
+    # "wav" / "pcm_s16le" / "pcm_f32le" / "ogg_opus"；为空时按 Accept header 协商，默认 wav
+    audio_format: str | None = None
+    config: dict[str, Any] | None = None
+
+
+class TTSBatchRequest(BaseModel):
+    texts: list[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1, max_length=_BATCH_MAX_TEXTS)
+    backend: str = "genie_tts"
+    voice: str | None = None
+    sample_rate: int | None = None
+    # 每段音频的格式，默认 wav；音频以 base64 放在 JSON 里返回
+    audio_format: str | None = None
     config: dict[str, Any] | None = None
 
 
@@ -26,16 +59,15 @@ def health() -> dict:
     return {"ok": True, "service": "tts"}
 
 
-@app.post("/v1/tts/synthesize")
-def synthesize(req: TTSRequest) -> Response:
-    name = req.backend.strip().lower()
+def _get_or_create_tts(name: str, config: dict[str, Any] | None) -> BaseTTS:
     entry = TTS_REGISTRY.get(name)
     if entry is None:
         raise HTTPException(status_code=400, detail=f"Unknown TTS backend: {name}")
 
-    cfg = build_config(entry.cfg_cls, req.config)
+    cfg = build_config(entry.cfg_cls, config)
 
     if entry.runtime_type == "remote_managed":
+        # 缓存命中也要检查：远端服务可能在两次请求之间挂掉，需要重新拉起
         endpoint = getattr(cfg, "endpoint", None)
         verify_ssl = bool(getattr(cfg, "verify_ssl", False))
         if not endpoint:
@@ -50,25 +82,119 @@ def synthesize(req: TTSRequest) -> Response:
         except Exception as exc:
             raise HTTPException(status_code=503, detail=f"Remote backend startup failed: {exc}") from exc
 
+    key = f"{name}:{json.dumps(config or {}, sort_keys=True, default=str)}"
+    with _TTS_INSTANCES_LOCK:
+        tts = _TTS_INSTANCES.get(key)
+        if tts is not None:
+            _TTS_INSTANCES.move_to_end(key)
+            return tts
+
     tts = create_tts(name, cfg)
+    if _FRONTEND.cfg.enabled:
+        tts = FrontendTTS(tts, _FRONTEND)
+    created = tts
+    with _TTS_INSTANCES_LOCK:
+        # 并发首请求可能各建了一个实例，保留先放进去的那个
+        tts = _TTS_INSTANCES.setdefault(key, created)
+        _TTS_INSTANCES.move_to_end(key)
+        evicted = [] if tts is created else [created]
+        while len(_TTS_INSTANCES) > max(1, _TTS_INSTANCES_MAX):
+            evicted.append(_TTS_INSTANCES.popitem(last=False)[1])
+    for old in evicted:
+        # Genie 的 worker 进程池随实例一起关掉
+        close = getattr(old, "close", None)
+        if callable(close):
+            close()
+    return tts
+
+
+@app.post("/v1/tts/synthesize")
+def synthesize(req: TTSRequest, request: Request) -> Response:
+    name = req.backend.strip().lower()
+    out_format = negotiate_audio_format(req.audio_format, request.headers.get("accept"))
+    tts = _get_or_create_tts(name, req.config)
 
     try:
         result = tts.synthesize(req.text, voice=req.voice, sample_rate=req.sample_rate)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"TTS synthesis failed: {exc}") from exc
 
-    audio_format = (result.audio_format or "wav").lower()
-    if audio_format != "wav":
+    headers = {"X-Backend": result.backend or name}
+    if result.model:
+        headers["X-Model"] = result.model
+
+    source_format = (result.audio_format or "wav").lower()
+    if source_format == out_format == "wav" and result.audio_bytes:
+        headers["X-Sample-Rate"] = str(result.sample_rate)
+        return Response(content=result.audio_bytes, media_type="audio/wav", headers=headers)
+
+    try:
+        audio, sr = _result_audio(result)
+    except Exception as exc:
         raise HTTPException(
             status_code=500,
-            detail=f"TTS backend returned unsupported format '{audio_format}', expected wav",
-        )
+            detail=f"TTS backend returned undecodable '{source_format}' audio: {exc}",
+        ) from exc
 
-    headers = {
-        "X-Backend": result.backend or name,
-        "X-Sample-Rate": str(result.sample_rate),
-    }
-    if result.model:
-        headers["X-Model"] = result.model
+    return audio_response(audio, sr, out_format, headers=headers)
+
+
+def _result_audio(result: TTSResult) -> tuple[np.ndarray, int]:
+    # 后端直接给了 PCM 时不用解码
+    if result.pcm is not None:
+        return result.pcm, result.sample_rate
+    source_format = (result.audio_format or "wav").lower()
+    return decode_audio(result.audio_bytes, resolve_format(source_format), sample_rate=result.sample_rate)
+
+
+def _encode_result(result: TTSResult, out_format: str) -> tuple[bytes, int]:
+    source_format = (result.audio_format or "wav").lower()
+    if source_format == out_format and result.audio_bytes:
+        return result.audio_bytes, result.sample_rate
+    audio, sr = _result_audio(result)
+    if out_format == "ogg_opus" and int(sr) not in OPUS_SAMPLE_RATES:
+        audio = resample(audio, sr, 48000)
+        sr = 48000
+    return encode_audio(audio, sr, out_format), sr
+
+
+@app.post("/v1/tts/synthesize_batch")
+def synthesize_batch(req: TTSBatchRequest) -> dict:
+    """
+    多段文本一次合成（预生成提示音、批量内容），后端支持时在模型层面批量推理，结果按输入顺序返回。
+    """
+    name = req.backend.strip().lower()
+    out_format = negotiate_audio_format(req.audio_format, None)
+    tts = _get_or_create_tts(name, req.config)
 
-    return Response(content=result.audio_bytes, media_type="audio/wav", headers=headers)
+    try:
+        results = batch_synthesize(tts, req.texts, voice=req.voice, sample_rate=req.sample_rate)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"TTS synthesis failed: {exc}") from exc
+    if len(results) != len(req.texts):
+        raise HTTPException(
+            status_code=500,
+            detail=f"TTS backend returned {len(results)} results for {len(req.texts)} texts",
+        )
+
+    items = []
+    for idx, (text, result) in enumerate(zip(req.texts, results)):
+        try:
+            payload, sr = _encode_result(result, out_format)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        except Exception as exc:
+            raise HTTPException(
+                status_code=500,
+                detail=f"TTS backend returned undecodable audio for text {idx}: {exc}",
+            ) from exc
+        items.append(
+            {
+                "index": idx,
+                "text": text,
+                "audio_format": out_format,
+                "sample_rate": sr,
+                "audio_base64": base64.b64encode(payload).decode("ascii"),
+            }
+        )
+    return {"backend": results[0].backend or name, "results": items}
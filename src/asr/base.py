@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Protocol, Union, Optional
+from typing import Iterator, List, Protocol, Sequence, Union, Optional
 from pathlib import Path
 import numpy as np
 
@@ -14,8 +14,79 @@ class ASRResult:
     lang: Optional[str] = None
     backend: Optional[str] = None
 
+@dataclass
+class ASRWord:
+    word: str
+    start: float                      # 秒
+    end: float
+    probability: Optional[float] = None
+
+@dataclass
+class ASRSegment:
+    """
+    流式识别的一段结果（通常是一句），时间单位为秒。
+    """
+    text: str
+    start: float
+    end: float
+    lang: Optional[str] = None
+    words: Optional[List[ASRWord]] = None
+
 class ASRBackend(Protocol):
     """
     ASR 后端接口：任何模型只要实现 transcribe() 就能接入 always_listen。
     """
     def transcribe(self, audio: AudioInput, sample_rate: int = 16000) -> ASRResult: ...
+
+    def transcribe_batch(self, audios: Sequence[AudioInput], sample_rate: int = 16000) -> List[ASRResult]:
+        """
+        可选：一次推理多段音频，返回顺序与输入一致。没有实现的后端用 transcribe_batch() 辅助函数逐条兜底。
+        """
+        ...
+
+    def transcribe_stream(
+        self,
+        audio: AudioInput,
+        sample_rate: int = 16000,
+        word_timestamps: Optional[bool] = None,
+    ) -> Iterator[ASRSegment]:
+        """
+        可选：边解码边 yield 分段结果。没有实现的后端用 transcribe_stream() 辅助函数整段兜底。
+        """
+        ...
+
+
+def transcribe_batch(asr: ASRBackend, audios: Sequence[AudioInput], sample_rate: int = 16000) -> List[ASRResult]:
+    """
+    后端有 transcribe_batch 就走批量推理，否则逐条 transcribe。
+    """
+    batch_fn = getattr(asr, "transcribe_batch", None)
+    if callable(batch_fn):
+        return list(batch_fn(audios, sample_rate=sample_rate))
+    return [asr.transcribe(a, sample_rate=sample_rate) for a in audios]
+
+
+def transcribe_stream(
+    asr: ASRBackend,
+    audio: AudioInput,
+    sample_rate: int = 16000,
+    word_timestamps: Optional[bool] = None,
+) -> Iterator[ASRSegment]:
+    """
+    后端有 transcribe_stream 就逐段产出，否则整段识别后作为一个分段返回。
+    """
+    stream_fn = getattr(asr, "transcribe_stream", None)
+    if callable(stream_fn):
+        yield from stream_fn(audio, sample_rate=sample_rate, word_timestamps=word_timestamps)
+        return
+
+    res = asr.transcribe(audio, sample_rate=sample_rate)
+    if isinstance(audio, np.ndarray):
+        duration = len(audio) / float(sample_rate)
+    else:
+        import soundfile as sf
+
+        duration = float(sf.info(str(audio)).duration)
+    text = (res.text or "").strip()
+    if text:
+        yield ASRSegment(text=text, start=0.0, end=duration, lang=res.lang)
@@ -19,6 +19,7 @@ class ASRBackendEntry:
     model_name: str
     model_dir: str
     runtime_type: RuntimeType = "local"
+    sample_rate: int = 16000          # 模型原生采样率，服务端会把输入重采样到这里
 
 
 ASR_REGISTRY: Dict[str, ASRBackendEntry] = {
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any
+from typing import Any, List, Sequence
 import tempfile
 
 import numpy as np
@@ -40,6 +40,17 @@ class ParaformerASR:
                 return str(first["text"]).strip()
         return str(res).strip()
 
+    @staticmethod
+    def _parse_texts(res: Any) -> List[str]:
+        if not isinstance(res, list):
+            return []
+        texts: List[str] = []
+        for item in res:
+            if not isinstance(item, dict) or "text" not in item:
+                return []
+            texts.append(str(item["text"]).strip())
+        return texts
+
     @staticmethod
     def _ensure_float32_mono(audio: np.ndarray) -> np.ndarray:
         a = np.asarray(audio)
@@ -99,6 +110,34 @@ class ParaformerASR:
                     backend=f"paraformer/{self.cfg.model}:{self.cfg.device}(tmpwav)",
                 )
 
+    def transcribe_batch(self, audios: Sequence[AudioInput], sample_rate: int = 16000) -> List[ASRResult]:
+        """
+        funasr 的 generate 支持 list 输入：一次前向处理 batch_size 条。
+        结果条数对不上时退回逐条识别。
+        """
+        if not audios:
+            return []
+
+        inputs = [
+            str(a) if isinstance(a, (str, Path)) else self._ensure_float32_mono(a)
+            for a in audios
+        ]
+        backend = f"paraformer/{self.cfg.model}:{self.cfg.device}"
+        try:
+            res = self.model.generate(
+                input=inputs,
+                batch_size=len(inputs),
+                batch_size_s=self.cfg.batch_size_s,
+                hotword=self.cfg.hotword or "",
+            )
+            texts = self._parse_texts(res)
+        except Exception:
+            texts = []
+
+        if len(texts) != len(inputs):
+            return [self.transcribe(a, sample_rate=sample_rate) for a in audios]
+        return [ASRResult(text=t, lang=None, backend=f"{backend}(batch)") for t in texts]
+
 
 if __name__ == "__main__":
     # 自测：
@@ -12,3 +12,5 @@ class ASRConfig:
     language: Optional[str] = "zh"    # None=自动识别
     beam_size: int = 5
     vad_filter: bool = False          # 你已有 webrtcvad 切句，通常 False
+    word_timestamps: bool = False     # transcribe_stream 默认是否输出词级时间戳（会略增加解码耗时）
+    cpu_threads: int = 0              # CTranslate2 CPU 线程数，0=库默认；多进程池会按 worker 数分配
@@ -1,10 +1,12 @@
 # src/asr/whisper/model.py
 from __future__ import annotations
 
+from typing import Iterator, List, Optional, Sequence
+
 import numpy as np
 from faster_whisper import WhisperModel
 
-from src.asr.base import ASRResult, AudioInput
+from src.asr.base import ASRResult, ASRSegment, ASRWord, AudioInput
 from src.asr.whisper.config import ASRConfig
 
 
@@ -28,6 +30,7 @@ class FasterWhisperASR:
             cfg.model_size,
             device=self.device,
             compute_type=self.compute_type,
+            cpu_threads=cfg.cpu_threads,
         )
 
     @staticmethod
@@ -39,32 +42,73 @@ class FasterWhisperASR:
             raise ValueError("audio must be mono 1D array (shape=(n_samples,))")
         return a.astype(np.float32, copy=False)
 
-    def transcribe(self, audio: AudioInput, sample_rate: int = 16000) -> ASRResult:
-        """
-        audio: wav路径(str/Path) 或 numpy float32 mono (N,)
-        sample_rate: 保留用于接口统一（whisper 通常不需要）
-        """
+    @property
+    def backend_name(self) -> str:
+        return f"whisper/{self.cfg.model_size}:{self.device},{self.compute_type}"
+
+    def _run(self, audio: AudioInput, word_timestamps: bool = False):
         if isinstance(audio, np.ndarray):
             audio_in = self._ensure_float32_mono(audio)
         else:
             audio_in = str(audio)
 
-        segments_iter, info = self.model.transcribe(
+        # segments_iter 是惰性的：迭代时才逐段解码
+        return self.model.transcribe(
             audio_in,
             language=self.cfg.language,
             beam_size=self.cfg.beam_size,
             vad_filter=self.cfg.vad_filter,
+            word_timestamps=word_timestamps,
         )
 
+    def transcribe(self, audio: AudioInput, sample_rate: int = 16000) -> ASRResult:
+        """
+        audio: wav路径(str/Path) 或 numpy float32 mono (N,)
+        sample_rate: 保留用于接口统一（whisper 通常不需要）
+        """
+        segments_iter, info = self._run(audio)
+
         text = "".join(s.text for s in segments_iter).strip()
         lang = getattr(info, "language", None)
 
         return ASRResult(
             text=text,
             lang=lang,
-            backend=f"whisper/{self.cfg.model_size}:{self.device},{self.compute_type}",
+            backend=self.backend_name,
         )
 
+    def transcribe_stream(
+        self,
+        audio: AudioInput,
+        sample_rate: int = 16000,
+        word_timestamps: Optional[bool] = None,
+    ) -> Iterator[ASRSegment]:
+        """
+        每解码出一段就 yield，长音频可以先拿到第一句。
+        word_timestamps: None=沿用 cfg.word_timestamps
+        """
+        with_words = self.cfg.word_timestamps if word_timestamps is None else bool(word_timestamps)
+        segments_iter, info = self._run(audio, word_timestamps=with_words)
+        lang = getattr(info, "language", None)
+
+        for s in segments_iter:
+            text = s.text.strip()
+            if not text:
+                continue
+            words = None
+            if with_words and s.words:
+                words = [
+                    ASRWord(word=w.word.strip(), start=float(w.start), end=float(w.end), probability=w.probability)
+                    for w in s.words
+                ]
+            yield ASRSegment(text=text, start=float(s.start), end=float(s.end), lang=lang, words=words)
+
+    def transcribe_batch(self, audios: Sequence[AudioInput], sample_rate: int = 16000) -> List[ASRResult]:
+        """
+        faster-whisper 只在单条音频内部做 batch，跨文件没有批量接口，这里逐条识别。
+        """
+        return [self.transcribe(a, sample_rate=sample_rate) for a in audios]
+
 
 if __name__ == "__main__":
     # 自测：
@@ -73,6 +117,8 @@ if __name__ == "__main__":
 
     wav = sys.argv[1] if len(sys.argv) > 1 else "out/test.wav"
     asr = FasterWhisperASR(ASRConfig(model_size="small", device="auto", compute_type="auto", language=None))
+    for seg in asr.transcribe_stream(wav):
+        print(f"[{seg.start:6.2f} -> {seg.end:6.2f}] {seg.text}")
     res = asr.transcribe(wav)
     print(res.text)
     print(f"[lang={res.lang}] [{res.backend}]")
@@ -0,0 +1,30 @@
+from src.audio.codec import (
+    AUDIO_FORMATS,
+    AudioFormat,
+    decode_audio,
+    decode_pcm,
+    encode_audio,
+    is_raw_pcm,
+    iter_encode_audio,
+    media_type_for,
+    parse_media_type,
+    resolve_format,
+)
+from src.audio.playback import PlaybackRing
+from src.audio.resample import resample, resample_ratio
+
+__all__ = [
+    "AUDIO_FORMATS",
+    "AudioFormat",
+    "decode_audio",
+    "decode_pcm",
+    "encode_audio",
+    "is_raw_pcm",
+    "iter_encode_audio",
+    "media_type_for",
+    "parse_media_type",
+    "PlaybackRing",
+    "resample",
+    "resample_ratio",
+    "resolve_format",
+]
@@ -0,0 +1,276 @@
+# src/audio/codec.py
+from __future__ import annotations
+
+import io
+import struct
+from typing import BinaryIO, Dict, Iterator, Literal, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+AudioFormat = Literal["wav", "pcm_s16le", "pcm_f32le", "ogg_opus"]
+
+AUDIO_FORMATS: Tuple[str, ...] = ("wav", "pcm_s16le", "pcm_f32le", "ogg_opus")
+
+# 格式 -> 对外 media type（raw PCM 为小端，不能用 RFC 2586 的 audio/L16，它是大端）
+MEDIA_TYPES: Dict[str, str] = {
+    "wav": "audio/wav",
+    "pcm_s16le": "audio/x-pcm-s16le",
+    "pcm_f32le": "audio/x-pcm-f32le",
+    "ogg_opus": "audio/ogg",
+}
+
+# 可识别的 media type / 别名 -> 格式
+_MEDIA_TYPE_ALIASES: Dict[str, str] = {
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-pcm-s16le": "pcm_s16le",
+    "audio/pcm": "pcm_s16le",
+    "audio/x-pcm-f32le": "pcm_f32le",
+    "audio/ogg": "ogg_opus",
+    "audio/opus": "ogg_opus",
+    "application/ogg": "ogg_opus",
+}
+
+_PCM_DTYPES: Dict[str, str] = {
+    "pcm_s16le": "<i2",
+    "pcm_f32le": "<f4",
+}
+
+# Opus 只支持这些采样率，其余采样率需要调用方先重采样
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+DEFAULT_BLOCK_FRAMES = 8192
+
+
+def parse_media_type(content_type: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """
+    "audio/x-pcm-s16le; rate=16000" -> ("audio/x-pcm-s16le", {"rate": "16000"})
+    """
+    if not content_type:
+        return "", {}
+    pieces = [p.strip() for p in content_type.split(";")]
+    params: Dict[str, str] = {}
+    for p in pieces[1:]:
+        if "=" in p:
+            k, v = p.split("=", 1)
+            params[k.strip().lower()] = v.strip().strip('"')
+    return pieces[0].lower(), params
+
+
+def resolve_format(value: str) -> AudioFormat:
+    """
+    接受格式名（"wav" / "pcm_s16le" / ...）或 media type，返回规范格式名。
+    """
+    key = (value or "").strip().lower()
+    if key in AUDIO_FORMATS:
+        return key  # type: ignore[return-value]
+    media_type, _ = parse_media_type(key)
+    fmt = _MEDIA_TYPE_ALIASES.get(media_type)
+    if fmt is None:
+        raise ValueError(
+            f"Unsupported audio format '{value}'. Supported: {', '.join(AUDIO_FORMATS)}"
+        )
+    return fmt  # type: ignore[return-value]
+
+
+def is_raw_pcm(fmt: str) -> bool:
+    return fmt in _PCM_DTYPES
+
+
+def media_type_for(fmt: str, sample_rate: Optional[int] = None) -> str:
+    media_type = MEDIA_TYPES[fmt]
+    if fmt == "ogg_opus":
+        return f"{media_type}; codecs=opus"
+    if is_raw_pcm(fmt) and sample_rate:
+        return f"{media_type}; rate={int(sample_rate)}; channels=1"
+    return media_type
+
+
+# =========================
+# Decode
+# =========================
+
+def decode_pcm(payload: Union[bytes, bytearray, memoryview], fmt: str, channels: int = 1) -> np.ndarray:
+    """
+    raw PCM -> float32 mono。pcm_f32le 直接在原缓冲区上建视图（不解码、不拷贝）。
+    """
+    dtype = _PCM_DTYPES.get(fmt)
+    if dtype is None:
+        raise ValueError(f"Not a raw PCM format: {fmt}")
+    itemsize = np.dtype(dtype).itemsize
+    usable = len(payload) - len(payload) % (itemsize * channels)
+    samples = np.frombuffer(payload, dtype=dtype, count=usable // itemsize)
+    if samples.dtype != np.float32:
+        samples = samples.astype(np.float32)
+        samples *= 1.0 / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples
+
+
+def _read_into_buffer(fp: BinaryIO) -> bytearray:
+    """
+    按剩余长度一次性分配缓冲区并 readinto，避免 read() -> bytes -> BytesIO 的多次拷贝。
+    """
+    start = fp.tell()
+    end = fp.seek(0, io.SEEK_END)
+    fp.seek(start)
+    buf = bytearray(max(0, end - start))
+    view = memoryview(buf)
+    filled = 0
+    while filled < len(buf):
+        n = fp.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    del view
+    if filled < len(buf):
+        del buf[filled:]
+    return buf
+
+
+def decode_audio(
+    source: Union[bytes, bytearray, memoryview, BinaryIO],
+    fmt: str,
+    *,
+    sample_rate: Optional[int] = None,
+    channels: int = 1,
+) -> Tuple[np.ndarray, int]:
+    """
+    解码为 float32 mono。raw PCM 必须由调用方给出 sample_rate（通常来自 header）。
+    source 可以是字节，也可以是可 seek 的文件对象（直接从文件流解码，不先整体读成 bytes）。
+    """
+    if is_raw_pcm(fmt):
+        if not sample_rate:
+            raise ValueError(f"sample_rate is required for raw {fmt}")
+        payload = source if isinstance(source, (bytes, bytearray, memoryview)) else _read_into_buffer(source)
+        return decode_pcm(payload, fmt, channels=channels), int(sample_rate)
+
+    fp = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    data, sr = sf.read(fp, dtype="float32", always_2d=True)
+    if data.shape[1] == 1:
+        # (N, 1) 的第一列本身就是连续内存，直接取视图
+        return data[:, 0], int(sr)
+    return data.mean(axis=1, dtype=np.float32), int(sr)
+
+
+# =========================
+# Encode (streaming)
+# =========================
+
+def _float_to_pcm16(block: np.ndarray) -> bytes:
+    return (np.clip(block, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def _wav_header(num_frames: int, sample_rate: int) -> bytes:
+    bits = 16
+    block_align = bits // 8
+    data_size = num_frames * block_align
+    return b"".join(
+        [
+            b"RIFF",
+            struct.pack("<I", 36 + data_size),
+            b"WAVE",
+            b"fmt ",
+            struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * block_align, block_align, bits),
+            b"data",
+            struct.pack("<I", data_size),
+        ]
+    )
+
+
+class _ChunkSink:
+    """
+    只追加的 file-like，给 libsndfile 写 OGG 用：写出的字节按块取走，不保留整段编码结果。
+    """
+
+    def __init__(self) -> None:
+        self._pos = 0
+        self._pending: list[bytes] = []
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._pending.append(chunk)
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        return b""
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        target = offset if whence == io.SEEK_SET else self._pos + offset
+        if target != self._pos:
+            raise io.UnsupportedOperation("stream sink is not seekable")
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._pending)
+        self._pending.clear()
+        return out
+
+
+def iter_encode_audio(
+    audio: np.ndarray,
+    sample_rate: int,
+    fmt: str,
+    *,
+    block_frames: int = DEFAULT_BLOCK_FRAMES,
+) -> Iterator[bytes]:
+    """
+    float32 mono -> 按块编码输出，不在内存里拼完整文件。
+    """
+    x = np.asarray(audio, dtype=np.float32).reshape(-1)
+    n = len(x)
+
+    if fmt == "pcm_f32le":
+        for start in range(0, n, block_frames):
+            yield x[start : start + block_frames].astype("<f4", copy=False).tobytes()
+        return
+
+    if fmt == "pcm_s16le":
+        for start in range(0, n, block_frames):
+            yield _float_to_pcm16(x[start : start + block_frames])
+        return
+
+    if fmt == "wav":
+        # 长度已知，头部可以先写出，数据块直接跟在后面
+        yield _wav_header(n, int(sample_rate))
+        for start in range(0, n, block_frames):
+            yield _float_to_pcm16(x[start : start + block_frames])
+        return
+
+    if fmt == "ogg_opus":
+        if int(sample_rate) not in OPUS_SAMPLE_RATES:
+            raise ValueError(
+                f"Opus does not support sample_rate={sample_rate}; "
+                f"resample to one of {OPUS_SAMPLE_RATES}"
+            )
+        sink = _ChunkSink()
+        with sf.SoundFile(
+            sink,
+            mode="w",
+            samplerate=int(sample_rate),
+            channels=1,
+            format="OGG",
+            subtype="OPUS",
+        ) as f:
+            for start in range(0, n, block_frames):
+                f.write(x[start : start + block_frames])
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        tail = sink.drain()
+        if tail:
+            yield tail
+        return
+
+    raise ValueError(f"Unsupported audio format: {fmt}")
+
+
+def encode_audio(audio: np.ndarray, sample_rate: int, fmt: str) -> bytes:
+    return b"".join(iter_encode_audio(audio, sample_rate, fmt))
@@ -0,0 +1,165 @@
+# src/audio/playback.py
+from __future__ import annotations
+
+from collections import deque
+import time
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+import numpy as np
+
+from src.audio.resample import resample
+
+
+class PlaybackRing:
+    """
+    实时播放用的环形缓冲区：单生产者（播放线程写入）/ 单消费者（声卡回调读出）。
+    - 缓冲区预先分配，回调里只做切片拷贝，不分配 numpy 数组、不加锁
+    - 读写位置是单调递增的帧计数，各自只由一方修改（CPython 下 int 赋值是原子的）
+    - flush() 打断播放时先淡出 fade_frames 帧再跳过剩余音频，避免爆音
+    - 不同采样率的段落写入前重采样到 sample_rate，输出流不必关闭重开
+
+        ring = PlaybackRing(sample_rate=32000, seconds=30)
+        stream = sd.OutputStream(samplerate=ring.sample_rate, channels=1, dtype="float32", callback=ring.callback)
+        ring.write_all(pcm, src_rate=24000, meta=seg)     # 播放线程
+        for seg in ring.pop_completed(): ...              # 已经播完的段落
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        seconds: float = 30.0,
+        channels: int = 1,
+        fade_ms: float = 20.0,
+    ) -> None:
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.capacity = max(1, int(self.sample_rate * seconds))
+        self._buf = np.zeros((self.capacity, self.channels), dtype=np.float32)
+        fade_frames = max(0, int(self.sample_rate * fade_ms / 1000.0))
+        # 淡出曲线也预先算好，回调里只做 in-place 乘法
+        self._fade = np.linspace(1.0, 0.0, fade_frames, dtype=np.float32).reshape(-1, 1)
+        self._write = 0       # 生产者：已写入的总帧数
+        self._read = 0        # 消费者：已读出的总帧数
+        self._flush_to = 0    # 生产者：这个位置之前的音频不再播放
+        self._segments: Deque[Tuple[int, Any]] = deque()  # 生产者：(段落结束位置, meta)
+
+    # ---------- producer ----------
+
+    def buffered(self) -> int:
+        return self._write - max(self._read, self._flush_to)
+
+    def free(self) -> int:
+        return self.capacity - (self._write - self._read)
+
+    def write(self, samples: np.ndarray) -> int:
+        """
+        尽量写入（缓冲区满时只写一部分），返回写入的帧数。
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples.reshape(-1, 1)
+        n = min(len(samples), self.free())
+        if n <= 0:
+            return 0
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start : start + first] = samples[:first]
+        if n > first:
+            self._buf[: n - first] = samples[first:n]
+        # 数据先写好再移动写位置，消费者看到的位置之前一定是完整数据
+        self._write += n
+        return n
+
+    def write_all(
+        self,
+        samples: np.ndarray,
+        *,
+        src_rate: Optional[int] = None,
+        meta: Any = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        poll_s: float = 0.005,
+    ) -> bool:
+        """
+        写入一整段（必要时先重采样）；缓冲区满时等待回调读走。should_stop() 为真时放弃剩余部分返回 False。
+        meta 不为空时记录这一段的结束位置，播完后由 pop_completed() 返回。
+        """
+        if src_rate is not None and int(src_rate) != self.sample_rate:
+            samples = resample(samples, int(src_rate), self.sample_rate)
+        samples = np.asarray(samples, dtype=np.float32)
+        offset = 0
+        while offset < len(samples):
+            if should_stop is not None and should_stop():
+                return False
+            written = self.write(samples[offset:])
+            offset += written
+            if not written:
+                time.sleep(poll_s)
+        if meta is not None:
+            self.mark_segment(meta)
+        return True
+
+    def mark_segment(self, meta: Any) -> None:
+        """
+        记录已写入部分的结束位置，播到这里时 pop_completed() 返回 meta。
+        """
+        self._segments.append((self._write, meta))
+
+    def flush(self) -> None:
+        """
+        丢掉已写入但还没播放的音频（打断），回调先淡出再跳过。
+        """
+        self._flush_to = self._write
+        self._segments.clear()
+
+    def pop_completed(self) -> List[Any]:
+        done: List[Any] = []
+        read = self._read
+        while self._segments and self._segments[0][0] <= read:
+            done.append(self._segments.popleft()[1])
+        return done
+
+    # ---------- consumer ----------
+
+    def read_into(self, out: np.ndarray) -> int:
+        """
+        填满 out（shape=(frames, channels)），不够的部分补零，返回实际音频帧数。不分配内存。
+        """
+        frames = len(out)
+        read = self._read
+        write = self._write
+        flush_to = self._flush_to
+        filled = 0
+
+        if flush_to > read:
+            # 打断：剩余音频淡出一小段后直接跳到 flush_to
+            n = min(len(self._fade), flush_to - read, frames)
+            if n > 0:
+                filled = self._copy_out(read, out, 0, n)
+                np.multiply(out[:n], self._fade[:n], out=out[:n])
+            read = max(read + n, flush_to)
+            # 淡出没走完也直接跳过，下一段从 flush_to 开始
+            self._read = read
+            out[filled:].fill(0.0)
+            return filled
+
+        n = min(frames, write - read)
+        if n > 0:
+            filled = self._copy_out(read, out, 0, n)
+            self._read = read + n
+        if filled < frames:
+            out[filled:].fill(0.0)
+        return filled
+
+    def _copy_out(self, read: int, out: np.ndarray, dst: int, n: int) -> int:
+        start = read % self.capacity
+        first = min(n, self.capacity - start)
+        out[dst : dst + first] = self._buf[start : start + first]
+        if n > first:
+            out[dst + first : dst + n] = self._buf[: n - first]
+        return n
+
+    def callback(self, outdata, frames, _time_info, _status) -> None:
+        """
+        sounddevice.OutputStream 的 callback。
+        """
+        self.read_into(outdata)
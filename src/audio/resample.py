@@ -0,0 +1,38 @@
+# src/audio/resample.py
+from __future__ import annotations
+
+from math import gcd
+
+import numpy as np
+
+try:
+    from scipy.signal import resample_poly
+except ImportError as e:
+    raise ImportError(
+        "src.audio.resample requires 'scipy'.\n"
+        "Please run:\n"
+        "  pip install -U scipy\n"
+        "and make sure you are in the correct virtual environment."
+    ) from e
+
+
+def resample_ratio(orig_sr: int, target_sr: int) -> tuple[int, int]:
+    """
+    返回约分后的 (up, down)，例如 44100 -> 16000 得到 (160, 441)。
+    """
+    g = gcd(int(orig_sr), int(target_sr))
+    return int(target_sr) // g, int(orig_sr) // g
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """
+    polyphase 重采样（float32 mono）。采样率相同时原样返回，不拷贝。
+    """
+    if int(orig_sr) <= 0 or int(target_sr) <= 0:
+        raise ValueError(f"Invalid sample rates: {orig_sr} -> {target_sr}")
+    x = np.asarray(audio, dtype=np.float32)
+    if int(orig_sr) == int(target_sr) or x.size == 0:
+        return x
+    up, down = resample_ratio(orig_sr, target_sr)
+    y = resample_poly(x, up, down)
+    return y.astype(np.float32, copy=False)
@@ -1,4 +1,4 @@
 from src.llm.Gemini.config import GeminiConfig
-from src.llm.Gemini.model import GeminiLLM
+from src.llm.Gemini.model import GeminiLLM, get_client
 
-__all__ = ["GeminiConfig", "GeminiLLM"]
+__all__ = ["GeminiConfig", "GeminiLLM", "get_client"]
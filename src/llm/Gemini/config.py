@@ -12,4 +12,6 @@ class GeminiConfig:
     api_key: str = field(default_factory=lambda: os.environ.get("GEMINI_API_KEY", "").strip())
     temperature: float = field(default_factory=lambda: float(os.environ.get("GEMINI_TEMPERATURE", "0.3")))
     timeout_s: float = field(default_factory=lambda: float(os.environ.get("GEMINI_TIMEOUT_S", "60")))
+    # 自定义 API 地址（代理 / 本地 fake_server）；None=SDK 默认
+    base_url: Optional[str] = field(default_factory=lambda: os.environ.get("GEMINI_BASE_URL") or None)
     tools: Optional[Sequence[Any]] = None
@@ -0,0 +1,159 @@
+# src/llm/Gemini/fake_server.py
+"""
+本地假 Gemini HTTP 服务，只实现 generateContent / streamGenerateContent（SSE），给测试和压测用：
+
+    python -m src.llm.Gemini.fake_server --port 8790
+    GEMINI_BASE_URL=http://127.0.0.1:8790 GEMINI_API_KEY=fake python3 -m services.run_service llm --port 8445
+
+回复内容默认是 "echo: <最后一条 user 文本>"，按字符切块，可配置每块延迟。
+"""
+from __future__ import annotations
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+ReplyFn = Callable[[str, dict], str]
+
+_PATH_RE = re.compile(r"^/(?:v1beta|v1alpha|v1)/models/([^/:]+):(generateContent|streamGenerateContent)$")
+
+
+def echo_reply(model: str, body: dict) -> str:
+    text = ""
+    for content in body.get("contents") or []:
+        if content.get("role", "user") == "user":
+            text = " ".join(p.get("text", "") for p in content.get("parts") or [] if "text" in p)
+    return f"echo: {text}"
+
+
+class FakeGeminiServer:
+    """
+    用法：
+        with FakeGeminiServer(chunk_delay_s=0.01) as server:
+            cfg = GeminiConfig(api_key="fake", base_url=server.base_url)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        reply: ReplyFn = echo_reply,
+        chunk_chars: int = 4,
+        chunk_delay_s: float = 0.0,
+        first_chunk_delay_s: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.reply = reply
+        self.chunk_chars = max(1, int(chunk_chars))
+        self.chunk_delay_s = float(chunk_delay_s)
+        # 按模型名设置首包延迟，用来模拟快慢不同的模型（fan-out / hedging 测试）
+        self.first_chunk_delay_s = dict(first_chunk_delay_s or {})
+        self.requests: List[dict] = []
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_cls())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_cls(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+            def do_POST(self):
+                path = self.path.split("?", 1)[0]
+                m = _PATH_RE.match(path)
+                if m is None:
+                    self.send_error(404)
+                    return
+                model, method = m.group(1), m.group(2)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server.requests.append({"model": model, "method": method, "body": body})
+
+                text = server.reply(model, body)
+                pieces = [text[i : i + server.chunk_chars] for i in range(0, len(text), server.chunk_chars)] or [""]
+                time.sleep(server.first_chunk_delay_s.get(model, 0.0))
+
+                if method == "generateContent":
+                    self._send_json(server._response(model, text, final=True))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for i, piece in enumerate(pieces):
+                        if i:
+                            time.sleep(server.chunk_delay_s)
+                        payload = server._response(model, piece, final=(i == len(pieces) - 1))
+                        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\r\n\r\n")
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客户端取消
+                self.close_connection = True
+
+            def _send_json(self, payload: dict) -> None:
+                raw = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        return Handler
+
+    @staticmethod
+    def _response(model: str, text: str, final: bool) -> dict:
+        candidate: dict = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        if final:
+            candidate["finishReason"] = "STOP"
+        return {"candidates": [candidate], "modelVersion": model}
+
+    def start(self) -> "FakeGeminiServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread = None
+
+    def __enter__(self) -> "FakeGeminiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Gemini API server (echo replies).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--chunk-delay-s", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(args.host, args.port, chunk_delay_s=args.chunk_delay_s)
+    print(f"Fake Gemini listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # src/llm/Gemini/model.py
 from __future__ import annotations
 
-from typing import Iterator, List, Optional, Tuple
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 import json
+import threading
 
 try:
     from google import genai
@@ -15,9 +16,49 @@ except ImportError as e:
         "and make sure you are in the correct virtual environment."
     ) from e
 
-from src.llm.base import LLMMessage, LLMChunk, CancelToken, CancelledError, MessagePart
+from src.llm.base import (
+    LLMMessage,
+    LLMChunk,
+    LLMResponse,
+    CancelToken,
+    CancelledError,
+    MessagePart,
+    StopCondition,
+    StopMatcher,
+)
 from src.llm.Gemini.config import GeminiConfig
 
+# GenerateContentConfig.stop_sequences 最多 5 个；其余的和 max_sentences 在本地按流匹配
+_MAX_NATIVE_STOP_SEQUENCES = 5
+
+# (api_key, base_url, timeout_ms) -> Client：同一个 key 复用一个 client 及其连接池（同步 / aio 各一套）
+_CLIENTS: Dict[Tuple[str, Optional[str], int], "genai.Client"] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(cfg: GeminiConfig) -> "genai.Client":
+    timeout_ms = int(float(cfg.timeout_s) * 1000) if cfg.timeout_s else 0
+    key = (cfg.api_key, cfg.base_url, timeout_ms)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            http_options = types.HttpOptions(
+                base_url=cfg.base_url or None,
+                timeout=timeout_ms or None,
+            )
+            client = genai.Client(api_key=cfg.api_key, http_options=http_options)
+            _CLIENTS[key] = client
+        return client
+
+
+def _delta(accumulated: str, piece: str) -> Tuple[str, str]:
+    """
+    兼容：有的 SDK 返回累计文本，有的返回增量。返回 (delta, 新的累计文本)。
+    """
+    if accumulated and piece.startswith(accumulated):
+        return piece[len(accumulated):], piece
+    return piece, accumulated + piece
+
 
 class GeminiLLM:
     """
@@ -33,77 +74,109 @@ class GeminiLLM:
             raise ValueError("GeminiLLM requires cfg.model")
 
         self.cfg = cfg
-        self.client = genai.Client(api_key=cfg.api_key)
+        self.client = get_client(cfg)
 
     # =========================
     # Public: streaming
     # =========================
+    def _request(self, messages: List[LLMMessage], structured: bool, stop: Optional[StopCondition] = None):
+        """
+        structured=True: 使用 Gemini 的结构化 contents（推荐）
+        structured=False: 用旧版 prompt 拼接（fallback）
+        """
+        config = types.GenerateContentConfig(
+            temperature=self.cfg.temperature,
+            # system_instruction 会在 structured 模式下设置
+        )
+        if self.cfg.tools:
+            config.tools = list(self.cfg.tools)
+        if stop is not None and stop.stop_sequences:
+            # 服务端命中停止串就不再生成
+            config.stop_sequences = [seq for seq in stop.stop_sequences if seq][:_MAX_NATIVE_STOP_SEQUENCES]
+
+        if not structured:
+            return self._messages_to_prompt(messages), config
+
+        system_instruction, contents = self._messages_to_contents(messages)
+        if system_instruction:
+            config.system_instruction = system_instruction
+        return contents, config
+
     def stream(
         self,
         messages: List[LLMMessage],
         cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
         *,
         structured: bool = True,
     ) -> Iterator[LLMChunk]:
+        if cancel_token is not None and cancel_token.is_cancelled():
+            raise CancelledError()
+
+        contents, config = self._request(messages, structured, stop)
+        matcher = StopMatcher(stop) if stop else None
+
+        # 同步流式接口：generate_content_stream
+        accumulated = ""
+        response = self.client.models.generate_content_stream(
+            model=self.cfg.model,
+            contents=contents,
+            config=config,
+        )
+        try:
+            for chunk in response:
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    raise CancelledError()
+
+                piece = getattr(chunk, "text", None) or ""
+                if not piece:
+                    continue
+
+                delta, accumulated = _delta(accumulated, piece)
+                if matcher is not None:
+                    delta = matcher.push(delta)
+                if delta:
+                    yield LLMChunk(text_delta=delta, is_final=False)
+                if matcher is not None and matcher.stopped:
+                    break
+        finally:
+            # 提前退出时关闭流，服务端不再继续生成
+            close = getattr(response, "close", None)
+            if close is not None:
+                close()
+
+        if matcher is not None:
+            tail = matcher.flush()
+            if tail:
+                yield LLMChunk(text_delta=tail, is_final=False)
+        # 不放在 finally 里：请求出错时异常要传给调用方（router 据此 failover），而不是被一个空的 final chunk 吞掉
+        yield LLMChunk(text_delta="", is_final=True)
+
+    async def astream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+        *,
+        structured: bool = True,
+    ) -> AsyncIterator[LLMChunk]:
         """
-        structured=True: 使用 Gemini 的结构化 contents（推荐）
-        structured=False: 用旧版 prompt 拼接（fallback）
+        异步版 stream：走 client.aio，不占线程；取消可以用 cancel_token，也可以直接 cancel 所在的 asyncio task。
         """
         if cancel_token is not None and cancel_token.is_cancelled():
             raise CancelledError()
 
-        temperature = self.cfg.temperature
-        config = types.GenerateContentConfig(
-            temperature=temperature,
-            # system_instruction 会在 structured 模式下设置
-        )
-        if self.cfg.tools:
-            config.tools = list(self.cfg.tools)
+        contents, config = self._request(messages, structured, stop)
+        matcher = StopMatcher(stop) if stop else None
 
-        if structured:
-            system_instruction, contents = self._messages_to_contents(messages)
-            if system_instruction:
-                config.system_instruction = system_instruction
-
-            # 同步流式接口：generate_content_stream
-            accumulated = ""
-            try:
-                for chunk in self.client.models.generate_content_stream(
-                    model=self.cfg.model,
-                    contents=contents,
-                    config=config,
-                ):
-                    if cancel_token is not None and cancel_token.is_cancelled():
-                        raise CancelledError()
-
-                    piece = getattr(chunk, "text", None) or ""
-                    if not piece:
-                        continue
-
-                    # 兼容：有的 SDK 返回累计文本，有的返回增量
-                    if accumulated and piece.startswith(accumulated):
-                        delta = piece[len(accumulated):]
-                        accumulated = piece
-                    else:
-                        delta = piece
-                        accumulated += delta
-
-                    if delta:
-                        yield LLMChunk(text_delta=delta, is_final=False)
-            finally:
-                if cancel_token is None or not cancel_token.is_cancelled():
-                    yield LLMChunk(text_delta="", is_final=True)
-            return
-
-        # fallback：旧式拼 prompt
-        prompt = self._messages_to_prompt(messages)
         accumulated = ""
+        response = await self.client.aio.models.generate_content_stream(
+            model=self.cfg.model,
+            contents=contents,
+            config=config,
+        )
         try:
-            for chunk in self.client.models.generate_content_stream(
-                model=self.cfg.model,
-                contents=prompt,
-                config=config,
-            ):
+            async for chunk in response:
                 if cancel_token is not None and cancel_token.is_cancelled():
                     raise CancelledError()
 
@@ -111,29 +184,36 @@ class GeminiLLM:
                 if not piece:
                     continue
 
-                if accumulated and piece.startswith(accumulated):
-                    delta = piece[len(accumulated):]
-                    accumulated = piece
-                else:
-                    delta = piece
-                    accumulated += delta
-
+                delta, accumulated = _delta(accumulated, piece)
+                if matcher is not None:
+                    delta = matcher.push(delta)
                 if delta:
                     yield LLMChunk(text_delta=delta, is_final=False)
+                if matcher is not None and matcher.stopped:
+                    break
         finally:
-            if cancel_token is None or not cancel_token.is_cancelled():
-                yield LLMChunk(text_delta="", is_final=True)
+            # 提前退出时关闭底层响应，连接还给连接池
+            aclose = getattr(response, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        if matcher is not None:
+            tail = matcher.flush()
+            if tail:
+                yield LLMChunk(text_delta=tail, is_final=False)
+        yield LLMChunk(text_delta="", is_final=True)
 
     def generate(
         self,
         messages: List[LLMMessage],
         cancel_token: Optional[CancelToken] = None,
-    ):
+        stop: Optional[StopCondition] = None,
+    ) -> LLMResponse:
         text_parts: List[str] = []
         backend = getattr(self.cfg, "backend", None)
         model = getattr(self.cfg, "model", None)
 
-        for ch in self.stream(messages, cancel_token=cancel_token):
+        for ch in self.stream(messages, cancel_token=cancel_token, stop=stop):
             if cancel_token is not None and cancel_token.is_cancelled():
                 raise CancelledError()
             if ch.text_delta:
@@ -141,10 +221,24 @@ class GeminiLLM:
             if ch.is_final:
                 break
 
-        from src.llm.base import LLMResponse
-
         return LLMResponse(text="".join(text_parts), backend=backend, model=model)
 
+    async def agenerate(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> LLMResponse:
+        text_parts: List[str] = []
+        async for ch in self.astream(messages, cancel_token=cancel_token, stop=stop):
+            if ch.text_delta:
+                text_parts.append(ch.text_delta)
+        return LLMResponse(
+            text="".join(text_parts),
+            backend=getattr(self.cfg, "backend", None),
+            model=getattr(self.cfg, "model", None),
+        )
+
     # =========================
     # Structured contents builder (你要的新增函数)
     # =========================
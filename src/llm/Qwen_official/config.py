@@ -21,3 +21,13 @@ class QwenOfficialConfig:
     repetition_penalty: Optional[float] = field(
         default_factory=lambda: float(os.environ.get("QWEN_REPETITION_PENALTY", "1.0"))
     )
+    # 按消息缓存 chat template 渲染 + 分词结果（LRU 条数），0=关闭，每次整段重新渲染
+    prompt_cache_size: int = field(default_factory=lambda: int(os.environ.get("QWEN_PROMPT_CACHE_SIZE", "256")))
+    # 保留最近几次生成的 KV cache，下一次 prompt 与之共享前缀（同一会话的下一轮）时只 prefill 新增部分，0=关闭
+    kv_cache_slots: int = field(default_factory=lambda: int(os.environ.get("QWEN_KV_CACHE_SLOTS", "2")))
+    # 权重量化："none" / "int8_dynamic"（torch 自带，仅 CPU）/ "int8" / "int4"（torchao，加载时逐层量化）
+    quantization: str = field(default_factory=lambda: os.environ.get("QWEN_QUANTIZATION", "none"))
+    quant_group_size: int = field(default_factory=lambda: int(os.environ.get("QWEN_QUANT_GROUP_SIZE", "128")))
+    # 投机解码：小模型（如 Qwen/Qwen2-0.5B-Instruct）先草拟 num_assistant_tokens 个 token，大模型一次前向校验
+    draft_model: Optional[str] = field(default_factory=lambda: os.environ.get("QWEN_DRAFT_MODEL") or None)
+    num_assistant_tokens: int = field(default_factory=lambda: int(os.environ.get("QWEN_NUM_ASSISTANT_TOKENS", "5")))
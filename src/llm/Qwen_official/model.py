@@ -1,7 +1,10 @@
 # src/llm/Qwen_official/model.py
 from __future__ import annotations
 
-from typing import Iterator, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import copy
 import json
 import threading
 
@@ -10,6 +13,12 @@ try:
     from transformers import (
         AutoModelForCausalLM,
         AutoTokenizer,
+        DynamicCache,
+        LogitsProcessorList,
+        RepetitionPenaltyLogitsProcessor,
+        TemperatureLogitsWarper,
+        TopKLogitsWarper,
+        TopPLogitsWarper,
         TextIteratorStreamer,
         StoppingCriteria,
         StoppingCriteriaList,
@@ -29,10 +38,26 @@ from src.llm.base import (
     CancelToken,
     CancelledError,
     MessagePart,
+    StopCondition,
+    StopMatcher,
 )
 from src.llm.Qwen_official.config import QwenOfficialConfig
 
 
+QUANTIZATION_MODES = ("none", "int8_dynamic", "int8", "int4")
+
+# 用来切出单条消息渲染结果的锚点：render([anchor, msg]) 去掉 render([anchor]) 的前缀
+_ANCHOR_ITEM = {"role": "system", "content": "anchor"}
+
+
+def _common_prefix_len(a: List[int], b: List[int]) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
 class _CancelStoppingCriteria(StoppingCriteria):
     def __init__(self, cancel_token: CancelToken):
         self._cancel_token = cancel_token
@@ -41,6 +66,40 @@ class _CancelStoppingCriteria(StoppingCriteria):
         return self._cancel_token.is_cancelled()
 
 
+class _IncrementalDetokenizer:
+    """
+    增量解码：每次只解码最近一小段 token，直到拼出完整字符（不以 U+FFFD 结尾）才输出，
+    避免多字节字符被 BPE 拆成多个 token 时吐出半个字。
+    """
+
+    def __init__(self, tokenizer) -> None:
+        self._tokenizer = tokenizer
+        self._ids: List[int] = []
+        self._prefix = 0
+        self._read = 0
+
+    def _decode(self, ids: List[int]) -> str:
+        return self._tokenizer.decode(ids, skip_special_tokens=True)
+
+    def push(self, token_id: int) -> str:
+        self._ids.append(token_id)
+        prefix_text = self._decode(self._ids[self._prefix : self._read])
+        new_text = self._decode(self._ids[self._prefix :])
+        if len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd"):
+            self._prefix = self._read
+            self._read = len(self._ids)
+            return new_text[len(prefix_text) :]
+        return ""
+
+    def flush(self) -> str:
+        if self._read >= len(self._ids):
+            return ""
+        prefix_text = self._decode(self._ids[self._prefix : self._read])
+        new_text = self._decode(self._ids[self._prefix :])
+        self._prefix = self._read = len(self._ids)
+        return new_text[len(prefix_text) :]
+
+
 class QwenOfficialLLM:
     """
     Local Qwen-7B Instruct via transformers.
@@ -52,103 +111,345 @@ class QwenOfficialLLM:
 
         self.cfg = cfg
         self.device = cfg.device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.torch_dtype = self._resolve_dtype(cfg.torch_dtype)
+        self.quantization = (cfg.quantization or "none").strip().lower()
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(
+                f"Unsupported quantization: {cfg.quantization}. Supported: {', '.join(QUANTIZATION_MODES)}"
+            )
+        if self.quantization == "int8_dynamic":
+            # torch 的动态量化只有 CPU kernel，且要求从 float32 权重量化
+            if self.device != "cpu":
+                raise ValueError("quantization='int8_dynamic' is CPU-only; use 'int8' / 'int4' on GPU")
+            self.torch_dtype = torch.float32
+        else:
+            self.torch_dtype = self._resolve_dtype(cfg.torch_dtype)
 
         self.tokenizer = AutoTokenizer.from_pretrained(
             cfg.model,
             trust_remote_code=cfg.trust_remote_code,
         )
 
-        device_map = cfg.device_map
+        self.model = self._load_model(cfg.model)
+
+        self.draft_model = None
+        self.draft_tokenizer = None
+        if cfg.draft_model:
+            self.draft_model = self._load_model(cfg.draft_model)
+            # AssistedCandidateGenerator 从草稿模型的 generation_config 读取每轮草拟的 token 数
+            self.draft_model.generation_config.num_assistant_tokens = max(1, int(cfg.num_assistant_tokens))
+            draft_tokenizer = AutoTokenizer.from_pretrained(
+                cfg.draft_model,
+                trust_remote_code=cfg.trust_remote_code,
+            )
+            # 同系列模型共用词表，直接按 token 校验；词表不同时走 transformers 的跨 tokenizer 投机解码
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                self.draft_tokenizer = draft_tokenizer
+
+        # (role, content, 是否第一条) -> 该消息渲染后的 token ids
+        self._prompt_cache: Optional["OrderedDict[Tuple[str, str, bool], List[int]]"] = None
+        if cfg.prompt_cache_size > 0 and cfg.use_chat_template and hasattr(self.tokenizer, "apply_chat_template"):
+            self._prompt_cache = OrderedDict()
+        self._prompt_cache_verified = False
+        # 保护上面缓存的 LRU 读写和首次使用时的模板探测（count_tokens 和生成线程都会用到）
+        self._prompt_lock = threading.Lock()
+        self._anchor_text: Optional[str] = None
+        self._prefix_ids: List[int] = []
+        self._generation_prompt_ids: List[int] = []
+
+        # 最近几次生成留下的 (已前向的 token ids, KV cache)，按 LRU 淘汰；只在 _generate_lock 内访问
+        self._kv_slots: "OrderedDict[int, Tuple[List[int], DynamicCache]]" = OrderedDict()
+        self._kv_slot_seq = 0
+
+        self._worker: Optional[ThreadPoolExecutor] = None
+        self._generate_lock = threading.Lock()
+
+    def _load_model(self, name: str):
+        device_map = self.cfg.device_map
         if device_map is None and self.device == "cuda":
             device_map = "auto"
 
-        self.model = AutoModelForCausalLM.from_pretrained(
-            cfg.model,
+        extra = {}
+        if self.quantization in {"int8", "int4"}:
+            extra["quantization_config"] = self._torchao_config()
+
+        model = AutoModelForCausalLM.from_pretrained(
+            name,
             torch_dtype=self.torch_dtype,
             device_map=device_map,
-            trust_remote_code=cfg.trust_remote_code,
+            trust_remote_code=self.cfg.trust_remote_code,
             low_cpu_mem_usage=True,
+            **extra,
         )
 
         if device_map is None:
-            self.model.to(self.device)
-        self.model.eval()
-        self._generate_lock = threading.Lock()
+            model.to(self.device)
+        model.eval()
+
+        if self.quantization == "int8_dynamic":
+            # Linear 权重转 int8，激活在每次前向时动态量化；embedding / lm_head 以外的大头都在 Linear 里
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _torchao_config(self):
+        try:
+            import torchao.quantization as tq
+            from transformers import TorchAoConfig
+        except ImportError as e:
+            raise ImportError(
+                f"quantization='{self.quantization}' requires 'torchao'.\n"
+                "Please run:\n"
+                "  pip install -U torchao\n"
+                "and make sure you are in the correct virtual environment."
+            ) from e
+
+        if self.quantization == "int8":
+            return TorchAoConfig(tq.Int8WeightOnlyConfig())
+        if self.device == "cpu":
+            # torchao 的 int4 weight-only kernel 只有 CUDA 版；CPU 用 int8 动态激活 + int4 分组权重
+            return TorchAoConfig(
+                tq.Int8DynamicActivationIntxWeightConfig(
+                    weight_dtype=torch.int4,
+                    weight_granularity=tq.PerGroup(self.cfg.quant_group_size),
+                )
+            )
+        return TorchAoConfig(tq.Int4WeightOnlyConfig(group_size=self.cfg.quant_group_size))
 
     def stream(
         self,
         messages: List[LLMMessage],
         cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
     ) -> Iterator[LLMChunk]:
         if cancel_token is not None and cancel_token.is_cancelled():
             raise CancelledError()
 
+        matcher = StopMatcher(stop) if stop else None
         with self._generate_lock:
-            prompt = self._messages_to_prompt(messages)
-            inputs = self.tokenizer(prompt, return_tensors="pt")
-            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
-
-            gen_kwargs = {
-                "max_new_tokens": self.cfg.max_new_tokens,
-                "temperature": self.cfg.temperature,
-                "top_p": self.cfg.top_p,
-                "do_sample": self.cfg.do_sample,
-            }
-            if self.cfg.repetition_penalty and self.cfg.repetition_penalty != 1.0:
-                gen_kwargs["repetition_penalty"] = self.cfg.repetition_penalty
-
-            streamer = TextIteratorStreamer(
-                self.tokenizer,
-                skip_prompt=True,
-                skip_special_tokens=True,
-            )
-
-            stopping = None
-            if cancel_token is not None:
-                stopping = StoppingCriteriaList([_CancelStoppingCriteria(cancel_token)])
-
-            thread_exc: List[BaseException] = []
-
-            def _run_generate() -> None:
-                try:
-                    self.model.generate(
-                        **inputs,
-                        streamer=streamer,
-                        stopping_criteria=stopping,
-                        **gen_kwargs,
-                    )
-                except BaseException as exc:
-                    thread_exc.append(exc)
-
-            thread = threading.Thread(target=_run_generate, daemon=True)
-            thread.start()
-
-            cancelled = False
+            inputs = self._encode_prompt(messages)
+            if self.draft_model is not None:
+                deltas = self._assisted_deltas(inputs, cancel_token)
+            else:
+                deltas = self._decode_deltas(inputs, cancel_token)
             try:
-                for text in streamer:
-                    if cancel_token is not None and cancel_token.is_cancelled():
-                        cancelled = True
-                        raise CancelledError()
+                for text in deltas:
+                    if matcher is not None:
+                        text = matcher.push(text)
                     if text:
                         yield LLMChunk(text_delta=text, is_final=False)
+                    if matcher is not None and matcher.stopped:
+                        # 命中停止条件：关闭 deltas，解码循环不再算下一个 token
+                        break
+            finally:
+                deltas.close()
+            if matcher is not None:
+                tail = matcher.flush()
+                if tail:
+                    yield LLMChunk(text_delta=tail, is_final=False)
+            yield LLMChunk(text_delta="", is_final=True)
+
+    @torch.inference_mode()
+    def _decode_deltas(
+        self,
+        inputs: Dict[str, "torch.Tensor"],
+        cancel_token: Optional[CancelToken],
+    ) -> Iterator[str]:
+        """
+        在调用方线程里逐 token 前向 + 采样 + 增量解码：不起线程、没有队列，
+        每个 token 之前检查 cancel，取消后下一个 token 就不会再算。
+        """
+        input_ids = inputs["input_ids"]
+        attention_mask = inputs.get("attention_mask")
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+
+        processors = self._logits_processors()
+        eos_ids = self._eos_token_ids()
+        detok = _IncrementalDetokenizer(self.tokenizer)
+
+        prompt_ids = input_ids[0].tolist()
+        past, reused = self._take_kv_slot(prompt_ids)
+        # 已经在 past 里的 token ids：复用的前缀 + 之后每一步前向过的 token
+        fed = prompt_ids[:reused]
+        all_ids = input_ids
+        step_ids = input_ids[:, reused:]
+
+        try:
+            for _ in range(self.cfg.max_new_tokens):
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    raise CancelledError()
+
+                out = self.model(
+                    input_ids=step_ids,
+                    attention_mask=attention_mask,
+                    past_key_values=past,
+                    use_cache=True,
+                )
+                past = out.past_key_values
+                fed.extend(step_ids[0].tolist())
+                scores = processors(all_ids, out.logits[:, -1, :].float())
+                if self.cfg.do_sample:
+                    next_id = torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1)
+                else:
+                    next_id = scores.argmax(dim=-1, keepdim=True)
+
+                token = int(next_id[0, 0])
+                if token in eos_ids:
+                    break
+
+                all_ids = torch.cat([all_ids, next_id], dim=-1)
+                attention_mask = torch.cat([attention_mask, attention_mask.new_ones((1, 1))], dim=-1)
+                step_ids = next_id
+
+                text = detok.push(token)
+                if text:
+                    yield text
+
+            tail = detok.flush()
+            if tail:
+                yield tail
+        finally:
+            # 被取消 / 提前关闭时 past 仍与 fed 对应，照样留给下一轮；前向中途出错则长度对不上，丢弃
+            if past.get_seq_length() == len(fed):
+                self._put_kv_slot(fed, past)
+
+    def _take_kv_slot(self, ids: List[int]) -> Tuple["DynamicCache", int]:
+        """
+        找与 ids 公共前缀最长的 KV 缓存槽，取出来（本次生成独占）并裁到可复用的长度。
+        返回 (cache, 复用的 token 数)；没有可用的槽时返回新的空 cache。
+        """
+        best_key, best_len = None, 0
+        for key, (cached_ids, _) in self._kv_slots.items():
+            n = _common_prefix_len(cached_ids, ids)
+            # 只共享很短的前缀（如只有 system prompt）时不抢别的会话的槽
+            if n > best_len and 2 * n >= len(cached_ids):
+                best_key, best_len = key, n
+        # 至少留一个 token 做前向，才能拿到下一个 token 的 logits
+        reuse = min(best_len, len(ids) - 1)
+        if best_key is None or reuse <= 0:
+            return DynamicCache(), 0
+
+        _, cache = self._kv_slots.pop(best_key)
+        extra = cache.get_seq_length() - reuse
+        if extra > 0:
+            # 负数表示从末尾去掉多少个 token（正数截断的写法在新版 transformers 里已废弃）
+            cache.crop(-extra)
+        return cache, reuse
+
+    def _put_kv_slot(self, ids: List[int], cache: "DynamicCache") -> None:
+        if self.cfg.kv_cache_slots <= 0 or not ids:
+            return
+        self._kv_slot_seq += 1
+        self._kv_slots[self._kv_slot_seq] = (ids, cache)
+        while len(self._kv_slots) > self.cfg.kv_cache_slots:
+            self._kv_slots.popitem(last=False)
+
+    def _assisted_deltas(
+        self,
+        inputs: Dict[str, "torch.Tensor"],
+        cancel_token: Optional[CancelToken],
+    ) -> Iterator[str]:
+        """
+        投机解码依赖 generate() 的 assisted 实现，放在常驻的单线程 worker 上跑，文本经 streamer 取回。
+        """
+        gen_kwargs = self._generate_kwargs()
+        # 流式输出不受影响：每轮被接受的多个 token 一起 put 给 streamer；取消走 stopping_criteria
+        gen_kwargs["assistant_model"] = self.draft_model
+        if self.draft_tokenizer is not None:
+            gen_kwargs["tokenizer"] = self.tokenizer
+            gen_kwargs["assistant_tokenizer"] = self.draft_tokenizer
+
+        streamer = TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+        )
+
+        # 调用方提前关闭（停止条件命中 / 断开）时通过 halt 让 worker 里的 generate 停下
+        halt = CancelToken()
+        criteria = [_CancelStoppingCriteria(halt)]
+        if cancel_token is not None:
+            criteria.append(_CancelStoppingCriteria(cancel_token))
+        stopping = StoppingCriteriaList(criteria)
+
+        def _generate() -> None:
+            # generate 抛异常时不会调用 streamer.end()，这里补上，否则下面的 for 一直等不到结束
+            try:
+                self.model.generate(**inputs, streamer=streamer, stopping_criteria=stopping, **gen_kwargs)
             finally:
-                thread.join()
-                if thread_exc and not cancelled:
-                    raise RuntimeError("QwenOfficialLLM generate failed") from thread_exc[0]
-                if not cancelled:
-                    yield LLMChunk(text_delta="", is_final=True)
+                streamer.end()
+
+        if self._worker is None:
+            self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qwen-generate")
+        future = self._worker.submit(_generate)
+
+        try:
+            for text in streamer:
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    # 不等 worker 收尾：单线程 worker 保证下一次 generate 排在它后面
+                    raise CancelledError()
+                if text:
+                    yield text
+        finally:
+            halt.cancel()
+
+        exc = future.exception()
+        if exc is not None:
+            raise RuntimeError("QwenOfficialLLM generate failed") from exc
+
+    def _generate_kwargs(self) -> dict:
+        gen_kwargs = {
+            "max_new_tokens": self.cfg.max_new_tokens,
+            "temperature": self.cfg.temperature,
+            "top_p": self.cfg.top_p,
+            "do_sample": self.cfg.do_sample,
+        }
+        if self.cfg.repetition_penalty and self.cfg.repetition_penalty != 1.0:
+            gen_kwargs["repetition_penalty"] = self.cfg.repetition_penalty
+        return gen_kwargs
+
+    def _generation_config(self):
+        """
+        和 generate() 一样的合并：模型自带的 generation_config（Qwen2-7B-Instruct 为 top_k=20、
+        repetition_penalty=1.05）打底，cfg 里显式给出的值覆盖。
+        """
+        gen = copy.deepcopy(self.model.generation_config)
+        gen.update(**self._generate_kwargs())
+        return gen
+
+    def _logits_processors(self) -> LogitsProcessorList:
+        # 与 generate() 的处理顺序一致：先 repetition penalty，再 temperature / top_k / top_p
+        gen = self._generation_config()
+        processors = LogitsProcessorList()
+        if gen.repetition_penalty is not None and gen.repetition_penalty != 1.0:
+            processors.append(RepetitionPenaltyLogitsProcessor(gen.repetition_penalty))
+        if gen.do_sample:
+            if gen.temperature is not None and gen.temperature != 1.0:
+                processors.append(TemperatureLogitsWarper(gen.temperature))
+            if gen.top_k is not None and gen.top_k != 0:
+                processors.append(TopKLogitsWarper(gen.top_k))
+            if gen.top_p is not None and gen.top_p < 1.0:
+                processors.append(TopPLogitsWarper(gen.top_p))
+        return processors
+
+    def _eos_token_ids(self) -> Set[int]:
+        eos = self.model.generation_config.eos_token_id
+        if eos is None:
+            eos = self.tokenizer.eos_token_id
+        if eos is None:
+            return set()
+        return {int(eos)} if isinstance(eos, int) else {int(e) for e in eos}
 
     def generate(
         self,
         messages: List[LLMMessage],
         cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
     ) -> LLMResponse:
         text_parts: List[str] = []
         backend = getattr(self.cfg, "backend", None)
         model = getattr(self.cfg, "model", None)
 
-        for ch in self.stream(messages, cancel_token=cancel_token):
+        for ch in self.stream(messages, cancel_token=cancel_token, stop=stop):
             if cancel_token is not None and cancel_token.is_cancelled():
                 raise CancelledError()
             if ch.text_delta:
@@ -158,7 +459,129 @@ class QwenOfficialLLM:
 
         return LLMResponse(text="".join(text_parts), backend=backend, model=model)
 
+    def count_tokens(self, messages: List[LLMMessage]) -> int:
+        """
+        prompt 的 token 数（含 chat template 和生成提示），上下文裁剪用；走按消息缓存的分词路径，不建 tensor。
+        """
+        items = self._chat_items(messages)
+        ids = self._prompt_ids(items)
+        if ids is None:
+            return len(self.tokenizer(self._items_to_prompt(items))["input_ids"])
+        return len(ids)
+
+    def _encode_prompt(self, messages: List[LLMMessage]) -> Dict[str, "torch.Tensor"]:
+        items = self._chat_items(messages)
+        ids = self._prompt_ids(items)
+        if ids is None:
+            inputs = self.tokenizer(self._items_to_prompt(items), return_tensors="pt")
+            return {k: v.to(self.model.device) for k, v in inputs.items()}
+
+        input_ids = torch.tensor([ids], dtype=torch.long, device=self.model.device)
+        return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+    def _prompt_ids(self, items: List[dict]) -> Optional[List[int]]:
+        if self._prompt_cache is None or not items:
+            return None
+        return self._cached_prompt_ids(items)
+
+    def _render(self, items: List[dict], add_generation_prompt: bool = False) -> str:
+        return self.tokenizer.apply_chat_template(
+            items,
+            tokenize=False,
+            add_generation_prompt=add_generation_prompt,
+        )
+
+    def _cached_prompt_ids(self, items: List[dict]) -> Optional[List[int]]:
+        """
+        按消息拼接缓存的 token ids：历史消息命中缓存，只有新追加的消息需要渲染和分词。
+        第一次使用时和整段渲染 + 分词的结果比对，不一致说明模板不能按消息拆分，永久退回整段路径。
+        count_tokens 不持有 _generate_lock，这里会被多个线程同时调用。
+        """
+        if self._anchor_text is None and not self._setup_prompt_cache():
+            return None
+
+        ids = list(self._prefix_ids)
+        for i, item in enumerate(items):
+            segment = self._segment_ids(item, first=(i == 0))
+            if segment is None:
+                self._prompt_cache = None
+                return None
+            ids.extend(segment)
+        ids.extend(self._generation_prompt_ids)
+
+        if not self._prompt_cache_verified:
+            # 并发的首次调用可能各校验一遍，结论相同，不用加锁
+            full = list(self.tokenizer(self._render(items, add_generation_prompt=True))["input_ids"])
+            if full != ids:
+                self._prompt_cache = None
+                return None
+            self._prompt_cache_verified = True
+        return ids
+
+    def _setup_prompt_cache(self) -> bool:
+        """
+        第一次使用时探测模板能否按消息拆分，算出锚点和前后缀 ids。_anchor_text 最后赋值：
+        其他线程看到它不为 None 时，前后缀已经就绪。
+        """
+        with self._prompt_lock:
+            if self._anchor_text is not None:
+                return True
+            if self._prompt_cache is None:
+                return False
+            anchor = self._render([_ANCHOR_ITEM])
+            # 同一条消息放在第 2 / 第 3 个位置渲染结果必须相同，否则模板依赖位置（如带序号），不能缓存
+            probe = {"role": "user", "content": "probe"}
+            twice = self._render([_ANCHOR_ITEM, _ANCHOR_ITEM])
+            if (
+                self._render([_ANCHOR_ITEM, probe])[len(anchor):]
+                != self._render([_ANCHOR_ITEM, _ANCHOR_ITEM, probe])[len(twice):]
+            ):
+                self._prompt_cache = None
+                return False
+            suffix = self._render([_ANCHOR_ITEM], add_generation_prompt=True)[len(anchor):]
+            # tokenizer 自动加的 BOS 等只出现一次，放在最前面
+            self._prefix_ids = list(self.tokenizer("")["input_ids"])
+            self._generation_prompt_ids = self._tokenize_segment(suffix)
+            self._anchor_text = anchor
+            return True
+
+    def _segment_ids(self, item: dict, first: bool) -> Optional[List[int]]:
+        cache = self._prompt_cache
+        if cache is None:
+            # 另一个线程校验失败，已经退回整段路径
+            return None
+        key = (item["role"], item["content"], first)
+        with self._prompt_lock:
+            ids = cache.get(key)
+            if ids is not None:
+                cache.move_to_end(key)
+                return ids
+
+        if first:
+            # 第一条消息的渲染可能带模板注入的默认 system prompt，单独渲染
+            text = self._render([item])
+        else:
+            rendered = self._render([_ANCHOR_ITEM, item])
+            anchor = self._anchor_text or ""
+            if not rendered.startswith(anchor):
+                return None
+            text = rendered[len(anchor):]
+
+        ids = self._tokenize_segment(text)
+        with self._prompt_lock:
+            cache[key] = ids
+            cache.move_to_end(key)
+            while len(cache) > self.cfg.prompt_cache_size:
+                cache.popitem(last=False)
+        return ids
+
+    def _tokenize_segment(self, text: str) -> List[int]:
+        return list(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
     def _messages_to_prompt(self, messages: List[LLMMessage]) -> str:
+        return self._items_to_prompt(self._chat_items(messages))
+
+    def _chat_items(self, messages: List[LLMMessage]) -> List[dict]:
         items: List[dict] = []
         for msg in messages:
             role = (msg.role or "").strip().lower()
@@ -170,13 +593,11 @@ class QwenOfficialLLM:
                 role = "user"
 
             items.append({"role": role, "content": text})
+        return items
 
+    def _items_to_prompt(self, items: List[dict]) -> str:
         if self.cfg.use_chat_template and hasattr(self.tokenizer, "apply_chat_template"):
-            return self.tokenizer.apply_chat_template(
-                items,
-                tokenize=False,
-                add_generation_prompt=True,
-            )
+            return self._render(items, add_generation_prompt=True)
 
         lines: List[str] = []
         for it in items:
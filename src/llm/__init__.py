@@ -8,8 +8,13 @@ from src.llm.base import (
     CancelToken,
     CancelledError,
     BaseLLM,
+    StopCondition,
+    StopMatcher,
 )
+from src.llm.aio import afan_out, agenerate, astream
+from src.llm.cache import CachedLLM, LLMResponseCache
 from src.llm.factory import create_llm
+from src.llm.router import LatencyTracker, LLMRouter
 
 __all__ = [
     "LLMMessage",
@@ -21,5 +26,14 @@ __all__ = [
     "CancelToken",
     "CancelledError",
     "BaseLLM",
+    "StopCondition",
+    "StopMatcher",
+    "CachedLLM",
+    "LLMResponseCache",
+    "LLMRouter",
+    "LatencyTracker",
+    "afan_out",
+    "agenerate",
+    "astream",
     "create_llm",
 ]
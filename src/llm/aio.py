@@ -0,0 +1,139 @@
+# src/llm/aio.py
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable, List, Literal, Optional, Sequence
+
+from src.llm.base import BaseLLM, CancelToken, CancelledError, LLMChunk, LLMMessage, LLMResponse, StopCondition
+
+FanOutMode = Literal["first", "best"]
+Scorer = Callable[[LLMResponse], float]
+
+
+_END = object()
+
+
+async def astream(
+    llm: BaseLLM,
+    messages: List[LLMMessage],
+    cancel_token: Optional[CancelToken] = None,
+    stop: Optional[StopCondition] = None,
+    executor: Optional[Executor] = None,
+) -> AsyncIterator[LLMChunk]:
+    """
+    有 astream 的后端直接用；同步后端在线程池里迭代 stream()，chunk 经 asyncio.Queue 送回事件循环。
+    调用方提前退出（或 task 被取消）时通知后台的 stream 停下。
+    executor 为空时用事件循环的默认线程池；多个会话共享一个模型时传入固定大小的线程池限制并发。
+    """
+    native = getattr(llm, "astream", None)
+    if callable(native):
+        async for ch in native(messages, cancel_token=cancel_token, stop=stop):
+            yield ch
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[object]" = asyncio.Queue()
+    inner = CancelToken()
+
+    def _pump() -> None:
+        try:
+            for ch in llm.stream(messages, cancel_token=inner, stop=stop):
+                loop.call_soon_threadsafe(queue.put_nowait, ch)
+                if ch.is_final:
+                    break
+        except BaseException as exc:
+            loop.call_soon_threadsafe(queue.put_nowait, exc)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    loop.run_in_executor(executor, _pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            if cancel_token is not None and cancel_token.is_cancelled():
+                raise CancelledError()
+            yield item  # type: ignore[misc]
+    finally:
+        inner.cancel()
+
+
+async def agenerate(
+    llm: BaseLLM,
+    messages: List[LLMMessage],
+    cancel_token: Optional[CancelToken] = None,
+    stop: Optional[StopCondition] = None,
+) -> LLMResponse:
+    """
+    有 agenerate 的后端直接 await；同步后端放到线程里跑（task 被取消时通过 cancel_token 通知它停下）。
+    """
+    native = getattr(llm, "agenerate", None)
+    if callable(native):
+        return await native(messages, cancel_token=cancel_token, stop=stop)
+
+    token = cancel_token or CancelToken()
+    try:
+        return await asyncio.to_thread(llm.generate, messages, cancel_token=token, stop=stop)
+    except asyncio.CancelledError:
+        token.cancel()
+        raise
+
+
+async def afan_out(
+    llms: Sequence[BaseLLM],
+    messages: List[LLMMessage],
+    *,
+    mode: FanOutMode = "first",
+    scorer: Optional[Scorer] = None,
+    timeout_s: Optional[float] = None,
+    stop: Optional[StopCondition] = None,
+) -> LLMResponse:
+    """
+    同一请求并行发给多个模型：
+    - mode="first": 取最先成功返回的结果，其余立即取消
+    - mode="best":  等全部返回（或 timeout_s 到期），用 scorer 打分取最高；
+                    没有 scorer 时按 llms 的顺序取第一个成功的（即"优先用靠前的模型，超时再退而求其次"）
+    全部失败时抛出第一个异常。
+    """
+    if not llms:
+        raise ValueError("afan_out requires at least one LLM")
+
+    tasks = [asyncio.ensure_future(agenerate(llm, messages, stop=stop)) for llm in llms]
+    errors: List[BaseException] = []
+    try:
+        if mode == "first":
+            pending = set(tasks)
+            loop = asyncio.get_running_loop()
+            deadline = None if timeout_s is None else loop.time() + timeout_s
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError(f"no model answered within {timeout_s}s")
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+
+        if mode != "best":
+            raise ValueError(f"Unknown fan-out mode: {mode}")
+
+        done, _ = await asyncio.wait(tasks, timeout=timeout_s)
+        finished = [(i, t.result()) for i, t in enumerate(tasks) if t in done and t.exception() is None]
+        errors = [t.exception() for t in tasks if t in done and t.exception() is not None]
+        if not finished:
+            if errors:
+                raise errors[0]
+            raise asyncio.TimeoutError(f"no model answered within {timeout_s}s")
+        if scorer is None:
+            return finished[0][1]
+        return max(finished, key=lambda item: scorer(item[1]))[1]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
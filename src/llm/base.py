@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Iterator, List, Optional, Protocol, Literal
+from typing import Iterator, List, Optional, Protocol, Literal, Tuple
 import threading
 
 
@@ -63,6 +63,134 @@ class LLMChunk:
     is_final: bool = False
 
 
+# =========================
+# Stop conditions
+# =========================
+
+# 句末标点；"." 只有后面跟空白（或输出结束）才算句末，避免把 3.14 / e.g 当成句子
+_SENTENCE_END = "。！？!?…;；"
+_SENTENCE_CLOSERS = "”’」』）)]\"'"
+
+
+@dataclass(frozen=True)
+class StopCondition:
+    """
+    提前结束生成的条件（在后端的解码循环里判断，命中后不再生成后续 token）：
+    - stop_sequences: 出现任一字符串即停止，输出不包含它
+    - max_sentences: 输出满 N 句后停止（语音回复通常只需要一两句）
+    """
+    stop_sequences: Tuple[str, ...] = ()
+    max_sentences: Optional[int] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.stop_sequences) or bool(self.max_sentences)
+
+
+class StopMatcher:
+    """
+    增量匹配 StopCondition：push(delta) 返回可以安全输出的文本。
+    可能是停止串开头的尾部、还没确定是不是句末的标点会先扣住，等下一个 delta 再决定；
+    命中后 stopped=True，后续输入全部丢弃。
+    """
+
+    def __init__(self, stop: StopCondition) -> None:
+        self.stop = stop
+        self.stopped = False
+        self._stop_sequences = tuple(seq for seq in stop.stop_sequences if seq)
+        self._pending = ""
+        self._scan = 0         # _pending 中已经数过句末标点的位置
+        self._sentences = 0
+
+    def push(self, delta: str) -> str:
+        if self.stopped or not delta:
+            return ""
+        self._pending += delta
+        return self._drain(final=False)
+
+    def flush(self) -> str:
+        """
+        输出结束时调用：扣住的文本全部放出（仍然去掉停止串）。
+        """
+        if self.stopped:
+            return ""
+        out = self._drain(final=True)
+        if not self.stopped:
+            out += self._pending
+        self._pending = ""
+        return out
+
+    def _drain(self, final: bool) -> str:
+        text = self._pending
+        cut: Optional[int] = None
+        for seq in self._stop_sequences:
+            idx = text.find(seq)
+            if idx >= 0 and (cut is None or idx < cut):
+                cut = idx
+
+        limit = len(text) if cut is None else cut
+        safe = limit
+        if self.stop.max_sentences:
+            i = self._scan
+            while i < limit:
+                if text[i] not in _SENTENCE_END and text[i] != ".":
+                    i += 1
+                    continue
+                # 连续的标点（"?!"、"..."）和后面的引号、括号算同一个句尾
+                j = i
+                while j + 1 < limit and (text[j + 1] in _SENTENCE_END or text[j + 1] == "."):
+                    j += 1
+                while j + 1 < limit and text[j + 1] in _SENTENCE_CLOSERS:
+                    j += 1
+                if j + 1 >= len(text) and not final:
+                    safe = i  # 还看不到下一个字符，等下一个 delta
+                    break
+                if text[i] == "." and j == i and j + 1 < len(text) and not text[j + 1].isspace():
+                    i = j + 1
+                    continue
+                self._sentences += 1
+                i = j + 1
+                if self._sentences >= self.stop.max_sentences:
+                    cut = i
+                    break
+            self._scan = i
+
+        if cut is not None:
+            self.stopped = True
+            self._pending = ""
+            return text[:cut]
+
+        # 尾部可能是某个停止串的开头，先扣住
+        for seq in self._stop_sequences:
+            for n in range(min(len(seq) - 1, len(text)), 0, -1):
+                if text.endswith(seq[:n]):
+                    safe = min(safe, len(text) - n)
+                    break
+
+        self._pending = text[safe:]
+        self._scan = max(0, self._scan - safe)
+        return text[:safe]
+
+
+def apply_stop(chunks: Iterator[LLMChunk], stop: Optional[StopCondition]) -> Iterator[LLMChunk]:
+    """
+    给不支持 stop 的后端用：在调用方截断（后端仍会生成完整回复）。
+    """
+    if not stop:
+        yield from chunks
+        return
+    matcher = StopMatcher(stop)
+    for ch in chunks:
+        text = matcher.push(ch.text_delta)
+        if text:
+            yield LLMChunk(text_delta=text, is_final=False)
+        if matcher.stopped or ch.is_final:
+            break
+    tail = matcher.flush()
+    if tail:
+        yield LLMChunk(text_delta=tail, is_final=False)
+    yield LLMChunk(text_delta="", is_final=True)
+
+
 # =========================
 # Cancel / Interrupt
 # =========================
@@ -100,15 +228,26 @@ class BaseLLM(Protocol):
 
     cfg: LLMConfigBase
 
-    def stream(self, messages: List[LLMMessage], cancel_token: Optional[CancelToken] = None) -> Iterator[LLMChunk]:
+    def stream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> Iterator[LLMChunk]:
         """
         必须实现：
         - 边生成边 yield chunk
         - 需要频繁检查 cancel_token.is_cancelled() 并尽快停止
+        - stop 不为空时命中即停止生成（可以用 StopMatcher）
         """
         ...
 
-    def generate(self, messages: List[LLMMessage], cancel_token: Optional[CancelToken] = None) -> LLMResponse:
+    def generate(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> LLMResponse:
         """
         默认实现：把 stream() 的 delta 拼起来。
         后端一般不必覆写（除非要更精确的 usage 统计等）。
@@ -117,7 +256,7 @@ class BaseLLM(Protocol):
         backend = getattr(self.cfg, "backend", None)
         model = getattr(self.cfg, "model", None)
 
-        for ch in self.stream(messages, cancel_token=cancel_token):
+        for ch in self.stream(messages, cancel_token=cancel_token, stop=stop):
             if cancel_token is not None and cancel_token.is_cancelled():
                 # 允许更快退出（即便后端忘了检查）
                 raise CancelledError()
@@ -146,11 +285,16 @@ class NonStreamingAdapter:
     def generate_once(self, messages: List[LLMMessage]) -> LLMResponse:
         raise NotImplementedError
 
-    def stream(self, messages: List[LLMMessage], cancel_token: Optional[CancelToken] = None) -> Iterator[LLMChunk]:
+    def stream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> Iterator[LLMChunk]:
         if cancel_token is not None and cancel_token.is_cancelled():
             raise CancelledError()
         res = self.generate_once(messages)
         if cancel_token is not None and cancel_token.is_cancelled():
             # 已经晚了，但至少不输出
             raise CancelledError()
-        yield LLMChunk(text_delta=res.text, is_final=True)
+        yield from apply_stop(iter([LLMChunk(text_delta=res.text, is_final=True)]), stop)
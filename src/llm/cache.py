@@ -0,0 +1,406 @@
+# src/llm/cache.py
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields, is_dataclass, replace
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from src.llm.aio import agenerate, astream
+from src.llm.base import (
+    BaseLLM,
+    CancelToken,
+    CancelledError,
+    LLMChunk,
+    LLMMessage,
+    LLMResponse,
+    StopCondition,
+)
+
+Embedder = Callable[[str], Sequence[float]]
+
+# 不影响输出的配置项，不参与 cache key
+_KEY_EXCLUDE = {"api_key", "timeout_s", "base_url", "prompt_cache_size", "kv_cache_slots"}
+
+_WS_RE = re.compile(r"\s+")
+
+
+def is_deterministic(cfg: object) -> bool:
+    """
+    只有贪心 / temperature=0 的配置才缓存，采样输出本来就不该复用。
+    """
+    if getattr(cfg, "do_sample", None) is False:
+        return True
+    temperature = getattr(cfg, "temperature", None)
+    return temperature is not None and float(temperature) == 0.0
+
+
+def normalize_text(text: str) -> str:
+    return _WS_RE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+def _message_items(messages: Sequence[LLMMessage]) -> List[dict]:
+    items: List[dict] = []
+    for msg in messages:
+        parts = []
+        for p in msg.parts:
+            if p.type == "text":
+                parts.append({"type": "text", "text": normalize_text(p.text or "")})
+            elif p.type == "tool_call" and p.tool_call:
+                parts.append({"type": "tool_call", "name": p.tool_call.name, "arguments": p.tool_call.arguments})
+            elif p.type == "tool_result" and p.tool_result:
+                parts.append({"type": "tool_result", "name": p.tool_result.name, "output": p.tool_result.output})
+        items.append({"role": msg.role, "parts": parts})
+    return items
+
+
+def _config_items(cfg: object) -> dict:
+    if is_dataclass(cfg):
+        return {f.name: getattr(cfg, f.name) for f in fields(cfg) if f.name not in _KEY_EXCLUDE}
+    return {k: v for k, v in vars(cfg).items() if k not in _KEY_EXCLUDE and not k.startswith("_")}
+
+
+def _digest(payload: object) -> str:
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=repr)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _config_payload(cfg: object, stop: Optional[StopCondition]) -> dict:
+    payload = _config_items(cfg)
+    if stop:
+        # 停止条件改变输出，单独放进 key（没有停止条件时 key 与之前一致）
+        payload["__stop__"] = asdict(stop)
+    return payload
+
+
+def cache_key(cfg: object, messages: Sequence[LLMMessage], stop: Optional[StopCondition] = None) -> str:
+    """
+    (backend, model, 采样参数等配置, 停止条件, 归一化后的消息列表) -> sha256
+    """
+    return _digest({"config": _config_payload(cfg, stop), "messages": _message_items(messages)})
+
+
+def _split_last_user(
+    cfg: object,
+    messages: Sequence[LLMMessage],
+    stop: Optional[StopCondition] = None,
+) -> Tuple[str, str]:
+    """
+    近似查找只比较最后一条 user 消息；其余上下文（配置 + 之前的消息）必须完全一致，作为 scope。
+    """
+    items = _message_items(messages)
+    last = ""
+    if items and items[-1]["role"] == "user":
+        last = " ".join(p.get("text", "") for p in items[-1]["parts"] if p["type"] == "text")
+        items = items[:-1]
+    return _digest({"config": _config_payload(cfg, stop), "messages": items}), last
+
+
+def ngram_embedding(text: str, n: int = 2, dim: int = 512) -> List[float]:
+    """
+    无依赖的字符 n-gram 哈希向量（L2 归一化），对标点 / 空格 / 个别字的差异不敏感，中文也适用。
+    """
+    s = normalize_text(text).casefold()
+    vec = [0.0] * dim
+    if not s:
+        return vec
+    grams = [s] if len(s) < n else [s[i : i + n] for i in range(len(s) - n + 1)]
+    for g in grams:
+        h = int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a)) or 1.0
+    nb = math.sqrt(sum(y * y for y in b)) or 1.0
+    return dot / (na * nb)
+
+
+@dataclass
+class _Entry:
+    response: LLMResponse
+    chunks: List[str]
+    created_at: float
+    scope: str
+    embedding: Optional[Sequence[float]] = None
+
+
+@dataclass
+class CacheHit:
+    response: LLMResponse
+    chunks: List[str]
+    similarity: float = 1.0
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    entries: int = 0
+
+
+class LLMResponseCache:
+    """
+    LRU + TTL 的响应缓存。精确命中按完整 key；配置了 embedder 时，
+    同一 scope（配置 + 之前的消息相同）下最后一条 user 消息足够相似也算命中。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_s: float = 3600.0,
+        embedder: Optional[Embedder] = None,
+        similarity_threshold: float = 0.95,
+    ) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self.embedder = embedder
+        self.similarity_threshold = float(similarity_threshold)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMResponseCache"]:
+        size = int(os.environ.get("AI_CORE_LLM_CACHE_SIZE", "256"))
+        if size <= 0:
+            return None
+        similarity = float(os.environ.get("AI_CORE_LLM_CACHE_SIMILARITY", "0"))
+        return cls(
+            max_entries=size,
+            ttl_s=float(os.environ.get("AI_CORE_LLM_CACHE_TTL_S", "3600")),
+            embedder=ngram_embedding if similarity > 0 else None,
+            similarity_threshold=similarity or 0.95,
+        )
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_s > 0 and now - entry.created_at > self.ttl_s
+
+    def lookup(
+        self,
+        cfg: object,
+        messages: Sequence[LLMMessage],
+        stop: Optional[StopCondition] = None,
+    ) -> Optional[CacheHit]:
+        key = cache_key(cfg, messages, stop)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry, now):
+                    self._entries.move_to_end(key)
+                    self._stats.hits += 1
+                    return CacheHit(response=entry.response, chunks=entry.chunks)
+                del self._entries[key]
+
+        hit = self._semantic_lookup(cfg, messages, now, stop)
+        with self._lock:
+            if hit is None:
+                self._stats.misses += 1
+            else:
+                self._stats.semantic_hits += 1
+        return hit
+
+    def _semantic_lookup(
+        self,
+        cfg: object,
+        messages: Sequence[LLMMessage],
+        now: float,
+        stop: Optional[StopCondition] = None,
+    ) -> Optional[CacheHit]:
+        if self.embedder is None:
+            return None
+        scope, query = _split_last_user(cfg, messages, stop)
+        if not query:
+            return None
+        with self._lock:
+            candidates = [
+                (k, e) for k, e in self._entries.items()
+                if e.scope == scope and e.embedding is not None and not self._expired(e, now)
+            ]
+        if not candidates:
+            return None
+
+        # embedding 可能较慢（外部模型），不在锁内计算
+        q = self.embedder(query)
+        best_key, best_entry, best_sim = None, None, -1.0
+        for k, e in candidates:
+            sim = _cosine(q, e.embedding or ())
+            if sim > best_sim:
+                best_key, best_entry, best_sim = k, e, sim
+        if best_entry is None or best_sim < self.similarity_threshold:
+            return None
+        with self._lock:
+            if best_key in self._entries:
+                self._entries.move_to_end(best_key)
+        return CacheHit(response=best_entry.response, chunks=best_entry.chunks, similarity=best_sim)
+
+    def put(
+        self,
+        cfg: object,
+        messages: Sequence[LLMMessage],
+        response: LLMResponse,
+        chunks: Optional[List[str]] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> None:
+        key = cache_key(cfg, messages, stop)
+        scope, query = _split_last_user(cfg, messages, stop)
+        embedding = self.embedder(query) if self.embedder is not None and query else None
+        entry = _Entry(
+            response=response,
+            chunks=list(chunks) if chunks is not None else [response.text],
+            created_at=time.time(),
+            scope=scope,
+            embedding=embedding,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return replace(self._stats, entries=len(self._entries))
+
+
+class CachedLLM:
+    """
+    给任意后端包一层响应缓存：命中时 generate 直接返回，stream 按原来的分块回放。
+    非确定性配置（采样）直接透传，不读也不写缓存。
+    """
+
+    def __init__(self, llm: BaseLLM, cache: LLMResponseCache) -> None:
+        self.llm = llm
+        self.cfg = llm.cfg
+        self.cache = cache
+        self.last_hit: Optional[CacheHit] = None
+
+    @property
+    def enabled(self) -> bool:
+        return is_deterministic(self.cfg)
+
+    def stream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> Iterator[LLMChunk]:
+        if not self.enabled:
+            yield from self.llm.stream(messages, cancel_token=cancel_token, stop=stop)
+            return
+
+        hit = self.cache.lookup(self.cfg, messages, stop)
+        self.last_hit = hit
+        if hit is not None:
+            for text in hit.chunks:
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    raise CancelledError()
+                if text:
+                    yield LLMChunk(text_delta=text, is_final=False)
+            yield LLMChunk(text_delta="", is_final=True)
+            return
+
+        chunks: List[str] = []
+        for ch in self.llm.stream(messages, cancel_token=cancel_token, stop=stop):
+            if ch.text_delta:
+                chunks.append(ch.text_delta)
+            # 在交出 final chunk 之前写入：调用方拿到 final 后通常直接 break，之后的代码不会再执行。
+            # 被取消 / 中途断开的结果到不了这里，不会写入
+            if ch.is_final and not (cancel_token is not None and cancel_token.is_cancelled()):
+                self._put_chunks(messages, chunks, stop)
+            yield ch
+
+    async def astream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[LLMChunk]:
+        if not self.enabled:
+            async for ch in astream(self.llm, messages, cancel_token=cancel_token, stop=stop):
+                yield ch
+            return
+
+        hit = self.cache.lookup(self.cfg, messages, stop)
+        self.last_hit = hit
+        if hit is not None:
+            for text in hit.chunks:
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    raise CancelledError()
+                if text:
+                    yield LLMChunk(text_delta=text, is_final=False)
+            yield LLMChunk(text_delta="", is_final=True)
+            return
+
+        chunks: List[str] = []
+        async for ch in astream(self.llm, messages, cancel_token=cancel_token, stop=stop):
+            if ch.text_delta:
+                chunks.append(ch.text_delta)
+            if ch.is_final and not (cancel_token is not None and cancel_token.is_cancelled()):
+                self._put_chunks(messages, chunks, stop)
+            yield ch
+
+    def _put_chunks(
+        self,
+        messages: List[LLMMessage],
+        chunks: List[str],
+        stop: Optional[StopCondition] = None,
+    ) -> None:
+        response = LLMResponse(
+            text="".join(chunks),
+            backend=getattr(self.cfg, "backend", None),
+            model=getattr(self.cfg, "model", None),
+        )
+        self.cache.put(self.cfg, messages, response, chunks, stop)
+
+    def generate(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> LLMResponse:
+        if not self.enabled:
+            return self.llm.generate(messages, cancel_token=cancel_token, stop=stop)
+
+        hit = self.cache.lookup(self.cfg, messages, stop)
+        self.last_hit = hit
+        if hit is not None:
+            return hit.response
+
+        response = self.llm.generate(messages, cancel_token=cancel_token, stop=stop)
+        self.cache.put(self.cfg, messages, response, stop=stop)
+        return response
+
+    async def agenerate(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> LLMResponse:
+        if not self.enabled:
+            return await agenerate(self.llm, messages, cancel_token=cancel_token, stop=stop)
+
+        hit = self.cache.lookup(self.cfg, messages, stop)
+        self.last_hit = hit
+        if hit is not None:
+            return hit.response
+
+        response = await agenerate(self.llm, messages, cancel_token=cancel_token, stop=stop)
+        self.cache.put(self.cfg, messages, response, stop=stop)
+        return response
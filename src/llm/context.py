@@ -0,0 +1,259 @@
+# src/llm/context.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import logging
+import os
+import threading
+from typing import Callable, List, Optional
+
+from src.llm.base import LLMMessage, MessagePart
+
+logger = logging.getLogger(__name__)
+
+# messages -> prompt token 数
+TokenCounter = Callable[[List[LLMMessage]], int]
+# (要丢弃的旧消息, 之前的摘要) -> 新摘要
+Summarizer = Callable[[List[LLMMessage], Optional[str]], str]
+
+SUMMARY_PREFIX = "此前对话摘要："
+
+_PER_MESSAGE_TOKENS = 4  # role 标记、换行等模板开销的粗略估计
+
+
+def message_text(msg: LLMMessage) -> str:
+    return "\n".join(p.text for p in msg.parts if p.type == "text" and p.text)
+
+
+def approx_token_count(messages: List[LLMMessage]) -> int:
+    """
+    没有本地 tokenizer 的后端（Gemini）用的估计：CJK 一个字约一个 token，其余约 4 个字符一个 token。
+    """
+    total = 0
+    for msg in messages:
+        text = message_text(msg)
+        cjk = sum(1 for c in text if ord(c) >= 0x2E80)
+        total += cjk + (len(text) - cjk + 3) // 4 + _PER_MESSAGE_TOKENS
+    return total
+
+
+def token_counter_for(llm) -> TokenCounter:
+    """
+    后端有 count_tokens（如 QwenOfficialLLM，用自己的 tokenizer + chat template）就用它，否则退回估计。
+    """
+    count = getattr(llm, "count_tokens", None)
+    return count if callable(count) else approx_token_count
+
+
+def llm_summarizer(llm, max_chars: int = 300) -> Summarizer:
+    """
+    用一个 LLM（可以是更小更快的模型）把旧对话压缩成摘要。
+    """
+
+    def _summarize(dropped: List[LLMMessage], previous: Optional[str]) -> str:
+        lines = []
+        if previous:
+            lines.append(f"已有摘要：{previous}")
+        for msg in dropped:
+            text = message_text(msg).strip()
+            if text:
+                lines.append(f"{msg.role}: {text}")
+        prompt = (
+            f"把下面的对话压缩成不超过 {max_chars} 字的摘要，保留人物、事实、约定和未完成的事项，"
+            "只输出摘要本身。\n\n" + "\n".join(lines)
+        )
+        res = llm.generate([LLMMessage(role="user", parts=[MessagePart(type="text", text=prompt)])])
+        return res.text.strip()[: max_chars * 2]
+
+    return _summarize
+
+
+@dataclass
+class ContextConfig:
+    # prompt 的 token 预算（不含回复）；超出时从最旧的轮次开始裁剪
+    max_tokens: int = field(default_factory=lambda: int(os.environ.get("AI_CORE_LLM_CONTEXT_TOKENS", "3072")))
+    # 超出预算后一次裁到 max_tokens * low_water，之后几轮前缀不变，prompt / KV 前缀缓存能继续命中
+    low_water: float = field(default_factory=lambda: float(os.environ.get("AI_CORE_LLM_CONTEXT_LOW_WATER", "0.7")))
+    # 至少保留最近几轮（user 开头的一轮），即使超出预算
+    min_turns: int = 1
+
+
+def _split_turns(messages: List[LLMMessage]) -> List[List[LLMMessage]]:
+    """
+    按轮次分组：每个 user 消息开始新的一轮，后面的 assistant / tool 消息归入同一轮。
+    """
+    turns: List[List[LLMMessage]] = []
+    for msg in messages:
+        if msg.role == "user" or not turns:
+            turns.append([msg])
+        else:
+            turns[-1].append(msg)
+    return turns
+
+
+def fit_to_budget(
+    messages: List[LLMMessage],
+    max_tokens: int,
+    token_counter: TokenCounter = approx_token_count,
+    min_turns: int = 1,
+) -> List[LLMMessage]:
+    """
+    无状态版本（服务端用）：开头的 system 消息固定保留，从最旧的轮次开始丢，直到不超过 max_tokens。
+    """
+    if max_tokens <= 0 or token_counter(messages) <= max_tokens:
+        return messages
+    pinned = 0
+    while pinned < len(messages) and messages[pinned].role == "system":
+        pinned += 1
+    head, turns = messages[:pinned], _split_turns(messages[pinned:])
+    while len(turns) > max(1, min_turns):
+        turns.pop(0)
+        trimmed = head + [m for turn in turns for m in turn]
+        if token_counter(trimmed) <= max_tokens:
+            return trimmed
+    return head + [m for turn in turns for m in turn]
+
+
+class ConversationStore:
+    """
+    多轮对话历史，按 token 预算管理上下文：
+    - system prompt 固定在最前面，不参与裁剪（前缀缓存一直有效）
+    - 超出 max_tokens 时按整轮从旧到新丢弃，一次降到 low_water 水位，而不是每轮都挪一点
+    - 提供 summarizer 时，丢弃的轮次被压缩进一条摘要（放在 system prompt 之后），摘要失败就直接丢弃
+    """
+
+    def __init__(
+        self,
+        system_prompt: Optional[str] = None,
+        *,
+        token_counter: Optional[TokenCounter] = None,
+        config: Optional[ContextConfig] = None,
+        summarizer: Optional[Summarizer] = None,
+    ) -> None:
+        self.system_prompt = system_prompt
+        self.token_counter = token_counter or approx_token_count
+        self.config = config or ContextConfig()
+        self.summarizer = summarizer
+        self.summary: Optional[str] = None
+        self.turns: List[List[LLMMessage]] = []
+        self.compactions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_llm(cls, llm, system_prompt: Optional[str] = None, **kwargs) -> "ConversationStore":
+        return cls(system_prompt, token_counter=token_counter_for(llm), **kwargs)
+
+    def _head(self) -> List[LLMMessage]:
+        head: List[LLMMessage] = []
+        if self.system_prompt:
+            head.append(LLMMessage(role="system", parts=[MessagePart(type="text", text=self.system_prompt)]))
+        if self.summary:
+            head.append(
+                LLMMessage(role="system", parts=[MessagePart(type="text", text=SUMMARY_PREFIX + self.summary)])
+            )
+        return head
+
+    def _render(self, turns: List[List[LLMMessage]]) -> List[LLMMessage]:
+        return self._head() + [m for turn in turns for m in turn]
+
+    def messages(self) -> List[LLMMessage]:
+        with self._lock:
+            return self._render(self.turns)
+
+    def token_count(self) -> int:
+        return self.token_counter(self.messages())
+
+    def add_user(self, text: str) -> List[LLMMessage]:
+        """
+        追加 user 消息（新的一轮），按需裁剪，返回要发给 LLM 的完整消息列表。
+        """
+        return self.append(LLMMessage(role="user", parts=[MessagePart(type="text", text=text)]))
+
+    def add_assistant(self, text: str) -> List[LLMMessage]:
+        return self.append(LLMMessage(role="assistant", parts=[MessagePart(type="text", text=text)]))
+
+    def append(self, msg: LLMMessage) -> List[LLMMessage]:
+        with self._lock:
+            if msg.role == "system":
+                # 中途的 system 消息当作新的固定 prompt
+                self.system_prompt = message_text(msg)
+            elif msg.role == "user" or not self.turns:
+                self.turns.append([msg])
+            else:
+                self.turns[-1].append(msg)
+            self._compact_locked()
+            return self._render(self.turns)
+
+    def discard_last_turn(self) -> None:
+        """
+        丢掉最后一轮（例如回复被打断，不想让只有问题没有回答的一轮留在历史里）。
+        """
+        with self._lock:
+            if self.turns:
+                self.turns.pop()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.turns.clear()
+            self.summary = None
+
+    def to_dict(self) -> dict:
+        """
+        可 JSON 序列化的快照（只保存文本部分），会话持久化用。
+        """
+        with self._lock:
+            return {
+                "system_prompt": self.system_prompt,
+                "summary": self.summary,
+                "max_tokens": self.config.max_tokens,
+                "low_water": self.config.low_water,
+                "min_turns": self.config.min_turns,
+                "turns": [[{"role": m.role, "text": message_text(m)} for m in turn] for turn in self.turns],
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict, **kwargs) -> "ConversationStore":
+        config = ContextConfig(
+            max_tokens=int(data.get("max_tokens", ContextConfig().max_tokens)),
+            low_water=float(data.get("low_water", ContextConfig().low_water)),
+            min_turns=int(data.get("min_turns", 1)),
+        )
+        store = cls(data.get("system_prompt"), config=config, **kwargs)
+        store.summary = data.get("summary")
+        store.turns = [
+            [LLMMessage(role=m["role"], parts=[MessagePart(type="text", text=m["text"])]) for m in turn]
+            for turn in data.get("turns") or []
+            if turn
+        ]
+        return store
+
+    def compact(self) -> bool:
+        with self._lock:
+            return self._compact_locked()
+
+    def _compact_locked(self) -> bool:
+        cfg = self.config
+        if cfg.max_tokens <= 0 or self.token_counter(self._render(self.turns)) <= cfg.max_tokens:
+            return False
+
+        target = int(cfg.max_tokens * min(max(cfg.low_water, 0.0), 1.0))
+        keep = max(1, cfg.min_turns)
+        dropped: List[LLMMessage] = []
+        while len(self.turns) > keep:
+            dropped.extend(self.turns.pop(0))
+            if self.token_counter(self._render(self.turns)) <= target:
+                break
+        if not dropped:
+            return False
+
+        if self.summarizer is not None:
+            try:
+                self.summary = self.summarizer(dropped, self.summary) or self.summary
+            except Exception as exc:
+                logger.warning("conversation summarizer failed, dropping %d messages: %s", len(dropped), exc)
+            # 摘要本身也占预算，太长时继续丢旧轮次
+            while len(self.turns) > keep and self.token_counter(self._render(self.turns)) > cfg.max_tokens:
+                self.turns.pop(0)
+
+        self.compactions += 1
+        return True
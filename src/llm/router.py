@@ -0,0 +1,289 @@
+# src/llm/router.py
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.llm.base import (
+    BaseLLM,
+    CancelToken,
+    CancelledError,
+    LLMChunk,
+    LLMMessage,
+    LLMResponse,
+    StopCondition,
+)
+
+_POLL_S = 0.05
+
+
+@dataclass
+class BackendStats:
+    ttft_ms: Optional[float] = None      # 首 token 延迟的 EWMA
+    total_ms: Optional[float] = None     # 完整响应耗时的 EWMA
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    last_failure_at: float = 0.0
+
+
+class LatencyTracker:
+    """
+    按后端名记录首 token / 总耗时（EWMA）和失败情况，多个请求、多个 router 共享一个实例。
+    连续失败 failure_threshold 次的后端进入 cooldown_s 冷却，冷却期内排到最后。
+    """
+
+    def __init__(self, alpha: float = 0.3, failure_threshold: int = 3, cooldown_s: float = 30.0) -> None:
+        self.alpha = float(alpha)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_s = float(cooldown_s)
+        self._stats: Dict[str, BackendStats] = {}
+        self._lock = threading.Lock()
+
+    def _ewma(self, old: Optional[float], value: float) -> float:
+        return value if old is None else (1.0 - self.alpha) * old + self.alpha * value
+
+    def record_first_token(self, name: str, ttft_ms: float) -> None:
+        with self._lock:
+            st = self._stats.setdefault(name, BackendStats())
+            st.ttft_ms = self._ewma(st.ttft_ms, ttft_ms)
+
+    def record_success(self, name: str, total_ms: float) -> None:
+        with self._lock:
+            st = self._stats.setdefault(name, BackendStats())
+            st.requests += 1
+            st.consecutive_failures = 0
+            st.total_ms = self._ewma(st.total_ms, total_ms)
+
+    def record_failure(self, name: str) -> None:
+        with self._lock:
+            st = self._stats.setdefault(name, BackendStats())
+            st.requests += 1
+            st.failures += 1
+            st.consecutive_failures += 1
+            st.last_failure_at = time.time()
+
+    def cooling_down(self, name: str) -> bool:
+        with self._lock:
+            st = self._stats.get(name)
+            if st is None or st.consecutive_failures < self.failure_threshold:
+                return False
+            return time.time() - st.last_failure_at < self.cooldown_s
+
+    def snapshot(self) -> Dict[str, BackendStats]:
+        with self._lock:
+            return {name: replace(st) for name, st in self._stats.items()}
+
+    def rank(self, names: Sequence[str], by_latency: bool = False) -> List[str]:
+        """
+        冷却中的后端排到最后；by_latency=True 时其余按首 token EWMA 升序（没数据的保持原顺序，排在有数据的后面）。
+        """
+        healthy = [n for n in names if not self.cooling_down(n)]
+        cooling = [n for n in names if n not in healthy]
+        if by_latency:
+            stats = self.snapshot()
+            known = sorted(
+                (n for n in healthy if stats.get(n) and stats[n].ttft_ms is not None),
+                key=lambda n: stats[n].ttft_ms,  # type: ignore[arg-type, return-value]
+            )
+            healthy = known + [n for n in healthy if n not in known]
+        return healthy + cooling
+
+
+@dataclass
+class _Attempt:
+    name: str
+    llm: BaseLLM
+    token: CancelToken
+    started_at: float
+    thread: threading.Thread
+
+
+class LLMRouter:
+    """
+    在多个后端之间路由，同样实现 stream()/generate()：
+    - failover：出首 token 之前失败，自动换下一个后端
+    - hedging：hedge_ms 内还没有首 token，再并行启动下一个后端；先出 token 的胜出，其余通过 CancelToken 取消
+    一旦开始输出，就固定在胜出的后端上（中途失败直接抛出，避免重复文本）。
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[Tuple[str, BaseLLM]],
+        *,
+        tracker: Optional[LatencyTracker] = None,
+        hedge_ms: Optional[float] = None,
+        route_by_latency: bool = False,
+    ) -> None:
+        if not backends:
+            raise ValueError("LLMRouter requires at least one backend")
+        self.backends: Dict[str, BaseLLM] = dict(backends)
+        self.order = [name for name, _ in backends]
+        self.tracker = tracker or LatencyTracker()
+        self.hedge_ms = hedge_ms
+        self.route_by_latency = route_by_latency
+        self.cfg = backends[0][1].cfg
+        self.last_backend: Optional[str] = None
+
+    def _start(
+        self,
+        name: str,
+        messages: List[LLMMessage],
+        events: "queue.Queue[tuple]",
+        stop: Optional[StopCondition] = None,
+    ) -> _Attempt:
+        llm = self.backends[name]
+        token = CancelToken()
+
+        def _run() -> None:
+            # 不管怎么退出都恰好投递一个结束项（end / cancelled / error），stream() 才不会一直等这个后端
+            outcome: Tuple[str, Optional[BaseException]] = (
+                "error",
+                RuntimeError(f"LLM backend '{name}' stopped without a result"),
+            )
+            try:
+                for ch in llm.stream(messages, cancel_token=token, stop=stop):
+                    events.put((name, "chunk", ch))
+                    if ch.is_final:
+                        break
+                outcome = ("end", None)
+            except CancelledError:
+                outcome = ("cancelled", None)
+            except BaseException as exc:
+                outcome = ("error", exc)
+            finally:
+                events.put((name, *outcome))
+
+        thread = threading.Thread(target=_run, name=f"llm-route-{name}", daemon=True)
+        attempt = _Attempt(name=name, llm=llm, token=token, started_at=time.perf_counter(), thread=thread)
+        thread.start()
+        return attempt
+
+    def stream(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> Iterator[LLMChunk]:
+        if cancel_token is not None and cancel_token.is_cancelled():
+            raise CancelledError()
+
+        candidates = self.tracker.rank(self.order, by_latency=self.route_by_latency)
+        events: "queue.Queue[tuple]" = queue.Queue()
+        attempts: Dict[str, _Attempt] = {}
+        finished: set = set()
+        winner: Optional[str] = None
+        last_error: Optional[BaseException] = None
+
+        def _launch_next() -> bool:
+            for name in candidates:
+                if name not in attempts:
+                    attempts[name] = self._start(name, messages, events, stop)
+                    return True
+            return False
+
+        def _running() -> int:
+            return sum(1 for n in attempts if n not in finished)
+
+        _launch_next()
+        hedge_at = None if self.hedge_ms is None else time.perf_counter() + self.hedge_ms / 1000.0
+
+        try:
+            while True:
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    raise CancelledError()
+
+                timeout = _POLL_S
+                if winner is None and hedge_at is not None:
+                    timeout = max(0.0, min(timeout, hedge_at - time.perf_counter()))
+                try:
+                    name, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    if winner is None and hedge_at is not None and time.perf_counter() >= hedge_at:
+                        # 到点还没有首 token：对冲启动下一个后端
+                        if not _launch_next():
+                            hedge_at = None
+                        else:
+                            hedge_at = time.perf_counter() + self.hedge_ms / 1000.0  # type: ignore[operator]
+                    continue
+
+                if kind != "chunk":
+                    finished.add(name)
+                if winner is not None and name != winner:
+                    continue  # 输掉的后端在取消前多产出的内容
+                attempt = attempts[name]
+
+                if kind == "chunk":
+                    ch: LLMChunk = payload
+                    if winner is None and (ch.text_delta or ch.is_final):
+                        winner = name
+                        self.last_backend = name
+                        elapsed_ms = (time.perf_counter() - attempt.started_at) * 1000.0
+                        self.tracker.record_first_token(name, elapsed_ms)
+                        for other in attempts.values():
+                            if other.name != name:
+                                other.token.cancel()
+                    if winner == name:
+                        if ch.is_final:
+                            self.tracker.record_success(name, (time.perf_counter() - attempt.started_at) * 1000.0)
+                        yield ch
+                        if ch.is_final:
+                            return
+                    continue
+
+                if kind == "end":
+                    if winner is None:
+                        # 没有任何输出就正常结束：当作空回复
+                        winner = name
+                        self.last_backend = name
+                        for other in attempts.values():
+                            if other.name != name:
+                                other.token.cancel()
+                    self.tracker.record_success(name, (time.perf_counter() - attempt.started_at) * 1000.0)
+                    yield LLMChunk(text_delta="", is_final=True)
+                    return
+
+                if kind == "cancelled":
+                    continue
+
+                # kind == "error"
+                self.tracker.record_failure(name)
+                last_error = payload
+                if winner is not None:
+                    raise RuntimeError(f"LLM backend '{name}' failed mid-stream") from payload
+                # 还有对冲中的后端在跑就继续等它；否则立即切到下一个
+                if _running() == 0 and not _launch_next():
+                    raise RuntimeError("All LLM backends failed") from last_error
+                if self.hedge_ms is not None:
+                    hedge_at = time.perf_counter() + self.hedge_ms / 1000.0
+        finally:
+            for attempt in attempts.values():
+                if attempt.name != winner:
+                    attempt.token.cancel()
+            if winner is not None and winner in attempts:
+                # 调用方提前退出时也要让胜出的后端停下
+                attempts[winner].token.cancel()
+
+    def generate(
+        self,
+        messages: List[LLMMessage],
+        cancel_token: Optional[CancelToken] = None,
+        stop: Optional[StopCondition] = None,
+    ) -> LLMResponse:
+        text_parts: List[str] = []
+        for ch in self.stream(messages, cancel_token=cancel_token, stop=stop):
+            if ch.text_delta:
+                text_parts.append(ch.text_delta)
+            if ch.is_final:
+                break
+
+        llm = self.backends.get(self.last_backend or "", None)
+        cfg = llm.cfg if llm is not None else self.cfg
+        return LLMResponse(
+            text="".join(text_parts),
+            backend=getattr(cfg, "backend", None),
+            model=getattr(cfg, "model", None),
+        )
@@ -0,0 +1,186 @@
+# src/llm/session.py
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from src.llm.context import ContextConfig, ConversationStore
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+@dataclass
+class LLMSession:
+    session_id: str
+    backend: str
+    config: Optional[Dict[str, Any]]
+    conversation: ConversationStore
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    # 同一会话同时只处理一个请求，避免两轮交错写入历史
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "backend": self.backend,
+            "config": self.config,
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+            "conversation": self.conversation.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LLMSession":
+        return cls(
+            session_id=data["session_id"],
+            backend=data["backend"],
+            config=data.get("config"),
+            conversation=ConversationStore.from_dict(data.get("conversation") or {}),
+            created_at=float(data.get("created_at", time.time())),
+            last_used=float(data.get("last_used", time.time())),
+        )
+
+
+class SessionStore:
+    """
+    服务端会话：session_id -> 历史消息，客户端每次只发新的一轮。
+    - 内存里按 LRU 保留最多 max_sessions 个，超过 ttl_s 未使用的会话过期
+    - persist_dir 不为空时每轮结束写一个 JSON 文件；被 LRU 挤出内存的会话下次访问时从磁盘恢复
+    """
+
+    def __init__(
+        self,
+        ttl_s: float = 1800.0,
+        max_sessions: int = 256,
+        persist_dir: Optional[str] = None,
+    ) -> None:
+        self.ttl_s = float(ttl_s)
+        self.max_sessions = max(1, int(max_sessions))
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        if self.persist_dir is not None:
+            self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self._sessions: "OrderedDict[str, LLMSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            ttl_s=float(os.environ.get("AI_CORE_LLM_SESSION_TTL_S", "1800")),
+            max_sessions=int(os.environ.get("AI_CORE_LLM_SESSIONS_MAX", "256")),
+            persist_dir=os.environ.get("AI_CORE_LLM_SESSION_DIR") or None,
+        )
+
+    def create(
+        self,
+        backend: str,
+        config: Optional[Dict[str, Any]] = None,
+        system_prompt: Optional[str] = None,
+        context: Optional[ContextConfig] = None,
+    ) -> LLMSession:
+        session = LLMSession(
+            session_id=uuid.uuid4().hex,
+            backend=backend,
+            config=config,
+            conversation=ConversationStore(system_prompt, config=context),
+        )
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._evict_locked()
+        self.save(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[LLMSession]:
+        if not _SESSION_ID_RE.match(session_id or ""):
+            return None
+        now = time.time()
+        with self._lock:
+            self._evict_locked(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id)
+                if session is None:
+                    return None
+                if self._expired(session, now):
+                    self._path(session_id).unlink(missing_ok=True)  # type: ignore[union-attr]
+                    return None
+                self._sessions[session_id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            self._evict_locked(now)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        if not _SESSION_ID_RE.match(session_id or ""):
+            return False
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+        path = self._path(session_id)
+        if path is not None and path.exists():
+            path.unlink(missing_ok=True)
+            found = True
+        return found
+
+    def save(self, session: LLMSession) -> None:
+        path = self._path(session.session_id)
+        if path is None:
+            return
+        tmp = path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(session.to_dict(), ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning("failed to persist LLM session %s: %s", session.session_id, exc)
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            self._evict_locked()
+            return list(self._sessions)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _path(self, session_id: str) -> Optional[Path]:
+        if self.persist_dir is None:
+            return None
+        return self.persist_dir / f"{session_id}.json"
+
+    def _load(self, session_id: str) -> Optional[LLMSession]:
+        path = self._path(session_id)
+        if path is None or not path.exists():
+            return None
+        try:
+            return LLMSession.from_dict(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("failed to load LLM session %s: %s", session_id, exc)
+            return None
+
+    def _expired(self, session: LLMSession, now: float) -> bool:
+        return self.ttl_s > 0 and now - session.last_used > self.ttl_s
+
+    def _evict_locked(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        # OrderedDict 按最近使用排序，过期的都在前面
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if not self._expired(session, now):
+                break
+            self._sessions.popitem(last=False)
+            path = self._path(session_id)
+            if path is not None:
+                path.unlink(missing_ok=True)
+        while len(self._sessions) > self.max_sessions:
+            # 只从内存移出；持久化的会话下次访问时再读回来
+            self._sessions.popitem(last=False)
@@ -0,0 +1,27 @@
+# src/pipeline/__init__.py
+from src.pipeline.async_engine import AsyncVoicePipeline, PipelineExecutors
+from src.pipeline.control import GenerationCounter, InterruptController, LatestQueue
+from src.pipeline.engine import PipelineEvent, TurnStats, VoicePipeline, VoicePipelineConfig
+from src.pipeline.sinks import AudioSink, FileSink, NullSink, SpeakerSink, WebSocketSink
+from src.pipeline.sources import MicrophoneSource, ScriptedSource, Utterance, UtteranceSource
+
+__all__ = [
+    "AsyncVoicePipeline",
+    "AudioSink",
+    "FileSink",
+    "GenerationCounter",
+    "InterruptController",
+    "LatestQueue",
+    "MicrophoneSource",
+    "NullSink",
+    "PipelineEvent",
+    "PipelineExecutors",
+    "ScriptedSource",
+    "SpeakerSink",
+    "TurnStats",
+    "Utterance",
+    "UtteranceSource",
+    "VoicePipeline",
+    "VoicePipelineConfig",
+    "WebSocketSink",
+]
@@ -0,0 +1,542 @@
+# src/pipeline/async_engine.py
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from src.llm.aio import astream
+from src.llm.base import CancelledError, StopCondition
+from src.llm.context import ConversationStore
+from src.pipeline.engine import (
+    EventCallback,
+    PipelineEvent,
+    SegmentState,
+    TurnStats,
+    VoicePipelineConfig,
+)
+from src.pipeline.sinks import AudioSink
+from src.pipeline.sources import Utterance, UtteranceSource
+from src.tts.base import CancelledError as TTSCancelledError, CancelToken as TTSCancelToken, TTSResult
+from src.tts.segmenter import TextSegmenter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineExecutors:
+    """
+    进程内所有异步会话共享的线程池：阻塞的模型调用（ASR / 同步 LLM 流 / TTS）和阻塞 IO 放在这里，
+    线程数就是各个模型的并发上限，不随会话数增长。
+    """
+
+    asr_threads: int = field(default_factory=lambda: int(os.environ.get("AI_CORE_PIPELINE_ASR_THREADS", "2")))
+    llm_threads: int = field(default_factory=lambda: int(os.environ.get("AI_CORE_PIPELINE_LLM_THREADS", "16")))
+    # Genie 的合成并发由 GENIE_POOL_SIZE（worker 进程数）决定，这里多给线程只会排队等空闲的 worker
+    tts_threads: int = field(default_factory=lambda: int(os.environ.get("AI_CORE_PIPELINE_TTS_THREADS", "4")))
+    io_threads: int = field(default_factory=lambda: int(os.environ.get("AI_CORE_PIPELINE_IO_THREADS", "8")))
+
+    asr: ThreadPoolExecutor = field(init=False, repr=False)
+    llm: ThreadPoolExecutor = field(init=False, repr=False)
+    tts: ThreadPoolExecutor = field(init=False, repr=False)
+    io: ThreadPoolExecutor = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.asr = ThreadPoolExecutor(max(1, self.asr_threads), thread_name_prefix="pipeline-asr")
+        self.llm = ThreadPoolExecutor(max(1, self.llm_threads), thread_name_prefix="pipeline-llm")
+        self.tts = ThreadPoolExecutor(max(1, self.tts_threads), thread_name_prefix="pipeline-tts")
+        self.io = ThreadPoolExecutor(max(1, self.io_threads), thread_name_prefix="pipeline-io")
+
+    def shutdown(self, wait: bool = False) -> None:
+        for pool in (self.asr, self.llm, self.tts, self.io):
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_DEFAULT_EXECUTORS: Optional[PipelineExecutors] = None
+_DEFAULT_EXECUTORS_LOCK = threading.Lock()
+
+
+def default_executors() -> PipelineExecutors:
+    global _DEFAULT_EXECUTORS
+    with _DEFAULT_EXECUTORS_LOCK:
+        if _DEFAULT_EXECUTORS is None:
+            _DEFAULT_EXECUTORS = PipelineExecutors()
+        return _DEFAULT_EXECUTORS
+
+
+@dataclass
+class _PendingSegment:
+    gen_id: int
+    reply_id: int
+    seg_idx: int
+    text: str
+    # 合成任务：提交后立刻开始（受 tts_workers 限制），播放协程按顺序 await，天然保持 seg_idx 顺序
+    task: "asyncio.Task[Tuple[TTSResult, float, float]]"
+
+
+class AsyncVoicePipeline:
+    """
+    asyncio 版的语音会话，和 VoicePipeline 的语义一致（gen_id、打断、并行合成按序播放、事件、TurnStats），
+    但阶段之间是 await 而不是线程 + queue.get(timeout=0.2) 轮询，交接没有额外延迟：
+
+        executors = PipelineExecutors()
+        async with AsyncVoicePipeline(asr, llm, tts, source, NullSink(), executors=executors) as session:
+            await session.wait()
+
+    - 每个会话只有三个协程（listen / reply / playback），不占线程；一个进程可以跑几百个会话
+    - 阻塞的模型调用放到共享的 PipelineExecutors 里；LLM 有 astream 时直接用，source / sink 有
+      alisten / awrite 时直接用，否则同样放进线程池
+    - 必须在同一个事件循环里创建、启动和使用
+    """
+
+    def __init__(
+        self,
+        asr: Any,
+        llm: Any,
+        tts: Any,
+        source: Optional[UtteranceSource],
+        sink: AudioSink,
+        cfg: Optional[VoicePipelineConfig] = None,
+        *,
+        executors: Optional[PipelineExecutors] = None,
+        on_event: Optional[EventCallback] = None,
+        conversation: Optional[ConversationStore] = None,
+        name: str = "session",
+    ) -> None:
+        self.asr = asr
+        self.llm = llm
+        self.tts = tts
+        self.source = source
+        self.sink = sink
+        self.cfg = cfg or VoicePipelineConfig()
+        self.executors = executors or default_executors()
+        self.on_event = on_event
+        self.name = name
+        self.conversation = conversation or ConversationStore.for_llm(llm, self.cfg.system_prompt)
+        self.reply_stop = StopCondition(max_sentences=self.cfg.max_sentences) if self.cfg.max_sentences else None
+
+        workers = self.cfg.tts_workers or int(getattr(getattr(tts, "cfg", None), "pool_size", 0) or 2)
+        self.tts_workers = max(1, workers)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        self._gen_id = 0
+        self._reply_counter = 0
+        self._turns: "OrderedDict[int, TurnStats]" = OrderedDict()
+        self._tts_token = TTSCancelToken()
+        self._reply_task: Optional[asyncio.Task] = None
+        # 输出端写入放在线程池里时，打断的 flush 等写入返回后在同一个“生产者”上执行
+        self._thread_write = False
+        self._flush_pending = False
+        self._completed_watcher: Optional[asyncio.Task] = None
+        # 排队的用户输入 + 正在回复 + 排队 / 正在播放的段落；为 0 时会话空闲
+        self._busy = 0
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> "AsyncVoicePipeline":
+        if self._tasks:
+            return self
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._user_q: "asyncio.Queue[Tuple[Utterance, str, float]]" = asyncio.Queue(maxsize=1)
+        self._segments: "asyncio.Queue[_PendingSegment]" = asyncio.Queue(maxsize=max(1, self.cfg.max_pending_segments))
+        self._tts_slots = asyncio.Semaphore(self.tts_workers)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._source_done = asyncio.Event()
+
+        self._tasks.append(asyncio.create_task(self._reply_loop(), name=f"{self.name}-reply"))
+        self._tasks.append(asyncio.create_task(self._playback_loop(), name=f"{self.name}-playback"))
+        if self.source is not None:
+            self.source.on_speech_start = self._speech_start
+            self._tasks.append(asyncio.create_task(self._listen_loop(), name=f"{self.name}-listen"))
+        else:
+            self._source_done.set()
+        return self
+
+    async def stop(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._tts_token.cancel()
+        if self.source is not None:
+            self.source.close()
+        tasks = list(self._tasks)
+        if self._reply_task is not None:
+            tasks.append(self._reply_task)
+        if self._completed_watcher is not None:
+            tasks.append(self._completed_watcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._drain_segments()
+        self._tasks.clear()
+        try:
+            self.sink.close()
+        except Exception as exc:
+            logger.warning("failed to close audio sink: %s", exc)
+
+    async def __aenter__(self) -> "AsyncVoicePipeline":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) and not self._closing
+
+    def idle(self) -> bool:
+        return self._busy == 0 and self.sink.pending_s() <= 0
+
+    async def wait_idle(self) -> None:
+        """
+        等到没有排队 / 生成 / 合成中的回复，并且输出端播完。
+        """
+        while True:
+            await self._idle.wait()
+            remaining = self.sink.pending_s()
+            if remaining <= 0:
+                if self._busy == 0:
+                    return
+                continue
+            # 输出端的剩余时长是已知的，直接睡到播完；期间有新回复就再等一轮
+            await asyncio.sleep(remaining)
+            self._report_completed()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等 source 结束并且会话空闲（无头运行 / 压测用）；超时返回 False。
+        """
+
+        async def _wait() -> None:
+            await self._source_done.wait()
+            await self.wait_idle()
+
+        try:
+            await asyncio.wait_for(_wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ---------- control ----------
+
+    async def submit_text(self, text: str, *, asr_ms: float = 0.0) -> None:
+        self.barge_in()
+        self._push_user(Utterance(text=text), text, asr_ms)
+
+    def barge_in(self) -> int:
+        """
+        打断：取消正在进行的 LLM 生成和合成、丢掉排队的段落、输出端淡出。必须在事件循环线程里调用。
+        """
+        if not self.idle() and self._turns:
+            next(reversed(self._turns.values())).interrupted = True
+        self._gen_id += 1
+        self._tts_token.cancel()
+        self._tts_token = TTSCancelToken()
+        if self._reply_task is not None and not self._reply_task.done():
+            self._reply_task.cancel()
+        self._drain_segments()
+        if self._thread_write:
+            self._flush_pending = True
+        else:
+            self.sink.flush()
+        self._emit("interrupt", gen_id=self._gen_id)
+        return self._gen_id
+
+    def turn_stats(self) -> List[TurnStats]:
+        return list(self._turns.values())
+
+    def _speech_start(self) -> None:
+        # 麦克风的 VAD 回调在录音线程里触发，转回事件循环执行
+        if threading.get_ident() == self._loop_thread or self._loop is None:
+            self.barge_in()
+        else:
+            self._loop.call_soon_threadsafe(self.barge_in)
+
+    # ---------- busy accounting ----------
+
+    def _acquire(self, n: int = 1) -> None:
+        self._busy += n
+        self._idle.clear()
+
+    def _release(self, n: int = 1) -> None:
+        self._busy = max(0, self._busy - n)
+        if self._busy == 0:
+            self._idle.set()
+
+    # ---------- stages ----------
+
+    async def _listen(self) -> Optional[Utterance]:
+        assert self.source is not None
+        alisten = getattr(self.source, "alisten", None)
+        if alisten is not None:
+            return await alisten()
+        return await self._loop.run_in_executor(self.executors.io, self.source.listen)
+
+    async def _listen_loop(self) -> None:
+        try:
+            while not self._closing:
+                try:
+                    utt = await self._listen()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    self._emit("error", text=f"source: {exc}")
+                    break
+                if utt is None:
+                    break
+                if utt.text is not None:
+                    text, asr_ms = utt.text.strip(), 0.0
+                else:
+                    if utt.duration_s < self.cfg.min_utterance_s:
+                        continue
+                    try:
+                        text, asr_ms = await self._transcribe(utt)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as exc:
+                        self._emit("error", text=f"asr: {exc}")
+                        continue
+                if not text:
+                    continue
+                if self._reply_task is not None and not self._reply_task.done():
+                    self._reply_task.cancel()
+                self._push_user(utt, text, asr_ms)
+        finally:
+            self._source_done.set()
+
+    async def _transcribe(self, utt: Utterance) -> Tuple[str, float]:
+        if self.asr is None:
+            raise RuntimeError("pipeline has no ASR backend for audio input")
+        start = time.perf_counter()
+        res = await self._loop.run_in_executor(
+            self.executors.asr,
+            functools.partial(self.asr.transcribe, utt.audio, sample_rate=utt.sample_rate),
+        )
+        asr_ms = (time.perf_counter() - start) * 1000.0
+        text = (res.text or "").strip()
+        if text:
+            self._emit(
+                "asr",
+                text=text,
+                data={"asr_ms": asr_ms, "lang": res.lang, "backend": res.backend or self.asr.__class__.__name__},
+            )
+        return text, asr_ms
+
+    def _push_user(self, utt: Utterance, text: str, asr_ms: float) -> None:
+        # 只保留最新一句：还没开始回复的旧输入直接替换
+        try:
+            self._user_q.get_nowait()
+        except asyncio.QueueEmpty:
+            self._acquire()
+        self._user_q.put_nowait((utt, text, asr_ms))
+
+    async def _reply_loop(self) -> None:
+        while True:
+            utt, text, asr_ms = await self._user_q.get()
+            self._reply_task = asyncio.create_task(self._reply(utt, text, asr_ms), name=f"{self.name}-llm")
+            try:
+                await self._reply_task
+            except asyncio.CancelledError:
+                if self._closing:
+                    raise
+            finally:
+                self._reply_task = None
+                self._release()
+
+    async def _reply(self, utt: Utterance, text: str, asr_ms: float) -> None:
+        history = self.conversation.add_user(text)
+        self._gen_id += 1
+        gen_id = self._gen_id
+        self._reply_counter += 1
+        reply_id = self._reply_counter
+        stats = TurnStats(
+            reply_id=reply_id, gen_id=gen_id, user_text=text, asr_ms=asr_ms,
+            ended_at=utt.ended_at,
+        )
+        self._record_turn(stats)
+        self._emit("llm_start", reply_id=reply_id, gen_id=gen_id, text=text)
+
+        seg_idx = 0
+        parts: List[str] = []
+        segmenter = TextSegmenter(self.cfg.segmenter)
+        token = self._tts_token
+        llm_start = time.perf_counter()
+
+        async def emit_segment(segment: str) -> None:
+            nonlocal seg_idx
+            seg_idx += 1
+            stats.segments = seg_idx
+            self._emit("segment", reply_id=reply_id, gen_id=gen_id, seg_idx=seg_idx, text=segment)
+            task = asyncio.create_task(self._synthesize(segment, token))
+            self._acquire()
+            # 队列满时在这里等（背压），LLM 流也随之暂停
+            try:
+                await self._segments.put(_PendingSegment(gen_id, reply_id, seg_idx, segment, task))
+            except BaseException:
+                task.cancel()
+                self._release()
+                raise
+
+        try:
+            async for ch in astream(self.llm, history, stop=self.reply_stop, executor=self.executors.llm):
+                if ch.text_delta:
+                    if stats.llm_first_token_ms is None:
+                        stats.llm_first_token_ms = (time.perf_counter() - llm_start) * 1000.0
+                    parts.append(ch.text_delta)
+                    self._emit("llm_delta", reply_id=reply_id, gen_id=gen_id, text=ch.text_delta)
+                    for segment in segmenter.push(ch.text_delta):
+                        await emit_segment(segment)
+                if ch.is_final:
+                    break
+            stats.llm_ms = (time.perf_counter() - llm_start) * 1000.0
+
+            reply_text = "".join(parts).strip()
+            stats.reply_text = reply_text
+            if not reply_text:
+                self._emit("llm_done", reply_id=reply_id, gen_id=gen_id, data={"llm_ms": stats.llm_ms})
+                return
+            for segment in segmenter.flush():
+                await emit_segment(segment)
+            self.conversation.add_assistant(reply_text)
+            self._emit("llm_done", reply_id=reply_id, gen_id=gen_id, text=reply_text, data={"llm_ms": stats.llm_ms})
+        except (asyncio.CancelledError, CancelledError):
+            stats.interrupted = True
+            self._emit("llm_interrupted", reply_id=reply_id, gen_id=gen_id)
+            if self._closing:
+                raise
+        except Exception as exc:
+            self._emit("error", reply_id=reply_id, gen_id=gen_id, text=f"llm/tts: {exc}")
+
+    async def _synthesize(self, text: str, token: TTSCancelToken) -> Tuple[TTSResult, float, float]:
+        submitted = time.perf_counter()
+        async with self._tts_slots:
+            token.throw_if_cancelled()
+            start = time.perf_counter()
+            result = await self._loop.run_in_executor(
+                self.executors.tts,
+                functools.partial(self.tts.synthesize, text, voice=self.cfg.voice, cancel_token=token),
+            )
+        end = time.perf_counter()
+        return result, (end - start) * 1000.0, (end - submitted) * 1000.0
+
+    def _drain_segments(self) -> None:
+        while True:
+            try:
+                item = self._segments.get_nowait()
+            except (asyncio.QueueEmpty, AttributeError):
+                return
+            item.task.cancel()
+            self._release()
+
+    async def _playback_loop(self) -> None:
+        while True:
+            item = await self._segments.get()
+            try:
+                await self._play(item)
+            finally:
+                self._release()
+
+    async def _play(self, item: _PendingSegment) -> None:
+        if item.gen_id != self._gen_id:
+            item.task.cancel()
+            return
+        try:
+            result, tts_ms, wait_ms = await item.task
+        except (TTSCancelledError, asyncio.CancelledError):
+            if self._closing:
+                raise
+            return
+        except Exception as exc:
+            self._emit("tts_error", reply_id=item.reply_id, gen_id=item.gen_id, seg_idx=item.seg_idx, text=str(exc))
+            return
+        if item.gen_id != self._gen_id:
+            return
+        self._emit(
+            "tts_done",
+            reply_id=item.reply_id,
+            gen_id=item.gen_id,
+            seg_idx=item.seg_idx,
+            data={"tts_ms": tts_ms, "wait_ms": wait_ms, "worker": 0},
+        )
+        stats = self._turns.get(item.reply_id)
+        if stats is not None and stats.first_audio_ms is None:
+            stats.first_audio_ms = (time.perf_counter() - stats.ended_at) * 1000.0
+        self._emit("play_start", reply_id=item.reply_id, gen_id=item.gen_id, seg_idx=item.seg_idx)
+
+        gen_id = item.gen_id
+        meta = SegmentState(item.reply_id, item.seg_idx, tts_ms, len(item.text))
+
+        def should_stop() -> bool:
+            return self._closing or gen_id != self._gen_id
+
+        try:
+            awrite = getattr(self.sink, "awrite", None)
+            if awrite is not None:
+                await awrite(result, meta=meta, should_stop=should_stop, executor=self.executors.io)
+            else:
+                self._thread_write = True
+                try:
+                    await self._loop.run_in_executor(
+                        self.executors.io,
+                        functools.partial(self.sink.write, result, meta=meta, should_stop=should_stop),
+                    )
+                finally:
+                    self._thread_write = False
+                    if self._flush_pending:
+                        self._flush_pending = False
+                        self.sink.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self._emit("error", reply_id=item.reply_id, seg_idx=item.seg_idx, text=f"playback: {exc}")
+        self._report_completed()
+        if self._completed_watcher is None or self._completed_watcher.done():
+            self._completed_watcher = asyncio.create_task(self._watch_completed())
+
+    async def _watch_completed(self) -> None:
+        # 输出端还有音频在播时，按段落报告播完（只影响 play_done 事件的时间，不在数据通路上）
+        while True:
+            remaining = self.sink.pending_s()
+            self._report_completed()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, 0.05))
+
+    def _report_completed(self) -> None:
+        for seg in self.sink.pop_completed():
+            stats = self._turns.get(seg.reply_id)
+            if stats is not None:
+                stats.segments_played = max(stats.segments_played, seg.seg_idx)
+            self._emit(
+                "play_done",
+                reply_id=seg.reply_id,
+                seg_idx=seg.seg_idx,
+                data={"tts_ms": seg.tts_ms, "text_len": seg.text_len},
+            )
+
+    # ---------- stats / events ----------
+
+    def _record_turn(self, stats: TurnStats) -> None:
+        self._turns[stats.reply_id] = stats
+        while len(self._turns) > max(1, self.cfg.max_turn_stats):
+            self._turns.popitem(last=False)
+
+    def _emit(self, kind: str, **kwargs: Any) -> None:
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(PipelineEvent(kind=kind, **kwargs))
+        except Exception as exc:
+            logger.warning("pipeline event callback failed on %s: %s", kind, exc)
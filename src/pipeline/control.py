@@ -0,0 +1,90 @@
+# src/pipeline/control.py
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Generic, Optional, TypeVar
+
+from src.llm.base import CancelToken
+
+T = TypeVar("T")
+
+
+class LatestQueue(Generic[T]):
+    """
+    只保留最新的 maxsize 个元素：满了就丢掉最旧的（用户连续说话时只回答最后一句）。
+    """
+
+    def __init__(self, maxsize: int = 1) -> None:
+        self._q: "queue.Queue[T]" = queue.Queue(maxsize=maxsize)
+
+    def push(self, item: T) -> None:
+        while True:
+            try:
+                self._q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._q.get_nowait()
+                except queue.Empty:
+                    return
+
+    def pop(self, timeout: float = 0.2) -> Optional[T]:
+        try:
+            return self._q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def empty(self) -> bool:
+        return self._q.empty()
+
+    def clear(self) -> None:
+        while True:
+            try:
+                self._q.get_nowait()
+            except queue.Empty:
+                return
+
+
+class InterruptController:
+    """
+    当前这一轮 LLM 生成的 CancelToken：新一轮开始时取消旧的，打断时取消当前的。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._token: Optional[CancelToken] = None
+
+    def new_token(self) -> CancelToken:
+        with self._lock:
+            if self._token is not None:
+                self._token.cancel()
+            self._token = CancelToken()
+            return self._token
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._token is not None:
+                self._token.cancel()
+
+
+class GenerationCounter:
+    """
+    单调递增的 gen_id：每次打断 / 新一轮回复 +1，各阶段比较 gen_id 判断手上的数据是否过期。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def bump(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+    def get(self) -> int:
+        with self._lock:
+            return self._value
+
+    def is_current(self, gen_id: int) -> bool:
+        return gen_id == self.get()
@@ -0,0 +1,495 @@
+# src/pipeline/engine.py
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.llm.base import CancelledError, StopCondition
+from src.llm.context import ConversationStore
+from src.pipeline.control import GenerationCounter, InterruptController, LatestQueue
+from src.pipeline.sinks import AudioSink
+from src.pipeline.sources import Utterance, UtteranceSource
+from src.tts.base import TTSResult
+from src.tts.executor import TTSExecutor, TTSJobResult
+from src.tts.segmenter import TextSegmenter, TextSegmenterConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_PROMPT = "你扮演人工智能助手，说话符合角色风格，不要输出 markdown，不要输出多余格式，说话内容不要太长。"
+
+
+@dataclass
+class VoicePipelineConfig:
+    system_prompt: str = DEFAULT_SYSTEM_PROMPT
+    # 比这更短的录音当作噪声丢掉
+    min_utterance_s: float = field(
+        default_factory=lambda: float(os.environ.get("AI_CORE_PIPELINE_MIN_UTTERANCE_S", "1.0"))
+    )
+    # 并行合成的 worker 数；0 表示跟随后端的 pool_size（Genie 的 worker 进程数），没有时为 2
+    tts_workers: int = field(default_factory=lambda: int(os.environ.get("AI_CORE_TTS_WORKERS", "0")))
+    # 排队等待合成 / 等待播放的段落上限（满了阻塞上游，形成背压）
+    max_pending_segments: int = field(
+        default_factory=lambda: int(os.environ.get("AI_CORE_PIPELINE_MAX_SEGMENTS", "12"))
+    )
+    # 语音回复几句话就够了：满 N 句后解码循环直接停止
+    max_sentences: Optional[int] = 3
+    # 首段短（逗号处就切，尽快出声），后续段在句末切；10 秒还没切出新段就整段送出
+    segmenter: TextSegmenterConfig = field(default_factory=lambda: TextSegmenterConfig(max_wait_s=10))
+    voice: Optional[str] = None
+    # 保留最近多少轮的统计
+    max_turn_stats: int = 256
+    poll_s: float = 0.2
+
+
+@dataclass
+class PipelineEvent:
+    """
+    引擎对外的事件（打印日志、推给前端、统计），kind 取值：
+    asr / llm_start / llm_delta / segment / llm_done / llm_interrupted /
+    tts_done / tts_error / play_start / play_done / interrupt / error
+    """
+
+    kind: str
+    reply_id: int = 0
+    gen_id: int = 0
+    seg_idx: int = 0
+    text: str = ""
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+EventCallback = Callable[[PipelineEvent], None]
+
+
+@dataclass
+class SegmentState:
+    reply_id: int
+    seg_idx: int
+    tts_ms: float
+    text_len: int
+
+
+@dataclass
+class TurnStats:
+    """
+    一轮对话的耗时；first_audio_ms 从用户说完（Utterance.ended_at）算到第一段音频开始写入输出端。
+    """
+
+    reply_id: int
+    gen_id: int
+    user_text: str
+    asr_ms: float = 0.0
+    llm_first_token_ms: Optional[float] = None
+    llm_ms: Optional[float] = None
+    first_audio_ms: Optional[float] = None
+    segments: int = 0
+    segments_played: int = 0
+    interrupted: bool = False
+    reply_text: str = ""
+    # 用户说完的时刻（perf_counter）
+    ended_at: float = field(default=0.0, repr=False)
+
+
+@dataclass
+class _UserTurn:
+    utterance: Utterance
+    text: str
+    asr_ms: float
+
+
+@dataclass
+class _AudioItem:
+    gen_id: int
+    reply_id: int
+    seg_idx: int
+    result: TTSResult
+    tts_ms: float
+    text_len: int
+
+
+class VoicePipeline:
+    """
+    一个语音会话：UtteranceSource -> ASR -> LLM（流式）-> TextSegmenter -> TTSExecutor -> AudioSink。
+
+        pipeline = VoicePipeline(asr, llm, tts, MicrophoneSource(), SpeakerSink(), on_event=print_event)
+        pipeline.start()
+        ...
+        pipeline.stop()
+
+    - 每个阶段一个线程，阶段之间是有界队列；gen_id 每次打断 / 新一轮回复 +1，过期的段落在每个阶段丢弃
+    - source 检测到用户开口时（或调用 barge_in()）打断：取消 LLM、清空合成队列、输出端淡出
+    - asr / llm / tts 可以在多个会话之间共享，会话自己的状态（历史、队列、gen_id）都在实例里，
+      一个进程可以跑很多个会话（配合 ScriptedSource / NullSink 做无头压测）
+    """
+
+    def __init__(
+        self,
+        asr: Any,
+        llm: Any,
+        tts: Any,
+        source: Optional[UtteranceSource],
+        sink: AudioSink,
+        cfg: Optional[VoicePipelineConfig] = None,
+        *,
+        on_event: Optional[EventCallback] = None,
+        conversation: Optional[ConversationStore] = None,
+        name: str = "pipeline",
+    ) -> None:
+        self.asr = asr
+        self.llm = llm
+        self.tts = tts
+        self.source = source
+        self.sink = sink
+        self.cfg = cfg or VoicePipelineConfig()
+        self.on_event = on_event
+        self.name = name
+        # 按 token 预算管理历史（AI_CORE_LLM_CONTEXT_TOKENS），system prompt 固定在最前面
+        self.conversation = conversation or ConversationStore.for_llm(llm, self.cfg.system_prompt)
+        self.reply_stop = StopCondition(max_sentences=self.cfg.max_sentences) if self.cfg.max_sentences else None
+
+        self._stop = threading.Event()
+        self._source_done = threading.Event()
+        self._playback_reset = threading.Event()
+        self._user_q: LatestQueue[_UserTurn] = LatestQueue()
+        self._audio_q: "queue.Queue[_AudioItem]" = queue.Queue(maxsize=max(1, self.cfg.max_pending_segments))
+        self._interrupt = InterruptController()
+        self._gen = GenerationCounter()
+        self._reply_counter = 0
+        self._replying = False
+
+        self._state_lock = threading.Lock()
+        # 当前这一代还没合成完的段落数（判断会话是否空闲）
+        self._inflight_gen = 0
+        self._inflight = 0
+        self._turns: "OrderedDict[int, TurnStats]" = OrderedDict()
+
+        workers = self.cfg.tts_workers or int(getattr(getattr(tts, "cfg", None), "pool_size", 0) or 2)
+        self.tts_executor = TTSExecutor(
+            [tts] * max(1, workers),
+            on_ready=self._on_tts_ready,
+            max_pending=self.cfg.max_pending_segments,
+        )
+        self._threads: List[threading.Thread] = []
+        if source is not None:
+            source.on_speech_start = self.barge_in
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> "VoicePipeline":
+        if self._threads:
+            return self
+        self.tts_executor.start()
+        stages: List[Tuple[str, Callable[[], None]]] = [("reply", self._reply_loop), ("playback", self._playback_loop)]
+        if self.source is not None:
+            stages.insert(0, ("listen", self._listen_loop))
+        else:
+            self._source_done.set()
+        for stage, target in stages:
+            t = threading.Thread(target=target, name=f"{self.name}-{stage}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        self._interrupt.cancel()
+        if self.source is not None:
+            self.source.close()
+        self.tts_executor.close()
+        for t in self._threads:
+            # 麦克风的 listen() 没法中途退出，daemon 线程随进程结束
+            if t.name.endswith("-listen"):
+                continue
+            t.join(timeout=timeout)
+        self._threads.clear()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop.is_set()
+
+    def idle(self) -> bool:
+        """
+        输入已经处理完，没有正在生成 / 合成 / 播放的回复。
+        """
+        with self._state_lock:
+            inflight = self._inflight if self._inflight_gen == self._gen.get() else 0
+            replying = self._replying
+        return (
+            self._user_q.empty()
+            and not replying
+            and inflight == 0
+            and self._audio_q.empty()
+            and self.sink.idle()
+        )
+
+    def wait(self, timeout: Optional[float] = None, settle_s: float = 0.05) -> bool:
+        """
+        等 source 结束并且会话空闲（无头运行 / 压测用）；超时返回 False。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop.is_set():
+            # 连续两次检查都空闲才算：阶段之间交接的瞬间可能两边都看不到数据
+            if self._source_done.is_set() and self.idle():
+                time.sleep(settle_s)
+                if self.idle():
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(settle_s)
+        return self.idle()
+
+    # ---------- control ----------
+
+    def submit_text(self, text: str, *, asr_ms: float = 0.0) -> None:
+        """
+        直接提交一句用户输入（跳过 source 和 ASR），和用户开口一样先打断上一轮回复。
+        """
+        self.barge_in()
+        self._push_user(Utterance(text=text), text, asr_ms)
+
+    def barge_in(self) -> int:
+        """
+        打断：取消 LLM、丢掉排队 / 正在合成的段落、输出端淡出。返回新的 gen_id。
+        """
+        # 还有没说完的回复时记为被打断（用户正常接话时回复已经播完）
+        busy = not self.idle()
+        self._interrupt.cancel()
+        gen_id = self._gen.bump()
+        self.tts_executor.interrupt(gen_id)
+        self._clear_audio_queue()
+        self._playback_reset.set()
+        if busy:
+            with self._state_lock:
+                if self._turns:
+                    next(reversed(self._turns.values())).interrupted = True
+        self._emit("interrupt", gen_id=gen_id)
+        return gen_id
+
+    def turn_stats(self) -> List[TurnStats]:
+        with self._state_lock:
+            return list(self._turns.values())
+
+    # ---------- stages ----------
+
+    def _listen_loop(self) -> None:
+        assert self.source is not None
+        while not self._stop.is_set():
+            try:
+                utt = self.source.listen()
+            except Exception as exc:
+                self._emit("error", text=f"source: {exc}")
+                break
+            if utt is None:
+                break
+            if utt.text is not None:
+                text, asr_ms = utt.text.strip(), 0.0
+            else:
+                if utt.duration_s < self.cfg.min_utterance_s:
+                    continue
+                try:
+                    text, asr_ms, res = self._transcribe(utt)
+                except Exception as exc:
+                    self._emit("error", text=f"asr: {exc}")
+                    continue
+                if text:
+                    self._emit(
+                        "asr",
+                        text=text,
+                        data={"asr_ms": asr_ms, "lang": res.lang, "backend": res.backend or self.asr.__class__.__name__},
+                    )
+            if not text:
+                continue
+            self._interrupt.cancel()
+            self._push_user(utt, text, asr_ms)
+        self._source_done.set()
+
+    def _transcribe(self, utt: Utterance):
+        if self.asr is None:
+            raise RuntimeError("pipeline has no ASR backend for audio input")
+        start = time.perf_counter()
+        res = self.asr.transcribe(utt.audio, sample_rate=utt.sample_rate)
+        return (res.text or "").strip(), (time.perf_counter() - start) * 1000.0, res
+
+    def _push_user(self, utt: Utterance, text: str, asr_ms: float) -> None:
+        self._user_q.push(_UserTurn(utterance=utt, text=text, asr_ms=asr_ms))
+
+    def _reply_loop(self) -> None:
+        while not self._stop.is_set():
+            turn = self._user_q.pop(timeout=self.cfg.poll_s)
+            if turn is None:
+                continue
+            with self._state_lock:
+                self._replying = True
+            try:
+                self._reply(turn)
+            finally:
+                with self._state_lock:
+                    self._replying = False
+
+    def _reply(self, turn: _UserTurn) -> None:
+        history = self.conversation.add_user(turn.text)
+        token = self._interrupt.new_token()
+        gen_id = self._gen.bump()
+        self._reply_counter += 1
+        reply_id = self._reply_counter
+        stats = TurnStats(
+            reply_id=reply_id, gen_id=gen_id, user_text=turn.text, asr_ms=turn.asr_ms,
+            ended_at=turn.utterance.ended_at,
+        )
+        self._record_turn(stats)
+        self._emit("llm_start", reply_id=reply_id, gen_id=gen_id, text=turn.text)
+
+        seg_idx = 0
+        parts: List[str] = []
+        segmenter = TextSegmenter(self.cfg.segmenter)
+        llm_start = time.perf_counter()
+
+        def emit_segment(segment: str) -> None:
+            nonlocal seg_idx
+            seg_idx += 1
+            with self._state_lock:
+                stats.segments = seg_idx
+                if self._inflight_gen != gen_id:
+                    self._inflight_gen, self._inflight = gen_id, 0
+                self._inflight += 1
+            self._emit("segment", reply_id=reply_id, gen_id=gen_id, seg_idx=seg_idx, text=segment)
+            # 队列满时阻塞 LLM 线程（背压）；丢段会让后面的段落一直等不到顺序
+            self.tts_executor.submit(gen_id, seg_idx, segment, voice=self.cfg.voice, meta=reply_id)
+
+        try:
+            for ch in self.llm.stream(history, cancel_token=token, stop=self.reply_stop):
+                if ch.text_delta:
+                    if stats.llm_first_token_ms is None:
+                        stats.llm_first_token_ms = (time.perf_counter() - llm_start) * 1000.0
+                    parts.append(ch.text_delta)
+                    self._emit("llm_delta", reply_id=reply_id, gen_id=gen_id, text=ch.text_delta)
+                    for segment in segmenter.push(ch.text_delta):
+                        emit_segment(segment)
+                if ch.is_final:
+                    break
+            stats.llm_ms = (time.perf_counter() - llm_start) * 1000.0
+
+            reply_text = "".join(parts).strip()
+            stats.reply_text = reply_text
+            if not reply_text:
+                self._emit("llm_done", reply_id=reply_id, gen_id=gen_id, data={"llm_ms": stats.llm_ms})
+                return
+            for segment in segmenter.flush():
+                emit_segment(segment)
+            self.conversation.add_assistant(reply_text)
+            self._emit("llm_done", reply_id=reply_id, gen_id=gen_id, text=reply_text, data={"llm_ms": stats.llm_ms})
+        except CancelledError:
+            stats.interrupted = True
+            self._emit("llm_interrupted", reply_id=reply_id, gen_id=gen_id)
+        except Exception as exc:
+            self._emit("error", reply_id=reply_id, gen_id=gen_id, text=f"llm/tts: {exc}")
+
+    def _on_tts_ready(self, out: TTSJobResult) -> None:
+        # executor 已经按 seg_idx 顺序放行，这里只需转给播放线程
+        job = out.job
+        reply_id = job.meta
+        with self._state_lock:
+            if self._inflight_gen == job.gen_id:
+                self._inflight = max(0, self._inflight - 1)
+        if out.error is not None or out.result is None:
+            self._emit("tts_error", reply_id=reply_id, gen_id=job.gen_id, seg_idx=job.seg_idx, text=str(out.error))
+            return
+        if not self._gen.is_current(job.gen_id):
+            return
+        self._emit(
+            "tts_done",
+            reply_id=reply_id,
+            gen_id=job.gen_id,
+            seg_idx=job.seg_idx,
+            data={"tts_ms": out.tts_ms, "wait_ms": out.wait_ms, "worker": out.worker},
+        )
+        item = _AudioItem(job.gen_id, reply_id, job.seg_idx, out.result, out.tts_ms, len(job.text))
+        while not self._stop.is_set() and self._gen.is_current(job.gen_id):
+            try:
+                self._audio_q.put(item, timeout=self.cfg.poll_s)
+                return
+            except queue.Full:
+                continue
+
+    def _clear_audio_queue(self) -> None:
+        while True:
+            try:
+                self._audio_q.get_nowait()
+            except queue.Empty:
+                return
+
+    def _playback_loop(self) -> None:
+        sink = self.sink
+
+        def should_stop() -> bool:
+            return self._stop.is_set() or self._playback_reset.is_set()
+
+        try:
+            while not self._stop.is_set():
+                if self._playback_reset.is_set():
+                    # flush 必须在写入线程调用（单生产者）
+                    sink.flush()
+                    self._playback_reset.clear()
+                try:
+                    item = self._audio_q.get(timeout=self.cfg.poll_s)
+                except queue.Empty:
+                    self._report_completed()
+                    continue
+                if not self._gen.is_current(item.gen_id):
+                    continue
+                self._mark_first_audio(item.reply_id)
+                self._emit("play_start", reply_id=item.reply_id, gen_id=item.gen_id, seg_idx=item.seg_idx)
+                try:
+                    sink.write(
+                        item.result,
+                        meta=SegmentState(item.reply_id, item.seg_idx, item.tts_ms, item.text_len),
+                        should_stop=should_stop,
+                    )
+                except Exception as exc:
+                    self._emit("error", reply_id=item.reply_id, seg_idx=item.seg_idx, text=f"playback: {exc}")
+                self._report_completed()
+        finally:
+            try:
+                sink.close()
+            except Exception as exc:
+                logger.warning("failed to close audio sink: %s", exc)
+
+    def _report_completed(self) -> None:
+        for seg in self.sink.pop_completed():
+            with self._state_lock:
+                stats = self._turns.get(seg.reply_id)
+                if stats is not None:
+                    stats.segments_played = max(stats.segments_played, seg.seg_idx)
+            self._emit(
+                "play_done",
+                reply_id=seg.reply_id,
+                seg_idx=seg.seg_idx,
+                data={"tts_ms": seg.tts_ms, "text_len": seg.text_len},
+            )
+
+    # ---------- stats / events ----------
+
+    def _record_turn(self, stats: TurnStats) -> None:
+        with self._state_lock:
+            self._turns[stats.reply_id] = stats
+            while len(self._turns) > max(1, self.cfg.max_turn_stats):
+                self._turns.popitem(last=False)
+
+    def _mark_first_audio(self, reply_id: int) -> None:
+        with self._state_lock:
+            stats = self._turns.get(reply_id)
+            if stats is not None and stats.first_audio_ms is None:
+                stats.first_audio_ms = (time.perf_counter() - stats.ended_at) * 1000.0
+
+    def _emit(self, kind: str, **kwargs: Any) -> None:
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(PipelineEvent(kind=kind, **kwargs))
+        except Exception as exc:
+            logger.warning("pipeline event callback failed on %s: %s", kind, exc)
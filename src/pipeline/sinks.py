@@ -0,0 +1,347 @@
+# src/pipeline/sinks.py
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+import inspect
+import os
+from pathlib import Path
+import time
+from typing import Any, Callable, Deque, List, Optional, Protocol, Tuple
+
+import numpy as np
+
+from src.audio import PlaybackRing, encode_audio, iter_encode_audio, resample
+from src.tts.base import TTSResult
+
+StopCheck = Callable[[], bool]
+
+
+def _pcm_at(result: TTSResult, sample_rate: int) -> np.ndarray:
+    # 解码 + 重采样：异步路径里放到线程池执行，不占事件循环
+    pcm = result.as_pcm()
+    if sample_rate != result.sample_rate:
+        pcm = resample(pcm, result.sample_rate, sample_rate)
+    return pcm
+
+
+class AudioSink(Protocol):
+    """
+    引擎的输出端，所有方法都只在播放线程里调用（单生产者）。
+    - write：写入一段合成好的音频，可以阻塞（输出端满了就是背压）；should_stop() 为真时放弃并返回 False
+    - flush：打断，丢掉还没播放的音频
+    - pop_completed：已经播放完的段落的 meta
+    - idle：没有正在播放 / 等待播放的音频；pending_s：还要多久播完
+    异步引擎优先调用 awrite(result, meta, should_stop, executor)，解码 / 重采样 / 编码交给 executor，
+    事件循环上只留 await；没有 awrite 时把 write 整个放到线程池里执行。
+    """
+
+    def write(self, result: TTSResult, meta: Any = None, should_stop: Optional[StopCheck] = None) -> bool:
+        ...
+
+    def flush(self) -> None:
+        ...
+
+    def pop_completed(self) -> List[Any]:
+        ...
+
+    def idle(self) -> bool:
+        ...
+
+    def pending_s(self) -> float:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class SpeakerSink:
+    """
+    声卡播放：输出流只打开一次（采样率取 sample_rate、AI_CORE_PLAYBACK_RATE 或第一段音频的采样率），
+    其他采样率的段落写入 PlaybackRing 前重采样。
+    """
+
+    def __init__(
+        self,
+        sample_rate: Optional[int] = None,
+        *,
+        seconds: float = 30.0,
+        fade_ms: float = 20.0,
+        device: Optional[int] = None,
+    ) -> None:
+        self.sample_rate = sample_rate or int(os.environ.get("AI_CORE_PLAYBACK_RATE", "0")) or None
+        self.seconds = seconds
+        self.fade_ms = fade_ms
+        self.device = device
+        self.ring: Optional[PlaybackRing] = None
+        self._stream = None
+
+    def _open(self, sample_rate: int) -> PlaybackRing:
+        try:
+            import sounddevice as sd
+        except ImportError as exc:
+            raise ImportError("SpeakerSink requires sounddevice. Please run: pip install sounddevice") from exc
+
+        ring = PlaybackRing(self.sample_rate or sample_rate, seconds=self.seconds, fade_ms=self.fade_ms)
+        self._stream = sd.OutputStream(
+            samplerate=ring.sample_rate,
+            channels=ring.channels,
+            dtype="float32",
+            device=self.device,
+            callback=ring.callback,
+        )
+        self._stream.start()
+        self.ring = ring
+        return ring
+
+    def write(self, result: TTSResult, meta: Any = None, should_stop: Optional[StopCheck] = None) -> bool:
+        ring = self.ring or self._open(result.sample_rate)
+        return ring.write_all(result.as_pcm(), src_rate=result.sample_rate, meta=meta, should_stop=should_stop)
+
+    async def awrite(
+        self,
+        result: TTSResult,
+        meta: Any = None,
+        should_stop: Optional[StopCheck] = None,
+        executor: Optional[Executor] = None,
+        poll_s: float = 0.005,
+    ) -> bool:
+        ring = self.ring or self._open(result.sample_rate)
+        loop = asyncio.get_running_loop()
+        samples = await loop.run_in_executor(executor, _pcm_at, result, ring.sample_rate)
+        offset = 0
+        while offset < len(samples):
+            if should_stop is not None and should_stop():
+                return False
+            written = ring.write(samples[offset:])
+            offset += written
+            if offset < len(samples):
+                # 缓冲区满：按回调读走的速度等，期间事件循环可以处理别的会话
+                await asyncio.sleep(min(0.05, max(poll_s, (len(samples) - offset) / ring.sample_rate / 4)))
+        if meta is not None:
+            ring.mark_segment(meta)
+        return True
+
+    def flush(self) -> None:
+        if self.ring is not None:
+            self.ring.flush()
+
+    def pop_completed(self) -> List[Any]:
+        return self.ring.pop_completed() if self.ring is not None else []
+
+    def idle(self) -> bool:
+        return self.ring is None or self.ring.buffered() <= 0
+
+    def pending_s(self) -> float:
+        return 0.0 if self.ring is None else max(0, self.ring.buffered()) / float(self.ring.sample_rate)
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class NullSink:
+    """
+    假声卡：不输出声音，但按音频时长推进一个虚拟播放头，段落“播完”的时间和真实播放一致。
+    buffer_s 相当于声卡缓冲区的长度，超过时 write 阻塞（和 PlaybackRing 一样的背压）。
+    realtime=False 时写入即播完（只测吞吐）。
+    """
+
+    def __init__(self, *, realtime: bool = True, buffer_s: float = 30.0, poll_s: float = 0.005) -> None:
+        self.realtime = realtime
+        self.buffer_s = float(buffer_s)
+        self.poll_s = poll_s
+        self.seconds_written = 0.0
+        self._play_end = 0.0
+        self._segments: Deque[Tuple[float, Any]] = deque()
+
+    def _wait_s(self, duration: float, now: float) -> float:
+        # 缓冲区装不下时要等播放头往前走多久；比缓冲区还长的段落等缓冲区空了再写
+        if not self.realtime or self._play_end <= now:
+            return 0.0
+        return max(0.0, self._play_end - now + duration - self.buffer_s)
+
+    def _commit(self, duration: float, meta: Any) -> None:
+        now = time.monotonic()
+        self._play_end = max(now, self._play_end) + duration if self.realtime else now
+        self.seconds_written += duration
+        if meta is not None:
+            self._segments.append((self._play_end, meta))
+
+    def write(self, result: TTSResult, meta: Any = None, should_stop: Optional[StopCheck] = None) -> bool:
+        duration = len(result.as_pcm()) / float(result.sample_rate)
+        while self._wait_s(duration, time.monotonic()) > 0:
+            if should_stop is not None and should_stop():
+                return False
+            time.sleep(self.poll_s)
+        self._commit(duration, meta)
+        return True
+
+    async def awrite(
+        self,
+        result: TTSResult,
+        meta: Any = None,
+        should_stop: Optional[StopCheck] = None,
+        executor: Optional[Executor] = None,
+    ) -> bool:
+        pcm = await asyncio.get_running_loop().run_in_executor(executor, result.as_pcm)
+        duration = len(pcm) / float(result.sample_rate)
+        while True:
+            wait = self._wait_s(duration, time.monotonic())
+            if wait <= 0:
+                break
+            if should_stop is not None and should_stop():
+                return False
+            # 虚拟时钟：直接睡到缓冲区有空位（最多 50 ms 检查一次打断）
+            await asyncio.sleep(min(wait, 0.05))
+        self._commit(duration, meta)
+        return True
+
+    def flush(self) -> None:
+        self._play_end = min(self._play_end, time.monotonic())
+        self._segments.clear()
+
+    def pop_completed(self) -> List[Any]:
+        now = time.monotonic()
+        done: List[Any] = []
+        while self._segments and self._segments[0][0] <= now:
+            done.append(self._segments.popleft()[1])
+        return done
+
+    def idle(self) -> bool:
+        return self._play_end <= time.monotonic()
+
+    def pending_s(self) -> float:
+        return max(0.0, self._play_end - time.monotonic())
+
+    def close(self) -> None:
+        return None
+
+
+class FileSink:
+    """
+    把所有写入的段落拼成一个 WAV 文件（close 时写出）；采样率取 sample_rate 或第一段音频的采样率。
+    打断不会删除已经写入的音频：文件记录的是合成出来的全部内容。
+    """
+
+    def __init__(self, path: str, sample_rate: Optional[int] = None) -> None:
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self._chunks: List[np.ndarray] = []
+        self._completed: List[Any] = []
+
+    def write(self, result: TTSResult, meta: Any = None, should_stop: Optional[StopCheck] = None) -> bool:
+        pcm = result.as_pcm()
+        if self.sample_rate is None:
+            self.sample_rate = result.sample_rate
+        if result.sample_rate != self.sample_rate:
+            pcm = resample(pcm, result.sample_rate, self.sample_rate)
+        self._chunks.append(np.asarray(pcm, dtype=np.float32))
+        if meta is not None:
+            self._completed.append(meta)
+        return True
+
+    def flush(self) -> None:
+        return None
+
+    def pop_completed(self) -> List[Any]:
+        done, self._completed = self._completed, []
+        return done
+
+    def idle(self) -> bool:
+        return True
+
+    def pending_s(self) -> float:
+        return 0.0
+
+    def close(self) -> None:
+        if not self._chunks or self.sample_rate is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        audio = np.concatenate(self._chunks)
+        self.path.write_bytes(encode_audio(audio, self.sample_rate, "wav"))
+        self._chunks.clear()
+
+
+class WebSocketSink:
+    """
+    把音频按块编码后交给 send（WebSocket 的二进制消息），客户端负责播放：
+        loop = asyncio.get_running_loop()
+        sink = WebSocketSink(lambda b: asyncio.run_coroutine_threadsafe(ws.send_bytes(b), loop).result())
+    send 在播放线程里调用，阻塞到发送完成即形成背压。打断时调用 on_flush（比如发一条控制消息让客户端清空缓冲）。
+    异步引擎里可以直接传协程函数：WebSocketSink(ws.send_bytes)，awrite 会 await 它。
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], Any],
+        *,
+        fmt: str = "pcm_s16le",
+        sample_rate: Optional[int] = None,
+        on_flush: Optional[Callable[[], Any]] = None,
+        block_frames: int = 4096,
+    ) -> None:
+        self.send = send
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.on_flush = on_flush
+        self.block_frames = block_frames
+        self._completed: List[Any] = []
+
+    def write(self, result: TTSResult, meta: Any = None, should_stop: Optional[StopCheck] = None) -> bool:
+        sample_rate = self.sample_rate or result.sample_rate
+        pcm = _pcm_at(result, sample_rate)
+        for chunk in iter_encode_audio(pcm, sample_rate, self.fmt, block_frames=self.block_frames):
+            if should_stop is not None and should_stop():
+                return False
+            self.send(chunk)
+        if meta is not None:
+            self._completed.append(meta)
+        return True
+
+    async def awrite(
+        self,
+        result: TTSResult,
+        meta: Any = None,
+        should_stop: Optional[StopCheck] = None,
+        executor: Optional[Executor] = None,
+    ) -> bool:
+        loop = asyncio.get_running_loop()
+        sample_rate = self.sample_rate or result.sample_rate
+        pcm = await loop.run_in_executor(executor, _pcm_at, result, sample_rate)
+        # 编码器按块惰性产出：每块在线程池里编码，块之间检查打断，发送在事件循环上 await
+        chunks = iter_encode_audio(pcm, sample_rate, self.fmt, block_frames=self.block_frames)
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            if should_stop is not None and should_stop():
+                return False
+            sent = self.send(chunk)
+            if inspect.isawaitable(sent):
+                await sent
+        if meta is not None:
+            self._completed.append(meta)
+        return True
+
+    def flush(self) -> None:
+        if self.on_flush is not None:
+            sent = self.on_flush()
+            if inspect.isawaitable(sent):
+                asyncio.ensure_future(sent)
+
+    def pop_completed(self) -> List[Any]:
+        done, self._completed = self._completed, []
+        return done
+
+    def idle(self) -> bool:
+        return True
+
+    def pending_s(self) -> float:
+        return 0.0
+
+    def close(self) -> None:
+        return None
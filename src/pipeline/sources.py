@@ -0,0 +1,165 @@
+# src/pipeline/sources.py
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field, replace
+import inspect
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional, Protocol, Union
+
+import numpy as np
+
+
+@dataclass
+class Utterance:
+    """
+    一句完整的用户输入：录到的音频（需要 ASR），或者直接给出的文本（跳过 ASR，压测 / 文本输入用）。
+    """
+
+    audio: Optional[np.ndarray] = None
+    sample_rate: int = 16000
+    text: Optional[str] = None
+    # 说完的时刻（VAD 判定结束），首音频延迟从这里算起
+    ended_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def duration_s(self) -> float:
+        if self.audio is None:
+            return 0.0
+        return len(self.audio) / float(self.sample_rate)
+
+
+SpeechStartCallback = Callable[[], None]
+
+
+class UtteranceSource(Protocol):
+    """
+    引擎的输入端。listen() 阻塞到下一句说完，返回 None 表示输入结束；
+    检测到用户开口时调用 on_speech_start（引擎借此打断正在播放的回复）。
+    异步引擎优先调用 alisten()，没有时把 listen() 放到线程池里。
+    """
+
+    on_speech_start: Optional[SpeechStartCallback]
+
+    def listen(self) -> Optional[Utterance]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class MicrophoneSource:
+    """
+    麦克风 + WebRTC VAD 切句（src.recorder.Recorder）。
+    """
+
+    def __init__(self, cfg: Optional[Any] = None) -> None:
+        from src.recorder import Recorder, RecorderConfig
+
+        cfg = cfg or RecorderConfig()
+        self.on_speech_start: Optional[SpeechStartCallback] = None
+        # 用户配置里的回调保留，引擎的打断回调在它之后调用
+        self._user_callback = cfg.segmenter.on_speech_start
+        segmenter = replace(cfg.segmenter, on_speech_start=self._speech_start)
+        self.recorder = Recorder(replace(cfg, enable_segmenter=True, segmenter=segmenter))
+
+    @property
+    def sample_rate(self) -> int:
+        return self.recorder.sample_rate
+
+    def _speech_start(self) -> None:
+        if self._user_callback is not None:
+            self._user_callback()
+        if self.on_speech_start is not None:
+            self.on_speech_start()
+
+    def listen(self) -> Optional[Utterance]:
+        audio = self.recorder.listen()
+        return Utterance(audio=audio, sample_rate=self.sample_rate)
+
+    def close(self) -> None:
+        # 录音流由 frame_generator 管理，daemon 线程随进程退出
+        return None
+
+
+ScriptItem = Union[str, np.ndarray, Utterance]
+
+
+class ScriptedSource:
+    """
+    无声卡的输入端：按顺序产出预先给定的文本 / 音频，用于无头运行和多会话压测。
+    - interval_s：每句之间的间隔（模拟用户思考 / 说话的时间）
+    - 每句开始时同样触发 on_speech_start，和真实 VAD 一样会打断上一轮还在播放的回复
+    - wait_idle 不为空时，先等它返回 True（比如上一轮播放完）再开始下一句；
+      alisten() 里 wait_idle 也可以是协程函数（AsyncVoicePipeline.wait_idle），直接 await，不轮询
+    """
+
+    def __init__(
+        self,
+        items: Iterable[ScriptItem],
+        *,
+        interval_s: float = 0.0,
+        sample_rate: int = 16000,
+        wait_idle: Optional[Callable[[], Any]] = None,
+        idle_timeout_s: float = 60.0,
+    ) -> None:
+        self._items: List[ScriptItem] = list(items)
+        self.interval_s = max(0.0, float(interval_s))
+        self.sample_rate = int(sample_rate)
+        self.wait_idle = wait_idle
+        self.idle_timeout_s = float(idle_timeout_s)
+        self.on_speech_start: Optional[SpeechStartCallback] = None
+        self._pos = 0
+        self._closed = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def listen(self) -> Optional[Utterance]:
+        if self._pos >= len(self._items) or self._closed.is_set():
+            return None
+        if self.wait_idle is not None:
+            deadline = time.monotonic() + self.idle_timeout_s
+            while not self.wait_idle() and time.monotonic() < deadline:
+                if self._closed.wait(0.01):
+                    return None
+        if self.interval_s and self._closed.wait(self.interval_s):
+            return None
+
+        return self._next()
+
+    async def alisten(self) -> Optional[Utterance]:
+        if self._pos >= len(self._items) or self._closed.is_set():
+            return None
+        if self.wait_idle is not None:
+            ready = self.wait_idle()
+            if inspect.isawaitable(ready):
+                try:
+                    await asyncio.wait_for(ready, self.idle_timeout_s)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                deadline = time.monotonic() + self.idle_timeout_s
+                while not ready and time.monotonic() < deadline:
+                    await asyncio.sleep(0.01)
+                    ready = self.wait_idle()
+        if self.interval_s:
+            await asyncio.sleep(self.interval_s)
+        if self._closed.is_set():
+            return None
+        return self._next()
+
+    def _next(self) -> Utterance:
+        item = self._items[self._pos]
+        self._pos += 1
+        if self.on_speech_start is not None:
+            self.on_speech_start()
+        if isinstance(item, Utterance):
+            return replace(item, ended_at=time.perf_counter())
+        if isinstance(item, str):
+            return Utterance(text=item, sample_rate=self.sample_rate)
+        return Utterance(audio=np.asarray(item, dtype=np.float32), sample_rate=self.sample_rate)
+
+    def close(self) -> None:
+        self._closed.set()
@@ -24,4 +24,9 @@ class GPTSovitsRemoteConfig:
     prompt_text: str = field(default_factory=lambda: os.environ.get("GPT_SOVITS_PROMPT_TEXT", ""))
     text_split_method: str = field(default_factory=lambda: os.environ.get("GPT_SOVITS_TEXT_SPLIT_METHOD", "cut5"))
     batch_size: int = field(default_factory=lambda: int(os.environ.get("GPT_SOVITS_BATCH_SIZE", "1")))
+    # synthesize_batch：一次请求最多带几段文本（服务端按 batch 并行推理），段与段之间插入的静音长度（秒）
+    max_batch_texts: int = field(default_factory=lambda: int(os.environ.get("GPT_SOVITS_MAX_BATCH_TEXTS", "8")))
+    batch_fragment_interval: float = field(
+        default_factory=lambda: float(os.environ.get("GPT_SOVITS_BATCH_FRAGMENT_INTERVAL", "0.3"))
+    )
     speed_factor: float = field(default_factory=lambda: float(os.environ.get("GPT_SOVITS_SPEED_FACTOR", "1.0")))
@@ -2,15 +2,20 @@ from __future__ import annotations
 
 import io
 import json
+import logging
 import ssl
 import urllib.error
 import urllib.request
 import wave
-from typing import Optional
+from typing import List, Optional, Sequence
+
+import numpy as np
 
 from src.tts.base import CancelToken, CancelledError, TTSResult
 from src.tts.GPT_Sovits_tts.config import GPTSovitsRemoteConfig
 
+logger = logging.getLogger(__name__)
+
 
 class GPTSovitsRemoteTTS:
     def __init__(self, cfg: GPTSovitsRemoteConfig):
@@ -29,6 +34,71 @@ class GPTSovitsRemoteTTS:
         if not text.strip():
             raise ValueError("text cannot be empty")
 
+        audio_bytes = self._post(self._payload(text))
+
+        if cancel_token is not None and cancel_token.is_cancelled():
+            raise CancelledError()
+
+        detected_sr = self._parse_wav_sample_rate(audio_bytes)
+        return self._result(audio_bytes, sample_rate or detected_sr)
+
+    def synthesize_batch(
+        self,
+        texts: Sequence[str],
+        *,
+        voice: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> List[TTSResult]:
+        """
+        多段文本合成一个请求：api_v2 总是在换行处切分片段，cut0 不再按标点切，
+        片段按 batch_size 在服务端并行推理，返回的音频里片段之间是 fragment_interval 秒的全零静音，
+        按静音切回每段。切出来的段数对不上时退回逐条请求。
+        """
+        items = [" ".join(t.split()) for t in texts]
+        if any(not t for t in items):
+            raise ValueError("text cannot be empty")
+        out: List[TTSResult] = []
+        step = max(1, int(self.cfg.max_batch_texts))
+        for start in range(0, len(items), step):
+            if cancel_token is not None and cancel_token.is_cancelled():
+                raise CancelledError()
+            out.extend(self._synthesize_group(items[start : start + step], sample_rate, cancel_token))
+        return out
+
+    def _synthesize_group(
+        self,
+        texts: List[str],
+        sample_rate: Optional[int],
+        cancel_token: Optional[CancelToken],
+    ) -> List[TTSResult]:
+        if len(texts) == 1:
+            return [self.synthesize(texts[0], sample_rate=sample_rate, cancel_token=cancel_token)]
+
+        payload = self._payload("\n".join(texts))
+        payload.update(
+            {
+                "text_split_method": "cut0",
+                "batch_size": max(int(self.cfg.batch_size), len(texts)),
+                "parallel_infer": True,
+                "split_bucket": True,
+                "fragment_interval": self.cfg.batch_fragment_interval,
+            }
+        )
+        audio_bytes = self._post(payload)
+        if cancel_token is not None and cancel_token.is_cancelled():
+            raise CancelledError()
+
+        pieces = _split_fragments(audio_bytes, len(texts), self.cfg.batch_fragment_interval)
+        if pieces is None:
+            logger.warning(
+                "GPT-SoVITS batch of %d texts could not be split; falling back to one request per text",
+                len(texts),
+            )
+            return [self.synthesize(t, sample_rate=sample_rate, cancel_token=cancel_token) for t in texts]
+        return [self._result(wav, sample_rate or sr) for wav, sr in pieces]
+
+    def _payload(self, text: str) -> dict:
         payload = {
             "text": text,
             "text_lang": self.cfg.text_lang,
@@ -42,7 +112,9 @@ class GPTSovitsRemoteTTS:
         }
         if self.cfg.ref_audio_path:
             payload["ref_audio_path"] = self.cfg.ref_audio_path
+        return payload
 
+    def _post(self, payload: dict) -> bytes:
         body = json.dumps(payload).encode("utf-8")
         req = urllib.request.Request(
             self.cfg.endpoint,
@@ -60,20 +132,17 @@ class GPTSovitsRemoteTTS:
 
         try:
             resp = urllib.request.urlopen(req, timeout=self.cfg.timeout_s, context=ssl_ctx)
-            audio_bytes = resp.read()
+            return resp.read()
         except urllib.error.HTTPError as exc:
             detail = exc.read().decode("utf-8", errors="ignore")
             raise RuntimeError(f"GPT-SoVITS HTTP {exc.code}: {detail}") from exc
         except urllib.error.URLError as exc:
             raise RuntimeError(f"GPT-SoVITS request failed: {exc}") from exc
 
-        if cancel_token is not None and cancel_token.is_cancelled():
-            raise CancelledError()
-
-        detected_sr = self._parse_wav_sample_rate(audio_bytes)
+    def _result(self, audio_bytes: bytes, sample_rate: int) -> TTSResult:
         return TTSResult(
             audio_bytes=audio_bytes,
-            sample_rate=sample_rate or detected_sr,
+            sample_rate=sample_rate,
             audio_format="wav",
             backend=self.cfg.backend,
             model=self.cfg.model,
@@ -83,3 +152,36 @@ class GPTSovitsRemoteTTS:
     def _parse_wav_sample_rate(payload: bytes) -> int:
         with wave.open(io.BytesIO(payload), "rb") as wf:
             return int(wf.getframerate())
+
+
+def _split_fragments(payload: bytes, count: int, interval_s: float) -> Optional[List[tuple]]:
+    """
+    按片段之间插入的全零静音把一段 16-bit WAV 切成 count 段，返回 [(wav_bytes, sample_rate)]；
+    找到的静音段数不是 count - 1 时返回 None。
+    """
+    with wave.open(io.BytesIO(payload), "rb") as wf:
+        sr, channels, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+        frames = wf.readframes(wf.getnframes())
+    if width != 2:
+        return None
+    samples = np.frombuffer(frames, dtype="<i2").reshape(-1, channels)
+    silent = ~samples.any(axis=1)
+    min_len = max(1, int(sr * interval_s * 0.9))
+
+    # 全零区间 [start, end)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], silent.astype(np.int8), [0]))))
+    runs = [(s, e) for s, e in zip(edges[0::2], edges[1::2]) if e - s >= min_len and s > 0 and e < len(silent)]
+    if len(runs) != count - 1:
+        return None
+
+    out = []
+    bounds = [0] + [x for run in runs for x in run] + [len(samples)]
+    for start, end in zip(bounds[0::2], bounds[1::2]):
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wf:
+            wf.setnchannels(channels)
+            wf.setsampwidth(width)
+            wf.setframerate(sr)
+            wf.writeframes(samples[start:end].tobytes())
+        out.append((buf.getvalue(), sr))
+    return out
@@ -44,5 +44,18 @@ class GenieTTSConfig:
             "src/tts/Genie_tts/CharacterModels/CharacterModels/v2ProPlus/feibi/prompt_wav.json",
         )
     )
+    # 合成进程数：>1 时起这么多个 worker 进程并发合成，每个进程各加载一份模型（内存按进程数增长）
+    pool_size: int = field(default_factory=lambda: int(os.environ.get("GENIE_POOL_SIZE", "1")))
+    # 每个 worker 进程的推理线程数，0 表示按 CPU 核数平分
+    worker_threads: int = field(default_factory=lambda: int(os.environ.get("GENIE_WORKER_THREADS", "0")))
+    # 等空闲 worker / 等单段合成结果的超时（秒），超时的 worker 会被换掉
+    worker_timeout_s: float = field(default_factory=lambda: float(os.environ.get("GENIE_WORKER_TIMEOUT_S", "120")))
+    # 参考音频 / 文本解析结果（文件哈希、文本）的持久化索引，为空则只缓存在内存里
+    reference_cache_path: Optional[str] = field(
+        default_factory=lambda: os.environ.get("GENIE_REF_CACHE", "out/genie_reference_cache.json") or None
+    )
+    # 创建实例时预加载默认 voice / 逗号分隔的 voice 列表，首个请求和 voice 切换不用等加载
+    prewarm: bool = field(default_factory=lambda: _env_bool("GENIE_PREWARM", "0"))
+    prewarm_voices: Optional[str] = field(default_factory=lambda: os.environ.get("GENIE_PREWARM_VOICES"))
     output_dir: str = field(default_factory=lambda: os.environ.get("GENIE_OUTPUT_DIR", "out"))
     keep_output: bool = field(default_factory=lambda: _env_bool("GENIE_KEEP_OUTPUT", "0"))
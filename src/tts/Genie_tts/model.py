@@ -1,17 +1,28 @@
 # src/tts/Genie_tts/model.py
 from __future__ import annotations
 
-from typing import Optional, Tuple
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 from pathlib import Path
 import threading
 import time
-import wave
 import json
 import os
-import tempfile
 
+import numpy as np
+
+from src.audio import resample
 from src.tts.base import CancelToken, CancelledError, TTSResult
 from src.tts.Genie_tts.config import GenieTTSConfig
+from src.tts.Genie_tts.pool import GenieWorkerPool
+from src.tts.reference_cache import ReferenceCache, ReferencePrompt
+
+# genie 的角色 / 参考音频 / 播放器都是进程级的单例（context.current_speaker、tts_player），
+# 同一进程里的所有 GenieTTS 实例共用这把锁，加载和合成串行；要并发用 GENIE_POOL_SIZE 开多个 worker 进程
+_GENIE_LOCK = threading.Lock()
+# alias -> onnx_dir：已经加载进 genie 的角色；alias -> prompt key：角色上当前的参考音频
+_GENIE_CHARACTERS: Dict[str, Optional[str]] = {}
+_GENIE_PROMPTS: Dict[str, Tuple[str, str]] = {}
 
 
 class GenieTTS:
@@ -21,15 +32,48 @@ class GenieTTS:
 
     def __init__(self, cfg: GenieTTSConfig):
         self.cfg = cfg
-        self._lock = threading.Lock()
-        self._loaded_character: Optional[Tuple[str, Optional[str]]] = None
-        self._prompt_key: Optional[Tuple[str, str]] = None
+        # ref.txt / prompt_wav.json / 参考音频哈希：文件不变就不再读取解析
+        self._refs = ReferenceCache(cfg.reference_cache_path)
         self._genie = None
+        self._pool: Optional[GenieWorkerPool] = None
+
+        if cfg.pool_size > 1:
+            # 多进程：本进程不加载 genie，合成和预加载都交给 worker 进程
+            self._pool = GenieWorkerPool(cfg)
+            self._pool.start()
+            return
 
         if cfg.data_dir:
             data_dir = str(Path(cfg.data_dir).expanduser().resolve())
             os.environ["GENIE_DATA_DIR"] = data_dir
         self._genie = self._import_genie()
+        (
+            self._player,
+            self._context,
+            self._reference_audio_cls,
+            self._reference_audios,
+        ) = self._import_player()
+
+        if cfg.prewarm or cfg.prewarm_voices:
+            voices: List[Optional[str]] = [None] if cfg.prewarm else []
+            voices += [v.strip() for v in (cfg.prewarm_voices or "").split(",") if v.strip()]
+            self.prewarm(voices)
+
+    def prewarm(self, voices: Sequence[Optional[str]] = (None,)) -> None:
+        """
+        启动时把各个 voice 的模型和参考音频加载进 genie，第一个请求和 voice 切换都不用再等加载 / 提取参考音频特征。
+        同时常驻的角色数由 genie 的 Max_Cached_Character_Models（默认 3）决定，超出的按 LRU 换出、用时重新加载。
+        """
+        if self._pool is not None:
+            self._pool.prewarm(list(voices) or [None])
+            return
+        for voice in list(voices) or [None]:
+            character_name, onnx_dir, language = self._resolve_character(voice)
+            prompt = self._resolve_reference(character_name, voice)
+            with self._genie_lock(None):
+                self._prepare_character(character_name, onnx_dir, language)
+                self._apply_reference(character_name, prompt)
+        self._refs.save()
 
     def synthesize(
         self,
@@ -42,52 +86,34 @@ class GenieTTS:
         if cancel_token is not None and cancel_token.is_cancelled():
             raise CancelledError()
 
-        with self._lock:
-            character_name, onnx_dir, language = self._resolve_character(voice)
-            self._ensure_character_loaded(character_name, onnx_dir, language)
-            ref_audio, ref_text = self._resolve_reference(character_name, voice)
-            if ref_audio and ref_text:
-                if self._prompt_key != (ref_audio, ref_text):
-                    self._genie.set_reference_audio(
-                        character_name=character_name,
-                        audio_path=ref_audio,
-                        audio_text=ref_text,
-                    )
-                    self._prompt_key = (ref_audio, ref_text)
+        if self._pool is not None:
+            pcm, sr = self._pool.synthesize(text, voice, sample_rate, cancel_token)
+            return TTSResult.from_pcm(pcm, sr, backend=self.cfg.backend, model=None)
+
+        character_name, onnx_dir, language = self._resolve_character(voice)
+        prompt = self._resolve_reference(character_name, voice)
+        with self._genie_lock(cancel_token):
+            self._prepare_character(character_name, onnx_dir, language)
+            self._apply_reference(character_name, prompt)
 
             if cancel_token is not None and cancel_token.is_cancelled():
                 raise CancelledError()
 
-            out_path: Path
-            if self.cfg.keep_output:
-                out_path = self._build_output_path()
-            else:
-                tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-                tmp.close()
-                out_path = Path(tmp.name)
-
-            try:
-                self._genie.tts(
-                    character_name=character_name,
-                    text=text,
-                    play=False,
-                    save_path=str(out_path),
-                )
-                audio_bytes, detected_sr = self._read_wav(out_path)
-            finally:
-                if not self.cfg.keep_output:
-                    try:
-                        out_path.unlink()
-                    except FileNotFoundError:
-                        pass
-
-        return TTSResult(
-            audio_bytes=audio_bytes,
-            sample_rate=sample_rate or detected_sr,
-            audio_format="wav",
-            backend=self.cfg.backend,
-            model=None,
-        )
+            save_path = str(self._build_output_path()) if self.cfg.keep_output else None
+            pcm = self._speak(character_name, text, save_path, cancel_token)
+
+        if pcm.size == 0:
+            raise RuntimeError(f"GENIE produced no audio for character '{character_name}'.")
+        sr = int(self._player.sample_rate)
+        if sample_rate and int(sample_rate) != sr:
+            pcm = resample(pcm, sr, int(sample_rate))
+            sr = int(sample_rate)
+        return TTSResult.from_pcm(pcm, sr, backend=self.cfg.backend, model=None)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
 
     def _resolve_character(self, voice: Optional[str]) -> Tuple[str, Optional[str], Optional[str]]:
         if self.cfg.character_name:
@@ -100,14 +126,20 @@ class GenieTTS:
         language = self.cfg.language
         return profile, str(onnx_dir), language
 
-    def _ensure_character_loaded(
-        self,
-        character_name: str,
-        onnx_dir: Optional[str],
-        language: Optional[str],
-    ) -> None:
-        key = (character_name, onnx_dir)
-        if self._loaded_character == key:
+    @contextmanager
+    def _genie_lock(self, cancel_token: Optional[CancelToken]) -> Iterator[None]:
+        # 排队等锁时也响应取消（被打断的段落不必等前面的合成跑完）
+        while not _GENIE_LOCK.acquire(timeout=0.1):
+            if cancel_token is not None and cancel_token.is_cancelled():
+                raise CancelledError()
+        try:
+            yield
+        finally:
+            _GENIE_LOCK.release()
+
+    def _prepare_character(self, character_name: str, onnx_dir: Optional[str], language: Optional[str]) -> None:
+        # 调用方持有 _GENIE_LOCK
+        if character_name in _GENIE_CHARACTERS and _GENIE_CHARACTERS[character_name] == onnx_dir:
             return
 
         if onnx_dir:
@@ -120,15 +152,84 @@ class GenieTTS:
             )
         else:
             self._genie.load_predefined_character(character_name)
+        _GENIE_CHARACTERS[character_name] = onnx_dir
+        _GENIE_PROMPTS.pop(character_name, None)
+
+    def _apply_reference(self, character_name: str, prompt: Optional[ReferencePrompt]) -> None:
+        # 调用方持有 _GENIE_LOCK；按音频内容哈希 + 文本判断，角色上已经是这个 prompt 就不再重新提取特征
+        if prompt is None or _GENIE_PROMPTS.get(character_name) == prompt.key:
+            return
+        self._genie.set_reference_audio(
+            character_name=character_name,
+            audio_path=prompt.audio_path,
+            audio_text=prompt.text,
+        )
+        _GENIE_PROMPTS[character_name] = prompt.key
+
+    def _speak(
+        self,
+        character_name: str,
+        text: str,
+        save_path: Optional[str],
+        cancel_token: Optional[CancelToken],
+    ) -> np.ndarray:
+        """
+        和 genie.tts() 一样设置 context、驱动 tts_player，但用 chunk_callback 在内存里收 PCM，
+        不落盘（GENIE_KEEP_OUTPUT=1 时 genie 另外写一份文件）。调用方持有 _GENIE_LOCK。
+
+        genie 的工作线程某句出错时回调 None 然后接着合成后面的句子，单看 None 分不清结束还是出错：
+        这里自己分句、逐句 feed，每句成功恰好回调一段 PCM，凑齐之前收到 None 就是有句子失败。
+        """
+        ref = self._reference_audios.get(character_name)
+        if ref is None:
+            raise RuntimeError(f"GENIE reference audio is not set for character '{character_name}'.")
+        sentences = self._player._text_splitter.split(text.strip())
+        if not sentences:
+            return np.zeros(0, dtype=np.float32)
 
-        self._loaded_character = key
-        self._prompt_key = None
+        chunks: List[bytes] = []
+        done = threading.Event()
 
-    def _resolve_reference(self, character_name: str, voice: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        def _on_chunk(chunk: Optional[bytes]) -> None:
+            # tts_player 的工作线程里调用：每句一段 int16 PCM，结束或出错时为 None
+            if chunk is None:
+                done.set()
+            elif not done.is_set():
+                chunks.append(chunk)
+
+        self._context.current_speaker = character_name
+        self._context.current_prompt_audio = self._reference_audio_cls(
+            prompt_wav=ref["audio_path"],
+            prompt_text=ref["audio_text"],
+            language=ref["language"],
+        )
+        self._player.start_session(play=False, split=False, save_path=save_path, chunk_callback=_on_chunk)
+        for sentence in sentences:
+            self._player.feed(sentence)
+        self._player.end_session()
+        while not done.wait(0.1):
+            if cancel_token is not None and cancel_token.is_cancelled():
+                # 停掉工作线程（下一次 start_session 会重新拉起），已经排队的句子不再合成
+                self._genie.stop()
+                raise CancelledError()
+        if len(chunks) < len(sentences):
+            # 剩下的句子和结束标记还在队列里：停掉工作线程再放锁，免得它们的回调漏进下一个请求
+            self._genie.stop()
+            raise RuntimeError(
+                f"GENIE failed to synthesize sentence {len(chunks) + 1}/{len(sentences)} "
+                f"for character '{character_name}'."
+            )
+        self._player.wait_for_tts_completion()
+
+        pcm = np.frombuffer(b"".join(chunks), dtype="<i2").astype(np.float32)
+        pcm *= 1.0 / 32767.0
+        return pcm
+
+    def _resolve_reference(self, character_name: str, voice: Optional[str]) -> Optional[ReferencePrompt]:
         if self.cfg.reference_audio and (self.cfg.reference_text or self.cfg.reference_text_path):
             ref_audio = self._require_path(self.cfg.reference_audio, "GENIE_REF_AUDIO")
             ref_text = self._resolve_reference_text()
-            return ref_audio, ref_text
+            return self._reference_prompt(ref_audio, ref_text)
 
         profile = voice or self.cfg.voice_profile or character_name
         voice_dir = self._resolve_voice_dir(profile)
@@ -139,29 +240,27 @@ class GenieTTS:
                 ref_audio = str(candidate.resolve())
                 break
         ref_text_path = voice_dir / "ref.txt"
-        ref_text = ref_text_path.read_text(encoding="utf-8").strip() if ref_text_path.is_file() else None
+        ref_text = self._refs.load(str(ref_text_path), _read_text) if ref_text_path.is_file() else None
         if ref_audio and ref_text:
-            return ref_audio, ref_text
-        return None, None
+            return self._reference_prompt(ref_audio, ref_text)
+        return None
+
+    def _reference_prompt(self, ref_audio: str, ref_text: str) -> ReferencePrompt:
+        prompt = self._refs.prompt(ref_audio, ref_text, self.cfg.language)
+        self._refs.save()  # 没有新解析的文件时不写盘
+        return prompt
 
     def _resolve_reference_text(self) -> str:
         if self.cfg.reference_text_path:
             path = Path(self.cfg.reference_text_path).expanduser()
             if path.is_file():
                 if path.suffix.lower() == ".json":
-                    data = json.loads(path.read_text(encoding="utf-8"))
-                    if isinstance(data, dict):
-                        default = data.get("Normal") or next(iter(data.values()), {})
-                        if isinstance(default, dict):
-                            text = default.get("text")
-                            if text:
-                                return str(text).strip()
-                    raise ValueError(f"Unsupported reference json format: {path}")
-                return path.read_text(encoding="utf-8").strip()
+                    return self._refs.load(str(path), _read_reference_json, kind="prompt_json")
+                return self._refs.load(str(path), _read_text)
         if self.cfg.reference_text:
             possible = Path(self.cfg.reference_text).expanduser()
             if possible.is_file():
-                return possible.read_text(encoding="utf-8").strip()
+                return self._refs.load(str(possible), _read_text)
             return self.cfg.reference_text.strip()
         raise ValueError("Reference text missing. Set GENIE_REF_TEXT or GENIE_REF_TEXT_PATH.")
 
@@ -187,12 +286,6 @@ class GenieTTS:
             raise FileNotFoundError(f"{env_key} does not exist: {path}")
         return str(path.resolve())
 
-    @staticmethod
-    def _read_wav(path: Path) -> Tuple[bytes, int]:
-        data = path.read_bytes()
-        with wave.open(str(path), "rb") as wf:
-            return data, wf.getframerate()
-
     @staticmethod
     def _import_genie():
         try:
@@ -201,7 +294,42 @@ class GenieTTS:
             raise ImportError(
                 "GenieTTS requires 'genie-tts'.\n"
                 "Please run:\n"
-                "  pip install genie-tts\n"
+                "  pip install 'genie-tts>=2.0,<3'\n"
                 "and make sure you are in the correct virtual environment."
             ) from e
         return genie
+
+    @staticmethod
+    def _import_player():
+        """
+        genie.tts() 只能写文件，收 PCM 要直接用它内部的播放器、context 和参考音频表（genie-tts 2.x 的模块结构）。
+        """
+        try:
+            from genie_tts.Audio.ReferenceAudio import ReferenceAudio
+            from genie_tts.Core.TTSPlayer import tts_player
+            from genie_tts.Internal import _reference_audios
+            from genie_tts.Utils.Shared import context
+        except ImportError as e:
+            raise ImportError(
+                "GenieTTS requires 'genie-tts' 2.x (streaming PCM uses its internal player).\n"
+                "Please run:\n"
+                "  pip install 'genie-tts>=2.0,<3'\n"
+                "and make sure you are in the correct virtual environment."
+            ) from e
+
+        return tts_player, context, ReferenceAudio, _reference_audios
+
+
+def _read_text(path: Path) -> str:
+    return path.read_text(encoding="utf-8").strip()
+
+
+def _read_reference_json(path: Path) -> str:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        default = data.get("Normal") or next(iter(data.values()), {})
+        if isinstance(default, dict):
+            text = default.get("text")
+            if text:
+                return str(text).strip()
+    raise ValueError(f"Unsupported reference json format: {path}")
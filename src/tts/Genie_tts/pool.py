@@ -0,0 +1,261 @@
+# src/tts/Genie_tts/pool.py
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+import logging
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+import os
+import queue
+import threading
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.tts.base import CancelToken, CancelledError
+from src.tts.Genie_tts.config import GenieTTSConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _limit_threads(cpus: Sequence[int], num_threads: int) -> None:
+    # 在 import genie / onnxruntime 之前调用：线程数环境变量只在库初始化时读取
+    if num_threads > 0:
+        for key in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[key] = str(num_threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        # 每个 worker 固定在自己那一段核上，ONNX Runtime 的线程池不会跨到别的 worker 的核
+        try:
+            os.sched_setaffinity(0, set(cpus))
+        except OSError:
+            pass
+
+
+def _worker_main(conn: Connection, cfg: GenieTTSConfig, cpus: List[int], num_threads: int) -> None:
+    _limit_threads(cpus, num_threads)
+    try:
+        from src.tts.Genie_tts.model import GenieTTS
+
+        # 子进程里是普通的进程内 GenieTTS：genie 的 context / tts_player 单例每个进程一份
+        tts = GenieTTS(replace(cfg, pool_size=1))
+    except Exception as exc:
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        return
+    conn.send(("ready", None))
+
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                return
+            kind, args = msg
+            try:
+                if kind == "prewarm":
+                    tts.prewarm(args)
+                    conn.send(("ok", None))
+                else:
+                    text, voice, sample_rate = args
+                    res = tts.synthesize(text, voice=voice, sample_rate=sample_rate)
+                    conn.send(("ok", (res.pcm, res.sample_rate)))
+            except Exception as exc:
+                conn.send(("error", f"{type(exc).__name__}: {exc}"))
+    except (EOFError, KeyboardInterrupt):
+        return
+
+
+@dataclass
+class _Worker:
+    process: Any
+    conn: Connection
+
+
+class GenieWorkerPool:
+    """
+    多进程 Genie：genie 的角色、参考音频和播放器都是进程级单例，一个进程里只能串行合成，
+    要并发就起 N 个 worker 进程，各自加载一份模型（内存按进程数增长），CPU 核按进程平分。
+    用 spawn 启动：子进程从干净的解释器开始，不继承服务进程的线程和锁。
+    """
+
+    def __init__(self, cfg: GenieTTSConfig) -> None:
+        self.cfg = cfg
+        self.num_workers = max(1, int(cfg.pool_size))
+        cpu_count = os.cpu_count() or 1
+        self.threads_per_worker = cfg.worker_threads or max(1, cpu_count // self.num_workers)
+        self.timeout_s = float(cfg.worker_timeout_s)
+        self._workers: List[_Worker] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._closed = False
+        self._next_slot = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._workers:
+                return
+            spawned = [self._spawn_worker() for _ in range(self.num_workers)]
+        # 各进程并行 import / 加载，这里再逐个等它们就绪
+        for worker in spawned:
+            self._await_ready(worker)
+            self._idle.put(worker)
+
+    def _cpu_slice(self) -> List[int]:
+        # 调用方持有 self._lock；按启动顺序轮流分配核段，补起来的 worker 接着往后排
+        try:
+            cpus = sorted(os.sched_getaffinity(0))
+        except AttributeError:
+            return []
+        if len(cpus) < self.num_workers:
+            return []
+        per = len(cpus) // self.num_workers
+        slot = self._next_slot % self.num_workers
+        self._next_slot += 1
+        return cpus[slot * per:(slot + 1) * per]
+
+    def _spawn_worker(self) -> _Worker:
+        # 调用方持有 self._lock
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.cfg, self._cpu_slice(), self.threads_per_worker),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process=process, conn=parent_conn)
+        self._workers.append(worker)
+        return worker
+
+    def _await_ready(self, worker: _Worker) -> None:
+        # 子进程 import genie、预加载角色可能要十几秒，给足一个超时
+        try:
+            if not worker.conn.poll(max(self.timeout_s, 60.0)):
+                raise RuntimeError("timed out while starting")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError) as exc:
+            status, payload = "error", f"exited during startup ({exc})"
+        except RuntimeError as exc:
+            status, payload = "error", str(exc)
+        if status != "ready":
+            self._discard_worker(worker)
+            raise RuntimeError(f"Genie worker pid={worker.process.pid} failed to start: {payload}")
+
+    def _discard_worker(self, worker: _Worker) -> None:
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=5.0)
+        worker.conn.close()
+
+    def _replace_worker(self, worker: _Worker) -> None:
+        """
+        worker 进程死了、超时或者管道断了：回收它，再起一个新的放回空闲队列，池子的大小不变。
+        新进程起不来时只记日志，池子少一个 worker，后面的请求在空闲队列上超时报错。
+        """
+        self._discard_worker(worker)
+        with self._lock:
+            if self._closed:
+                return
+            fresh = self._spawn_worker()
+        try:
+            self._await_ready(fresh)
+        except RuntimeError:
+            logger.exception("Failed to respawn Genie worker")
+            return
+        self._idle.put(fresh)
+
+    def _acquire(self, cancel_token: Optional[CancelToken]) -> _Worker:
+        deadline = time.monotonic() + self.timeout_s
+        while True:
+            if cancel_token is not None and cancel_token.is_cancelled():
+                raise CancelledError()
+            if self._closed:
+                raise RuntimeError("GenieWorkerPool is closed")
+            try:
+                return self._idle.get(timeout=0.1)
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"No idle Genie worker within {self.timeout_s:.0f}s")
+
+    def _call(self, msg: Tuple[str, Any], cancel_token: Optional[CancelToken]) -> Any:
+        worker = self._acquire(cancel_token)
+        deadline = time.monotonic() + self.timeout_s
+        try:
+            worker.conn.send(msg)
+            while not worker.conn.poll(0.1):
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    # 子进程里这一段没法打断：交给后台线程收掉结果再放回空闲队列，调用方立刻返回
+                    threading.Thread(target=self._drain, args=(worker, deadline), daemon=True).start()
+                    worker = None
+                    raise CancelledError()
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Genie worker pid={worker.process.pid} timed out")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, TimeoutError) as exc:
+            # 死掉或卡住的 worker 不能放回空闲队列，否则之后的请求都会落到它上面；
+            # 补新进程要等它加载完，放到后台做，这个请求先报错返回
+            threading.Thread(target=self._replace_worker, args=(worker,), daemon=True).start()
+            worker = None
+            if isinstance(exc, TimeoutError):
+                raise
+            raise RuntimeError(f"Genie worker died: {exc}") from exc
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+        if status != "ok":
+            raise RuntimeError(f"Genie worker failed: {payload}")
+        return payload
+
+    def _drain(self, worker: _Worker, deadline: float) -> None:
+        try:
+            if worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                worker.conn.recv()
+                self._idle.put(worker)
+                return
+        except (EOFError, OSError):
+            pass
+        self._replace_worker(worker)
+
+    def synthesize(
+        self,
+        text: str,
+        voice: Optional[str],
+        sample_rate: Optional[int],
+        cancel_token: Optional[CancelToken],
+    ) -> Tuple[np.ndarray, int]:
+        pcm, sr = self._call(("synthesize", (text, voice, sample_rate)), cancel_token)
+        return pcm, sr
+
+    def prewarm(self, voices: Sequence[Optional[str]]) -> None:
+        # 每个 worker 各自加载一遍：把空闲的 worker 全部借出来，保证每个进程都轮到
+        taken = [self._acquire(None) for _ in range(self.num_workers)]
+        try:
+            for worker in taken:
+                worker.conn.send(("prewarm", list(voices)))
+            for worker in taken:
+                status, payload = worker.conn.recv()
+                if status != "ok":
+                    raise RuntimeError(f"Genie worker failed to prewarm: {payload}")
+        finally:
+            for worker in taken:
+                self._idle.put(worker)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5.0)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
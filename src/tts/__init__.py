@@ -1,10 +1,26 @@
 # src/tts/__init__.py
-from src.tts.base import BaseTTS, TTSConfigBase, TTSResult
+from src.tts.base import BaseTTS, TTSConfigBase, TTSResult, batch_synthesize
+from src.tts.executor import ReorderBuffer, TTSExecutor, TTSJobResult
 from src.tts.factory import create_tts
+from src.tts.frontend import FrontendTTS, TTSFrontend, TTSFrontendConfig, normalize_text
+from src.tts.reference_cache import ReferenceCache, ReferencePrompt
+from src.tts.segmenter import TextSegmenter, TextSegmenterConfig
 
 __all__ = [
     "BaseTTS",
+    "FrontendTTS",
+    "ReferenceCache",
+    "ReferencePrompt",
+    "ReorderBuffer",
+    "TTSExecutor",
+    "TTSJobResult",
     "TTSConfigBase",
+    "TTSFrontend",
+    "TTSFrontendConfig",
     "TTSResult",
+    "TextSegmenter",
+    "TextSegmenterConfig",
+    "batch_synthesize",
     "create_tts",
+    "normalize_text",
 ]
@@ -1,10 +1,13 @@
 # src/tts/base.py
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional, Protocol
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, List, Optional, Protocol, Sequence
 import threading
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 # =========================
 # Data structures
@@ -17,6 +20,41 @@ class TTSResult:
     audio_format: Optional[str] = None  # e.g. "wav", "mp3"
     backend: Optional[str] = None
     model: Optional[str] = None
+    # float32 mono PCM：进程内（播放、重采样）直接用，不必再编码 / 解码 WAV；
+    # 只有 pcm 的结果 audio_bytes 为空，跨 HTTP 时用 as_wav() 再编码
+    pcm: Optional["np.ndarray"] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_pcm(cls, pcm: Any, sample_rate: int, **kwargs: Any) -> "TTSResult":
+        import numpy as np
+
+        audio = np.asarray(pcm, dtype=np.float32).reshape(-1)
+        return cls(audio_bytes=b"", sample_rate=int(sample_rate), audio_format="pcm_f32le", pcm=audio, **kwargs)
+
+    def as_pcm(self) -> "np.ndarray":
+        """
+        float32 mono 的样本；有 pcm 时直接返回（不拷贝），否则解码 audio_bytes。
+        """
+        if self.pcm is not None:
+            return self.pcm
+        from src.audio import decode_audio, resolve_format
+
+        audio, _ = decode_audio(
+            self.audio_bytes,
+            resolve_format(self.audio_format or "wav"),
+            sample_rate=self.sample_rate,
+        )
+        return audio
+
+    def as_wav(self) -> bytes:
+        """
+        WAV 字节（HTTP 响应等）；后端本来就给了 WAV 时原样返回，否则从 PCM 编码。
+        """
+        if self.audio_bytes and (self.audio_format or "wav").lower() == "wav":
+            return self.audio_bytes
+        from src.audio import encode_audio
+
+        return encode_audio(self.as_pcm(), self.sample_rate, "wav")
 
 
 class TTSConfigBase(Protocol):
@@ -72,3 +110,36 @@ class BaseTTS(Protocol):
         - 需要在合适的地方检查 cancel_token.is_cancelled()
         """
         ...
+
+    def synthesize_batch(
+        self,
+        texts: Sequence[str],
+        *,
+        voice: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> List[TTSResult]:
+        """
+        可选：一次合成多段文本，返回和 texts 一一对应的结果。
+        能在模型层面批量推理的后端实现它；调用方用 batch_synthesize()，没有实现时逐条合成。
+        """
+        ...
+
+
+def batch_synthesize(
+    tts: BaseTTS,
+    texts: Sequence[str],
+    *,
+    voice: Optional[str] = None,
+    sample_rate: Optional[int] = None,
+    cancel_token: Optional[CancelToken] = None,
+) -> List[TTSResult]:
+    batch = getattr(tts, "synthesize_batch", None)
+    if callable(batch):
+        return list(batch(list(texts), voice=voice, sample_rate=sample_rate, cancel_token=cancel_token))
+    out: List[TTSResult] = []
+    for text in texts:
+        if cancel_token is not None:
+            cancel_token.throw_if_cancelled()
+        out.append(tts.synthesize(text, voice=voice, sample_rate=sample_rate, cancel_token=cancel_token))
+    return out
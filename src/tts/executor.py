@@ -0,0 +1,249 @@
+# src/tts/executor.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, TypeVar
+
+from src.tts.base import BaseTTS, CancelToken, CancelledError, TTSResult
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ReorderBuffer(Generic[T]):
+    """
+    并行合成的结果按完成顺序到达，这里按 seg_idx 顺序放行：
+    - 同一个 gen_id 内，seg_idx 从 first_idx 开始连续编号，前面的没到之前后面的先缓存
+    - 更大的 gen_id 到达时切换到新的一代（丢掉旧的缓存），更小的 gen_id 直接丢弃
+    """
+
+    def __init__(self, first_idx: int = 1) -> None:
+        self.first_idx = first_idx
+        self._lock = threading.Lock()
+        self._gen_id: Optional[int] = None
+        self._next_idx = first_idx
+        self._pending: Dict[int, T] = {}
+
+    @property
+    def gen_id(self) -> Optional[int]:
+        return self._gen_id
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def reset(self, gen_id: int) -> None:
+        with self._lock:
+            self._reset_locked(gen_id)
+
+    def _reset_locked(self, gen_id: int) -> None:
+        self._gen_id = gen_id
+        self._next_idx = self.first_idx
+        self._pending.clear()
+
+    def push(self, gen_id: int, seg_idx: int, item: T) -> List[T]:
+        """
+        放入一个结果，返回现在可以按顺序送出的结果（可能为空）。
+        """
+        with self._lock:
+            if self._gen_id is None or gen_id > self._gen_id:
+                self._reset_locked(gen_id)
+            elif gen_id < self._gen_id:
+                return []
+            if seg_idx < self._next_idx:
+                return []  # 重复或已经跳过
+            self._pending[seg_idx] = item
+            ready: List[T] = []
+            while self._next_idx in self._pending:
+                ready.append(self._pending.pop(self._next_idx))
+                self._next_idx += 1
+            return ready
+
+
+@dataclass
+class TTSJob:
+    gen_id: int
+    seg_idx: int
+    text: str
+    voice: Optional[str] = None
+    meta: Any = None
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class TTSJobResult:
+    job: TTSJob
+    result: Optional[TTSResult] = None
+    error: Optional[BaseException] = None
+    # 排队 + 合成的时间 / 纯合成时间
+    wait_ms: float = 0.0
+    tts_ms: float = 0.0
+    worker: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.result is not None
+
+
+class TTSExecutor:
+    """
+    多个 worker 并行合成排队的段落，结果经 ReorderBuffer 按 seg_idx 顺序交给 on_ready：
+
+        executor = TTSExecutor([tts_a, tts_b], on_ready=lambda r: audio_q.put(r))
+        executor.start()
+        executor.submit(gen_id, seg_idx, text)
+        ...
+        executor.interrupt(new_gen_id)   # 打断：清空队列，取消旧一代正在合成的段落
+
+    replicas 里每个元素对应一个 worker；线程安全的后端（如 GPT-SoVITS 远程接口）可以重复放同一个实例，
+    本身带锁的后端需要各自独立的实例，否则 worker 之间仍然是串行的。
+    合成失败的段落也按顺序交给 on_ready（error 不为空），后面的段落不会被卡住。
+    """
+
+    def __init__(
+        self,
+        replicas: Sequence[BaseTTS],
+        on_ready: Callable[[TTSJobResult], None],
+        *,
+        max_pending: int = 12,
+        first_idx: int = 1,
+    ) -> None:
+        if not replicas:
+            raise ValueError("TTSExecutor requires at least one TTS replica")
+        self.replicas = list(replicas)
+        self.on_ready = on_ready
+        self._jobs: "queue.Queue[Optional[TTSJob]]" = queue.Queue(maxsize=max(1, max_pending))
+        self._reorder: ReorderBuffer[TTSJobResult] = ReorderBuffer(first_idx)
+        # 保证 on_ready 的调用顺序和 ReorderBuffer 放行的顺序一致
+        self._deliver_lock = threading.Lock()
+        self._gen_lock = threading.Lock()
+        self._gen_id = 0
+        self._token = CancelToken()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+
+    @property
+    def workers(self) -> int:
+        return len(self.replicas)
+
+    def start(self) -> "TTSExecutor":
+        if self._threads:
+            return self
+        for idx, tts in enumerate(self.replicas):
+            t = threading.Thread(target=self._worker, args=(idx, tts), name=f"tts-worker-{idx}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def submit(
+        self,
+        gen_id: int,
+        seg_idx: int,
+        text: str,
+        *,
+        voice: Optional[str] = None,
+        meta: Any = None,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        排队一个段落；gen_id 比当前新时自动切换到新一代。队列满时阻塞（LLM 远快于 TTS 时形成背压）。
+        """
+        with self._gen_lock:
+            if gen_id < self._gen_id:
+                return False
+            if gen_id > self._gen_id:
+                self._switch_gen_locked(gen_id)
+        try:
+            self._jobs.put(TTSJob(gen_id, seg_idx, text, voice=voice, meta=meta), timeout=timeout)
+        except queue.Full:
+            return False
+        return True
+
+    def interrupt(self, gen_id: int) -> None:
+        """
+        切换到新一代：丢掉队列里旧的段落，取消正在合成的段落，已经合成好但还没放行的也不再送出。
+        """
+        with self._gen_lock:
+            if gen_id > self._gen_id:
+                self._switch_gen_locked(gen_id)
+        self._drain()
+
+    def close(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        with self._gen_lock:
+            self._token.cancel()
+        self._drain(keep_current=False)
+        for _ in self._threads:
+            try:
+                self._jobs.put_nowait(None)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads.clear()
+
+    def _switch_gen_locked(self, gen_id: int) -> None:
+        self._gen_id = gen_id
+        self._token.cancel()
+        self._token = CancelToken()
+        self._reorder.reset(gen_id)
+
+    def _current(self):
+        with self._gen_lock:
+            return self._gen_id, self._token
+
+    def _drain(self, keep_current: bool = True) -> None:
+        gen_id, _ = self._current()
+        keep: List[Optional[TTSJob]] = []
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            # 并发 submit 进来的新一代段落和 close() 的结束标记放回去
+            if keep_current and (job is None or job.gen_id >= gen_id):
+                keep.append(job)
+        for job in keep:
+            self._jobs.put(job)
+
+    def _worker(self, idx: int, tts: BaseTTS) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._jobs.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if job is None:
+                return
+            gen_id, token = self._current()
+            if job.gen_id != gen_id:
+                logger.debug("drop stale TTS segment %s (gen_id=%s)", job.seg_idx, job.gen_id)
+                continue
+
+            out = TTSJobResult(job=job, worker=idx)
+            start = time.perf_counter()
+            try:
+                out.result = tts.synthesize(job.text, voice=job.voice, cancel_token=token)
+            except CancelledError:
+                if self._current()[0] != job.gen_id:
+                    continue
+                out.error = CancelledError("TTS synthesis cancelled")
+            except Exception as exc:
+                logger.warning("TTS worker %d failed on segment %s: %s", idx, job.seg_idx, exc)
+                out.error = exc
+            end = time.perf_counter()
+            out.tts_ms = (end - start) * 1000.0
+            out.wait_ms = (end - job.submitted_at) * 1000.0
+            self._deliver(out)
+
+    def _deliver(self, out: TTSJobResult) -> None:
+        with self._deliver_lock:
+            for ready in self._reorder.push(out.job.gen_id, out.job.seg_idx, out):
+                try:
+                    self.on_ready(ready)
+                except Exception as exc:
+                    logger.warning("TTS on_ready callback failed: %s", exc)
@@ -0,0 +1,269 @@
+# src/tts/frontend.py
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import os
+import re
+import threading
+from typing import List, Optional, Sequence
+
+from src.tts.base import BaseTTS, CancelToken, TTSResult, batch_synthesize
+
+
+def _env_bool(key: str, default: str = "0") -> bool:
+    return os.environ.get(key, default).strip().lower() in ("1", "true", "yes", "y")
+
+
+# =========================
+# Text normalization
+# =========================
+
+_DIGITS = "零一二三四五六七八九"
+_UNITS = ["", "十", "百", "千"]
+_SECTIONS = ["", "万", "亿", "万亿"]
+
+_CJK_RE = re.compile(r"[぀-ヿ㐀-鿿]")
+# 全角字母数字和全角空格 -> 半角；中文标点保持不变（影响停顿）
+_FULLWIDTH = {c: c - 0xFEE0 for c in range(0xFF10, 0xFF5B) if chr(c).isalnum()}
+_FULLWIDTH[0x3000] = 0x20
+# markdown 只在行首（标题、引用、列表符号）或成对出现（**粗体**、`代码`）时去掉，"a > b"、"2*3" 里的保留
+_MD_LINE_RE = re.compile(r"^[ \t]*(?:#{1,6}[ \t]+|>+[ \t]*|[-*+][ \t]+)", re.M)
+_MD_PAIR_RE = re.compile(r"(?<![A-Za-z0-9*~`])(\*\*|__|~~|\*|`+)(?=\S)(.+?)(?<=\S)\1(?![A-Za-z0-9*~`])")
+_EMOJI_RE = re.compile(r"[\U0001F300-\U0001FAFF☀-➿️]")
+_SPACE_RE = re.compile(r"[ \t]+")
+
+# 千分位：1,000 / 12,345,678
+_THOUSANDS_RE = re.compile(r"(?<![\d,])\d{1,3}(?:,\d{3})+(?![\d,])")
+# 两个以上小数点的是版本号 / IP（v1.2.3、192.168.1.1），不当数字读
+_DOTTED_RE = re.compile(r"(?<![\d.])\d+(?:\.\d+){2,}(?![\d.])")
+_DATE_RE = re.compile(r"(?<![\d.])(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?(?![\d.]*\d)")
+_YEAR_RE = re.compile(r"(?<!\d)(\d{4})年")
+_HMS_RE = re.compile(r"(?<!\d)(\d{1,2})[:：](\d{2})[:：](\d{2})(?!\d)")
+_TIME_RE = re.compile(r"(?<!\d)(\d{1,2})[:：](\d{2})(?!\d)")
+# 这些词后面的 h:m:s 是时长（一小时五分三十秒），其他按钟点读（十点零五分三十秒）
+_DURATION_WORDS = ("用时", "耗时", "时长", "历时", "持续", "计时")
+# 数字之间的 ~ / - 是范围（1~2、3-5），读“到”；0 开头的（010-12345678）是电话 / 编号，不算
+_RANGE_RE = re.compile(r"(?<![\d.])(\d+(?:\.\d+)?)[ \t]*[~～-][ \t]*(\d+(?:\.\d+)?)(?![\d.])")
+# "-" 只有前面不是字母数字时才是负号（GPT-4、3-5 里的不是）
+_SIGN = r"(?:(?<![A-Za-z0-9.])-)?"
+_PERCENT_RE = re.compile(rf"({_SIGN})(\d+(?:\.\d+)?)[%％]")
+_NUMBER_RE = re.compile(rf"({_SIGN})(\d+)(?:\.(\d+))?")
+# 单独的 2 后面跟量词读“两”（“第2个”、“2年级”除外）
+_LIANG_RE = re.compile(r"(?<![\d.第])2(?=[个位只条件次天周岁本张台份种双对点小]|年(?!级))")
+
+
+def _section_to_zh(num: int) -> str:
+    out = ""
+    zero = False
+    for pos in range(3, -1, -1):
+        d = (num // 10 ** pos) % 10
+        if d == 0:
+            zero = bool(out)
+            continue
+        if zero:
+            out += "零"
+            zero = False
+        out += _DIGITS[d] + _UNITS[pos]
+    return out
+
+
+def int_to_zh(num: int) -> str:
+    """
+    整数读法：10 -> 十，1005 -> 一千零五，120000 -> 十二万。
+    """
+    if num == 0:
+        return "零"
+    if num < 0:
+        return "负" + int_to_zh(-num)
+    sections: List[int] = []
+    while num:
+        sections.append(num % 10000)
+        num //= 10000
+    out = ""
+    need_zero = False
+    for idx in range(len(sections) - 1, -1, -1):
+        sec = sections[idx]
+        if sec == 0:
+            need_zero = bool(out)
+            continue
+        if out and (need_zero or sec < 1000):
+            out += "零"
+        out += _section_to_zh(sec) + _SECTIONS[idx]
+        need_zero = False
+    # 一十二 -> 十二
+    return out[1:] if out.startswith("一十") else out
+
+
+def digits_to_zh(digits: str) -> str:
+    return "".join(_DIGITS[int(d)] for d in digits)
+
+
+def number_to_zh(sign: str, integer: str, fraction: Optional[str]) -> str:
+    # 超过 8 位或者 0 开头的数字（电话、编号）逐位读
+    if len(integer) > 8 or (len(integer) > 1 and integer.startswith("0")):
+        out = digits_to_zh(integer)
+    else:
+        out = int_to_zh(int(integer))
+    if fraction:
+        out += "点" + digits_to_zh(fraction)
+    return ("负" if sign else "") + out
+
+
+def normalize_text(text: str, lang: Optional[str] = None) -> str:
+    """
+    TTS 前端的文本规整：
+    - 全角字母数字转半角，去掉行首 / 成对的 markdown 符号和 emoji，合并空白
+    - 含中文（或 lang=zh）时把日期、时间、范围、百分数、数字转成中文读法；纯英文保留数字交给英文 G2P
+    """
+    text = (text or "").translate(_FULLWIDTH)
+    text = _MD_LINE_RE.sub("", text)
+    text = _MD_PAIR_RE.sub(r"\2", text)
+    text = _EMOJI_RE.sub("", text)
+    text = _SPACE_RE.sub(" ", text).strip()
+    if not text:
+        return text
+    if lang not in ("zh", "zh-cn", "cmn") and not (lang is None and _CJK_RE.search(text)):
+        return text
+
+    text = _THOUSANDS_RE.sub(lambda m: m.group(0).replace(",", ""), text)
+    text = _DATE_RE.sub(
+        lambda m: f"{digits_to_zh(m.group(1))}年{int_to_zh(int(m.group(2)))}月{int_to_zh(int(m.group(3)))}日",
+        text,
+    )
+    # 版本号 / IP 先换成占位符，最后原样放回
+    kept: List[str] = []
+    text = _DOTTED_RE.sub(lambda m: _keep(kept, m.group(0)), text)
+    text = _YEAR_RE.sub(lambda m: digits_to_zh(m.group(1)) + "年", text)
+    text = _HMS_RE.sub(_hms_zh, text)
+    text = _TIME_RE.sub(
+        lambda m: f"{int_to_zh(int(m.group(1)))}点"
+        + ("" if int(m.group(2)) == 0 else f"{int_to_zh(int(m.group(2)))}分"),
+        text,
+    )
+    text = _RANGE_RE.sub(_range_zh, text)
+    text = _PERCENT_RE.sub(lambda m: ("负" if m.group(1) else "") + "百分之" + _number_match_zh(m.group(2)), text)
+    text = _LIANG_RE.sub("两", text)
+    text = _NUMBER_RE.sub(lambda m: number_to_zh(m.group(1), m.group(2), m.group(3)), text)
+    for idx, raw in enumerate(kept):
+        text = text.replace(_placeholder(idx), raw)
+    return text
+
+
+def _placeholder(idx: int) -> str:
+    # 私有区字符：不会出现在正常文本里，也不会被上面的正则匹配
+    return "\ue000" + chr(0xE100 + idx) + "\ue001"
+
+
+def _keep(kept: List[str], raw: str) -> str:
+    kept.append(raw)
+    return _placeholder(len(kept) - 1)
+
+
+def _range_zh(m: "re.Match[str]") -> str:
+    if any(len(x) > 1 and x.startswith("0") for x in (m.group(1), m.group(2))):
+        return m.group(0)
+    return f"{m.group(1)}到{m.group(2)}"
+
+
+def _hms_zh(m: "re.Match[str]") -> str:
+    h, mi, sec = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if any(w in m.string[max(0, m.start() - 4):m.start()] for w in _DURATION_WORDS):
+        parts = [(h, "小时"), (mi, "分"), (sec, "秒")]
+        out = "".join(int_to_zh(v) + unit for v, unit in parts if v)
+        return out or "零秒"
+    out = f"{int_to_zh(h)}点"
+    if mi or sec:
+        out += ("零" if mi < 10 else "") + int_to_zh(mi) + "分" if mi else "零分"
+    if sec:
+        out += int_to_zh(sec) + "秒"
+    return out
+
+
+def _number_match_zh(raw: str) -> str:
+    integer, _, fraction = raw.partition(".")
+    return number_to_zh("", integer, fraction or None)
+
+
+# =========================
+# Front-end
+# =========================
+
+@dataclass
+class TTSFrontendConfig:
+    # 默认关闭：规整规则覆盖不了所有写法，需要时用 AI_CORE_TTS_FRONTEND=1 打开
+    enabled: bool = field(default_factory=lambda: _env_bool("AI_CORE_TTS_FRONTEND", "0"))
+    # 为空时按文本里是否有中文自动判断
+    lang: Optional[str] = field(default_factory=lambda: os.environ.get("AI_CORE_TTS_FRONTEND_LANG") or None)
+    # 规整结果的 LRU 大小
+    max_sentences: int = field(default_factory=lambda: int(os.environ.get("AI_CORE_TTS_FRONTEND_CACHE", "2048")))
+
+
+class TTSFrontend:
+    """
+    规整文本并缓存规整结果；G2P 仍由各后端自己做。
+    """
+
+    def __init__(self, cfg: Optional[TTSFrontendConfig] = None) -> None:
+        self.cfg = cfg or TTSFrontendConfig()
+        self._normalized: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def normalize(self, text: str) -> str:
+        if not self.cfg.enabled:
+            return text
+        with self._lock:
+            hit = self._normalized.get(text)
+            if hit is not None:
+                self._normalized.move_to_end(text)
+                return hit
+        out = normalize_text(text, self.cfg.lang)
+        with self._lock:
+            self._normalized[text] = out
+            while len(self._normalized) > max(1, self.cfg.max_sentences):
+                self._normalized.popitem(last=False)
+        return out
+
+
+class FrontendTTS:
+    """
+    在任意 TTS 后端前面加一层文本规整：
+        tts = FrontendTTS(create_tts("genie_tts"))
+    """
+
+    def __init__(self, tts: BaseTTS, frontend: Optional[TTSFrontend] = None) -> None:
+        self.tts = tts
+        self.frontend = frontend or TTSFrontend()
+
+    @property
+    def cfg(self):
+        return self.tts.cfg
+
+    def __getattr__(self, name: str):
+        # prewarm / close 等后端自己的方法直接转发
+        return getattr(self.tts, name)
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        voice: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> TTSResult:
+        # 规整后什么都不剩（比如只有 emoji）时交给后端原文，保持原来的报错行为
+        normalized = self.frontend.normalize(text) or text
+        return self.tts.synthesize(normalized, voice=voice, sample_rate=sample_rate, cancel_token=cancel_token)
+
+    def synthesize_batch(
+        self,
+        texts: Sequence[str],
+        *,
+        voice: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> List[TTSResult]:
+        normalized = [self.frontend.normalize(t) or t for t in texts]
+        return batch_synthesize(
+            self.tts, normalized, voice=voice, sample_rate=sample_rate, cancel_token=cancel_token
+        )
@@ -0,0 +1,126 @@
+# src/tts/reference_cache.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class ReferencePrompt:
+    """
+    一条解析好的参考音频 + 文本。audio_hash 是文件内容的 sha1：同一段音频换了路径也认为是同一个 prompt。
+    """
+
+    audio_path: str
+    text: str
+    audio_hash: str
+    language: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.audio_hash, self.text
+
+
+class ReferenceCache:
+    """
+    参考音频 / 文本文件的解析缓存：
+    - 以 (路径, mtime, size) 为准，文件没变就不再读取 / 解析 / 计算哈希，只做一次 stat
+    - persist_path 不为空时把哈希和文本结果写进一个 JSON 文件，重启后不必重新读取所有参考文件
+    """
+
+    def __init__(self, persist_path: Optional[str] = None) -> None:
+        self.persist_path = Path(persist_path).expanduser() if persist_path else None
+        self._lock = threading.Lock()
+        # (kind, path) -> (mtime_ns, size, value)
+        self._entries: Dict[Tuple[str, str], Tuple[int, int, Any]] = {}
+        self._dirty = False
+        self._load_index()
+
+    def load(self, path: str, loader: Callable[[Path], T], kind: str = "text") -> T:
+        """
+        读取并解析一个文件；文件没变时直接返回上次的结果。
+        kind 区分同一个文件的不同解析方式（比如 json 里取不同字段）。
+        """
+        p = Path(path).expanduser()
+        st = p.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        key = (kind, str(p.resolve()))
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[:2] == stamp:
+                return hit[2]
+        value = loader(p)
+        with self._lock:
+            self._entries[key] = (stamp[0], stamp[1], value)
+            self._dirty = True
+        return value
+
+    def file_hash(self, path: str) -> str:
+        return self.load(path, _sha1_file, kind="sha1")
+
+    def prompt(self, audio_path: str, text: str, language: Optional[str] = None) -> ReferencePrompt:
+        return ReferencePrompt(
+            audio_path=str(Path(audio_path).expanduser().resolve()),
+            text=text,
+            audio_hash=self.file_hash(audio_path),
+            language=language,
+        )
+
+    def save(self) -> None:
+        if self.persist_path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            # 只持久化可以 JSON 序列化的结果（哈希、文本）
+            data = {
+                f"{kind}:{path}": [mtime, size, value]
+                for (kind, path), (mtime, size, value) in self._entries.items()
+                if isinstance(value, str)
+            }
+            self._dirty = False
+        tmp = self.persist_path.with_suffix(".tmp")
+        try:
+            self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.persist_path)
+        except OSError as exc:
+            logger.warning("failed to persist reference cache %s: %s", self.persist_path, exc)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _load_index(self) -> None:
+        if self.persist_path is None or not self.persist_path.is_file():
+            return
+        try:
+            data = json.loads(self.persist_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            logger.warning("ignoring unreadable reference cache %s: %s", self.persist_path, exc)
+            return
+        for name, entry in data.items():
+            kind, _, path = name.partition(":")
+            try:
+                mtime, size, value = entry
+                self._entries[(kind, path)] = (int(mtime), int(size), value)
+            except (TypeError, ValueError):
+                continue
+
+
+def _sha1_file(path: Path) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
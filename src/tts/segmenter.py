@@ -0,0 +1,141 @@
+# src/tts/segmenter.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+import time
+from typing import List, Optional
+
+# 句末标点（中 / 日 / 英，全角半角）；"." 只有后面跟空白才算句末，避免切开 3.14、e.g.、URL
+HARD_PUNCT = frozenset("。！？!?；;…\n")
+# 句中停顿：首段可以在这里切（更快出声），段落过长时优先在这里切
+SOFT_PUNCT = frozenset("，,、：:")
+# 跟在句末标点后面的引号、括号，归到前一段
+CLOSERS = frozenset("”’」』）)]】》\"'")
+
+
+@dataclass
+class TextSegmenterConfig:
+    # 第一段：尽快送去合成，降低首音频延迟（遇到逗号也切）
+    first_min_chars: int = 6
+    first_max_chars: int = 30
+    # 后续段落：只在句末切，长一点韵律更自然；超过 max_chars 时退而在逗号 / 空格处切
+    min_chars: int = 16
+    max_chars: int = 120
+    # 距离上一段超过这么久还没切出新段，就把缓冲区整段送出（None=不限）
+    max_wait_s: Optional[float] = None
+
+
+class TextSegmenter:
+    """
+    把 LLM 的增量文本切成适合 TTS 的段落，每个字符只扫描一次（O(n)）：
+
+        seg = TextSegmenter()
+        for ch in llm.stream(...):
+            for text in seg.push(ch.text_delta):
+                tts_queue.put(text)
+        for text in seg.flush():
+            tts_queue.put(text)
+    """
+
+    def __init__(self, cfg: Optional[TextSegmenterConfig] = None) -> None:
+        self.cfg = cfg or TextSegmenterConfig()
+        self.reset()
+
+    def reset(self) -> None:
+        self._buf = ""
+        self._scan = 0          # _buf 中下一个要扫描的位置
+        self._last_hard = 0     # 最近一个句末（切分点，不含）；0=没有
+        self._last_soft = 0
+        self._last_space = 0
+        self.segments_emitted = 0
+        self._last_emit = time.monotonic()
+
+    def _limits(self):
+        if self.segments_emitted == 0:
+            return self.cfg.first_min_chars, self.cfg.first_max_chars
+        return self.cfg.min_chars, self.cfg.max_chars
+
+    def push(self, delta: str) -> List[str]:
+        out: List[str] = []
+        if delta:
+            self._buf += delta
+            self._scan_buffer(out, final=False)
+        if (
+            self.cfg.max_wait_s is not None
+            and self._buf.strip()
+            and time.monotonic() - self._last_emit >= self.cfg.max_wait_s
+        ):
+            self._emit(len(self._buf), out)
+        return out
+
+    def flush(self) -> List[str]:
+        """
+        输入结束：按规则切完剩余文本，最后不足一段的也一起送出。
+        """
+        out: List[str] = []
+        self._scan_buffer(out, final=True)
+        if self._buf.strip():
+            self._emit(len(self._buf), out)
+        # 下一次回复重新按首段规则切
+        self.reset()
+        return out
+
+    def _scan_buffer(self, out: List[str], final: bool) -> None:
+        buf = self._buf
+        i = self._scan
+        n = len(buf)
+        while i < n:
+            min_chars, max_chars = self._limits()
+            c = buf[i]
+
+            if c in HARD_PUNCT or c == ".":
+                # 连续标点和后面的引号 / 括号算同一个句尾
+                j = i
+                while j + 1 < n and (buf[j + 1] in HARD_PUNCT or buf[j + 1] == "."):
+                    j += 1
+                while j + 1 < n and buf[j + 1] in CLOSERS:
+                    j += 1
+                if j + 1 >= n and not final:
+                    break  # 看不到下一个字符，等下一个 delta 再决定
+                end = j + 1
+                if c == "." and j == i and end < n and not buf[end].isspace():
+                    i = end
+                    continue
+                if end >= min_chars:
+                    self._emit(end, out)
+                    buf, i, n = self._buf, 0, len(self._buf)
+                    continue
+                self._last_hard = end
+                i = end
+                continue
+
+            if c in SOFT_PUNCT:
+                self._last_soft = i + 1
+                if self.segments_emitted == 0 and i + 1 >= min_chars:
+                    self._emit(i + 1, out)
+                    buf, i, n = self._buf, 0, len(self._buf)
+                    continue
+            elif c.isspace():
+                self._last_space = i
+
+            if i + 1 >= max_chars:
+                # 太长：依次退到句末、逗号、空格（英文不切断单词），切出来的段太短或都没有就硬切
+                cut = next(
+                    (p for p in (self._last_hard, self._last_soft, self._last_space) if p >= min_chars),
+                    i + 1,
+                )
+                self._emit(cut, out)
+                buf, i, n = self._buf, 0, len(self._buf)
+                continue
+            i += 1
+        self._scan = i
+
+    def _emit(self, end: int, out: List[str]) -> None:
+        text = self._buf[:end].strip()
+        # 剩余部分通常只有几个字符（切分点就在扫描位置附近），从头重新扫描
+        self._buf = self._buf[end:].lstrip()
+        self._scan = self._last_hard = self._last_soft = self._last_space = 0
+        if text:
+            out.append(text)
+            self.segments_emitted += 1
+            self._last_emit = time.monotonic()